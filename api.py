@@ -3,11 +3,20 @@
 
 import os
 import re
+import json
+import time
+import heapq
+import bisect
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 import webapp2
 import jinja2
 import logging
 
 import parsers
+import caches
+import textindex
 
 from google.appengine.ext import ndb
 from google.appengine.ext import blobstore
@@ -25,16 +34,46 @@ sitemode = "mainsite" # whitespaced list for CSS tags,
             # e.g. "mainsite testsite", "extensionsite" when off expected domains
 
 DYNALOAD = True # permits read_schemas to be re-invoked live.
+TEMPLATE_BYTECODE_DIR = os.path.join(os.path.dirname(__file__), 'templates', 'bytecode') # filled by scripts/precompile_templates.py
+
+
+class TemplateBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """Jinja bytecode cache that can be built before deployment and read from a read-only filesystem.
+
+    Entries are keyed by template name alone (not its absolute path), so
+    bytecode compiled at build time matches wherever the app is installed.
+    Failures to write entries are ignored; stale ones are detected by Jinja's
+    source checksum and simply recompiled in memory.
+    """
+
+    def get_cache_key(self, name, filename=None):
+        import hashlib
+        return hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+    def dump_bytecode(self, bucket):
+        try:
+            jinja2.FileSystemBytecodeCache.dump_bytecode(self, bucket)
+        except (IOError, OSError):
+            pass
+
 JINJA_ENVIRONMENT = jinja2.Environment(
     loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')),
-    extensions=['jinja2.ext.autoescape'], autoescape=True)
+    extensions=['jinja2.ext.autoescape'], autoescape=True,
+    bytecode_cache=TemplateBytecodeCache(TEMPLATE_BYTECODE_DIR))
 
 debugging = False
 
-# Core API: we have a single schema graph built from triples and units.
+# Core API: we have a single live schema graph built from triples and units.
+# Other read-only graphs (e.g. releases.ReleaseGraph) have Units of their own,
+# and are read by entering UsingGraph.
 
 NodeIDMap = {}
-DataCache = {}
+active = threading.local() # .graphs: the graphs entered with UsingGraph on this thread
+DataCache = caches.Cache("data")
+graph_version = "" # snapshot hash of the data files read_schemas last loaded
+graph_loaded = None # when the live graph was last loaded or reloaded, in seconds since the epoch
+extensions_loaded = False
+text_arcs = ["rdfs:comment", "rdfs:label"] # arcs whose values are text rather than terms
 ext_re = re.compile(r'([^\w,])+')
 all_layers = {}
 all_terms = {}
@@ -99,7 +138,7 @@ class Unit ():
 
     def __init__ (self, id):
         self.id = id
-        NodeIDMap[id] = self
+        GraphNodeMap()[id] = self
         self.arcsIn = []
         self.arcsOut = []
         self.examples = []
@@ -122,8 +161,9 @@ class Unit ():
         Argument:
         createp -- should we create node if we don't find it? (default: False)
         """
-        if (id in NodeIDMap):
-            return NodeIDMap[id]
+        nodes = GraphNodeMap()
+        if (id in nodes):
+            return nodes[id]
         if (createp != False):
             return Unit(id)
 
@@ -278,6 +318,13 @@ class Unit ():
         else:
             return "Fewer than 10 domains"
 
+def usageRank(node):
+    """Numeric form of Unit.usage (a bucket from data/*vocab_counts.txt; 0 when unknown)."""
+    try:
+        return int(node.usage)
+    except (TypeError, ValueError, AttributeError):
+        return 0
+
 # NOTE: each Triple is in exactly one layer, by default 'core'. When we
 # read_schemas() from data/ext/{x}/*.rdfa each schema triple is given a
 # layer named "x". Access to triples can default to layer="core" or take
@@ -290,6 +337,124 @@ class Unit ():
 # Units, on the other hand, are layer-independent. For now we have only a
 # crude inLayer(layerlist, unit) API to check which layers mention a term.
 
+class UsingGraph:
+    """Reads another graph (with nodes and a version, e.g. a releases.ReleaseGraph) instead of the live one.
+
+    Use as "with UsingGraph(graph): ..."; on this thread Unit.GetUnit then
+    finds and creates Units in graph.nodes, and cached entries are kept apart
+    from the live graph's under a CacheScope named for graph.version.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.scope = caches.CacheScope("v%s" % graph.version)
+
+    def __enter__(self):
+        active.__dict__.setdefault("graphs", []).append(self.graph)
+        self.scope.__enter__()
+        return self.graph
+
+    def __exit__(self, *exc_info):
+        self.scope.__exit__(*exc_info)
+        active.graphs.pop()
+        return False
+
+def ActiveGraph():
+    """The graph entered with UsingGraph on this thread, or None for the live graph."""
+    graphs = getattr(active, "graphs", None)
+    if graphs:
+        return graphs[-1]
+    return None
+
+def GraphNodeMap():
+    """Units by id in the graph being read: NodeIDMap unless within UsingGraph."""
+    graph = ActiveGraph()
+    if graph is None:
+        return NodeIDMap
+    return graph.nodes
+
+def GraphStream(graph, chunks):
+    """Pass chunks through, producing each within UsingGraph(graph); for output streamed after the handler returns."""
+    chunks = iter(chunks)
+    while True:
+        with UsingGraph(graph):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        yield chunk
+
+
+class GraphLock:
+    """Lets many threads read the live graph at once, or one thread change it.
+
+    Requests read within "with graph_lock.reading():" and ReloadSchemas and
+    PatchTriples change the graph within writing(). A writer waits for the
+    readers already in progress and keeps new ones waiting until it is done,
+    so no request sees a graph that is half loaded, or builds a DataCache
+    index from one. Both nest on a thread, and a writer may also read.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = None # the thread changing the graph
+        self.writers_waiting = 0
+        self.held = threading.local() # .depth: nested reading() and writing() on this thread
+
+    @contextmanager
+    def reading(self):
+        depth = getattr(self.held, "depth", 0)
+        if not depth:
+            with self.condition:
+                while self.writer is not None or self.writers_waiting:
+                    self.condition.wait()
+                self.readers += 1
+        self.held.depth = depth + 1
+        try:
+            yield
+        finally:
+            self.held.depth = depth
+            if not depth:
+                with self.condition:
+                    self.readers -= 1
+                    if not self.readers:
+                        self.condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        depth = getattr(self.held, "depth", 0)
+        me = threading.current_thread()
+        if depth and self.writer is not me:
+            raise RuntimeError("The graph can't be changed by a thread that is reading it.")
+        if not depth:
+            with self.condition:
+                self.writers_waiting += 1
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+                self.writers_waiting -= 1
+                self.writer = me
+        self.held.depth = depth + 1
+        try:
+            yield
+        finally:
+            self.held.depth = depth
+            if not depth:
+                with self.condition:
+                    self.writer = None
+                    self.condition.notify_all()
+
+graph_lock = GraphLock()
+
+def ReadingStream(chunks):
+    """Pass chunks through, producing each while reading the live graph (see GraphLock); for output streamed after the handler returns."""
+    chunks = iter(chunks)
+    while True:
+        with graph_lock.reading():
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        yield chunk
+
 class Triple ():
     """Triple represents an edge in the graph: source, arc and target/text."""
     def __init__ (self, source, arc, target, text, layer='core'):
@@ -344,6 +509,7 @@ class Triple ():
 def GetTargets(arc, source, layers='core'):
     """All values for a specified arc on specified graph node (within any of the specified layers)."""
     # log.debug("GetTargets checking in layer: %s for unit: %s arc: %s" % (layers, source.id, arc.id))
+    caches.NoteDependency(source.id)
     targets = {}
     for triple in source.arcsOut:
         if (triple.arc == arc):
@@ -356,6 +522,7 @@ def GetTargets(arc, source, layers='core'):
 def GetSources(arc, target, layers='core'):
     """All source nodes for a specified arc pointing to a specified node (within any of the specified layers)."""
     log.debug("GetSources checking in layer: %s for unit: %s arc: %s" % (layers, target.id, arc.id))
+    caches.NoteDependency(target.id)
     sources = {}
     for triple in target.arcsIn:
         if (triple.arc == arc and triple.layer in layers):
@@ -364,6 +531,7 @@ def GetSources(arc, target, layers='core'):
 
 def GetArcsIn(target, layers='core'):
     """All incoming arc types for this specified node (within any of the specified layers)."""
+    caches.NoteDependency(target.id)
     arcs = {}
     for triple in target.arcsIn:
         if triple.layer in layers:
@@ -372,6 +540,7 @@ def GetArcsIn(target, layers='core'):
 
 def GetArcsOut(source,  layers='core'):
     """All outgoing arc types for this specified node."""
+    caches.NoteDependency(source.id)
     arcs = {}
     for triple in source.arcsOut:
         if triple.layer in layers:
@@ -470,105 +639,821 @@ def HasMultipleBaseTypes(typenode, layers='core'):
     """True if this unit represents a type with more than one immediate supertype."""
     return len( GetTargets( Unit.GetUnit("rdfs:subClassOf"), typenode, layers ) ) > 1
 
-class TypeHierarchyTree:
+def CachedIndex(cachekey, build):
+    """The value kept in DataCache under cachekey, or build() stored there first.
+
+    For indexes worked out from the whole graph (e.g. SchemaIndex): the entry
+    depends on every term, so it is rebuilt after any change to the graph.
+    """
+    index = DataCache.get(cachekey)
+    if index == None:
+        with caches.DependencyRecording():
+            caches.NoteDependency("*") # built from every term
+            index = build()
+            DataCache[cachekey] = index
+    return index
+
+class SchemaIndex:
+    """What the site-wide summaries need about every term, gathered in one sweep over the triples.
+
+    Answers the same questions as GetSources/GetTargets on domainIncludes,
+    rangeIncludes and rdfs:subClassOf, superseded() and GetComment, without scanning each term's
+    arcs again. Use GetSchemaIndex(), which keeps one index per layer set.
+    """
+
+    def __init__(self, layers='core'):
+        self.layers = layers
+        self.domains = {} # property -> types in its domainIncludes
+        self.ranges = {} # property -> types in its rangeIncludes
+        self.props4type = {} # type -> properties with it in their domainIncludes
+        self.props2type = {} # type -> properties with it in their rangeIncludes
+        self.subtypes = {} # type -> its immediate subtypes
+        self.properties = set() # terms typed rdf:Property
+        self.types = {} # term -> its rdf:types
+        self.superseded = set() # terms with a supersededBy
+        self.comments = {} # term -> its rdfs:comment texts, in the order GetComment sees them
+        for node in GraphNodeMap().values():
+            for t in node.arcsOut:
+                if t.layer not in layers:
+                    continue
+                arc = t.arc.id
+                if arc == "domainIncludes" and t.target != None:
+                    self.domains.setdefault(node, set()).add(t.target)
+                    self.props4type.setdefault(t.target, set()).add(node)
+                elif arc == "rangeIncludes" and t.target != None:
+                    self.ranges.setdefault(node, set()).add(t.target)
+                    self.props2type.setdefault(t.target, set()).add(node)
+                elif arc == "rdfs:subClassOf" and t.target != None:
+                    self.subtypes.setdefault(t.target, set()).add(node)
+                elif arc == "typeOf" and t.target != None:
+                    self.types.setdefault(node, set()).add(t.target)
+                    if t.target.id == "rdf:Property":
+                        self.properties.add(node)
+                elif arc == "supersededBy":
+                    self.superseded.add(node)
+                elif arc == "rdfs:comment" and t.text != None:
+                    self.comments.setdefault(node, {})[t.text] = 1
+
+    def comment(self, node):
+        """As GetComment(node)."""
+        texts = self.comments.get(node)
+        if texts:
+            return texts.keys()[0]
+        return "No comment"
+
+    def propertiesOf(self, cl):
+        """Properties used on this type (not superseded), sorted by id."""
+        return sorted([p for p in self.props4type.get(cl, []) if p not in self.superseded], key=lambda u: u.id)
+
+    def propertiesInto(self, cl):
+        """Properties whose values may be of this type (not superseded), sorted by id."""
+        return sorted([p for p in self.props2type.get(cl, []) if p not in self.superseded], key=lambda u: u.id)
+
+    def subtypesOf(self, cl):
+        """As GetImmediateSubtypes(cl)."""
+        return sorted(self.subtypes.get(cl, []), key=lambda u: u.id)
+
+    def domainsOf(self, prop):
+        """Types this property is used on, sorted by id."""
+        return sorted(self.domains.get(prop, []), key=lambda u: u.id)
+
+    def rangesOf(self, prop):
+        """Types of this property's values, sorted by id."""
+        return sorted(self.ranges.get(prop, []), key=lambda u: u.id)
+
+def GetSchemaIndex(layers='core'):
+    """The SchemaIndex for these layers (see CachedIndex)."""
+    if isinstance(layers, basestring):
+        layers = [layers]
+    cachekey = "SchemaIndex:%s" % ",".join(sorted(layers))
+    return CachedIndex(cachekey, lambda: SchemaIndex(layers))
+
+class ClosureIndex:
+    """Which properties apply to which types once inheritance is taken into account.
+
+    A property can be used on the types in its domainIncludes and all their
+    subtypes, and takes values of the types in its rangeIncludes and all their
+    subtypes; so a type has the properties of all its supertypes, and can be
+    the value of theirs. Built on the SchemaIndex, with the supertypes and
+    subtypes of each type worked out once. Use GetClosureIndex(), which keeps
+    one per layer set.
+    """
+
+    def __init__(self, layers='core'):
+        self.layers = layers
+        self.index = GetSchemaIndex(layers)
+        self.supertypes = {} # type -> its immediate supertypes
+        for (cl, subs) in self.index.subtypes.items():
+            for sub in subs:
+                self.supertypes.setdefault(sub, set()).add(cl)
+        self.up = {} # type -> ancestors(type)
+        self.down = {} # type -> descendants(type)
+        self.answers = {} # (query, term, superseded) -> sorted terms
+
+    def closure(self, node, links, found):
+        if node not in found:
+            reached = set([node])
+            stack = [node]
+            while stack:
+                for y in links.get(stack.pop(), ()):
+                    if y not in reached:
+                        reached.add(y)
+                        stack.append(y)
+            found[node] = reached
+        return found[node]
+
+    def ancestors(self, cl):
+        """cl and all its supertypes, as a set."""
+        return self.closure(cl, self.supertypes, self.up)
+
+    def descendants(self, cl):
+        """cl and all its subtypes, as a set."""
+        return self.closure(cl, self.index.subtypes, self.down)
+
+    def answer(self, query, node, superseded, build):
+        key = (query, node, superseded)
+        if key not in self.answers:
+            terms = build()
+            if not superseded:
+                terms = [t for t in terms if t not in self.index.superseded]
+            self.answers[key] = sorted(terms, key=lambda u: u.id)
+        return self.answers[key]
+
+    def inherited(self, cl, links):
+        found = set()
+        for t in self.ancestors(cl):
+            found.update(links.get(t, ()))
+        return found
+
+    def inheritedDomain(self, prop, superseded=False):
+        """The types prop can be used on: those in its domainIncludes and their subtypes, sorted by id."""
+        return self.answer("domain", prop, superseded,
+            lambda: set(t for d in self.index.domains.get(prop, ()) for t in self.descendants(d)))
+
+    def inheritedRange(self, prop, superseded=False):
+        """The types of the values prop takes: those in its rangeIncludes and their subtypes, sorted by id."""
+        return self.answer("range", prop, superseded,
+            lambda: set(t for r in self.index.ranges.get(prop, ()) for t in self.descendants(r)))
+
+    def applicableProperties(self, cl, superseded=False):
+        """The properties usable on cl: those with cl or one of its supertypes in their domainIncludes, sorted by id."""
+        return self.answer("properties", cl, superseded, lambda: self.inherited(cl, self.index.props4type))
+
+    def incomingProperties(self, cl, superseded=False):
+        """The properties cl can be a value of: those with cl or one of its supertypes in their rangeIncludes, sorted by id."""
+        return self.answer("incoming", cl, superseded, lambda: self.inherited(cl, self.index.props2type))
+
+def GetClosureIndex(layers='core'):
+    """The ClosureIndex for these layers (see CachedIndex)."""
+    if isinstance(layers, basestring):
+        layers = [layers]
+    cachekey = "ClosureIndex:%s" % ",".join(sorted(layers))
+    return CachedIndex(cachekey, lambda: ClosureIndex(layers))
+
+def GetInheritedDomain(prop, layers='core', superseded=False):
+    """Types this property can be used on, including subtypes of its domainIncludes, sorted by id. Superseded types are left out unless asked for."""
+    return GetClosureIndex(layers).inheritedDomain(prop, superseded)
+
+def GetInheritedRange(prop, layers='core', superseded=False):
+    """Types this property's values can have, including subtypes of its rangeIncludes, sorted by id. Superseded types are left out unless asked for."""
+    return GetClosureIndex(layers).inheritedRange(prop, superseded)
+
+def GetApplicableProperties(cl, layers='core', superseded=False):
+    """Properties usable on this type, including those of its supertypes, sorted by id. Superseded properties are left out unless asked for."""
+    return GetClosureIndex(layers).applicableProperties(cl, superseded)
+
+def GetIncomingProperties(cl, layers='core', superseded=False):
+    """Properties whose values can be of this type, including those expecting a supertype, sorted by id. Superseded properties are left out unless asked for."""
+    return GetClosureIndex(layers).incomingProperties(cl, superseded)
+
+PATH_MAX_HOPS = 3 # longest property path PropertyGraph.paths looks for, unless asked for longer
+PATH_REMEMBERED = 10000 # answers each PropertyGraph remembers
+
+class PropertyGraph:
+    """Which properties lead from one type to another, for finding property paths between types.
+
+    There is an edge from type X through property p to type R when p can be
+    used on X (its domainIncludes has X or a supertype of X) and R is in its
+    rangeIncludes. A path from A to B ends with a property whose range is B or
+    a subtype of B (its values are Bs); failing any such path, with one whose
+    range is a supertype of B (a B may be its value, as with about: Thing).
+    Superseded properties are left out. Use GetPropertyGraph(), which keeps one
+    per layer set.
+    """
+
+    def __init__(self, layers='core'):
+        self.closures = GetClosureIndex(layers)
+        index = self.closures.index
+        self.ids = {} # type id -> type
+        for (cl, subs) in index.subtypes.items():
+            self.ids[cl.id] = cl
+            for sub in subs:
+                self.ids[sub.id] = sub
+        properties = {} # type id -> ids of the properties in whose domain it is
+        ranges = {} # property id -> range type ids
+        for (prop, domains) in index.domains.items():
+            if prop in index.superseded:
+                continue
+            ranges[prop.id] = sorted(t.id for t in index.ranges.get(prop, []))
+            for t in domains:
+                properties.setdefault(t.id, []).append(prop.id)
+                self.ids[t.id] = t
+            for t in index.ranges.get(prop, []):
+                self.ids[t.id] = t
+        types = self.ids.keys()
+        self.edges = {} # type id -> [(property id, range type id)]
+        self.reverse = {} # type id -> [(type id, property id)] with an edge into it
+        for t in types:
+            edges = sorted(set((p, r) for a in self.ancestors(t) for p in properties.get(a, []) for r in ranges[p]))
+            self.edges[t] = edges
+            for (p, r) in edges:
+                self.reverse.setdefault(r, []).append((t, p))
+        self.remembered = OrderedDict() # (from, to, hops) -> paths
+        self.remembering = threading.Lock() # requests on many threads share one graph
+
+    def __contains__(self, t):
+        return t in self.edges
+
+    def ancestors(self, t):
+        """The ids of t and all its supertypes."""
+        return [cl.id for cl in self.closures.ancestors(self.ids[t])]
+
+    def descendants(self, t):
+        """The ids of t and all its subtypes."""
+        return [cl.id for cl in self.closures.descendants(self.ids[t])]
+
+    def paths(self, start, goal, hops=PATH_MAX_HOPS, limit=20):
+        """The shortest property paths from type start to type goal, of at most hops properties.
+
+        Each path is a list of (property id, range type id) steps; at most limit
+        are given.
+        """
+        key = (start, goal, hops)
+        with self.remembering:
+            found = self.remembered.get(key)
+        if found is None:
+            if start not in self.edges or goal not in self.edges:
+                found = []
+            else:
+                found = self.search(start, set(self.descendants(goal)), hops) or self.search(start, set(self.ancestors(goal)), hops)
+            with self.remembering:
+                self.remembered[key] = found
+                if len(self.remembered) > PATH_REMEMBERED:
+                    self.remembered.popitem(last=False)
+        return [list(path) for path in found[:limit]]
+
+    def search(self, start, ends, hops):
+        """The shortest paths from start to any of the types in ends, sorted.
+
+        Searches breadth first, forward from start and back from a sink that
+        every step into ends leads to, a level at a time from the smaller side.
+        """
+        sink = None
+        forward = { start: 0 }
+        backward = { sink: 0 }
+        parents = { start: [] } # type -> [(previous type, property)] on shortest paths from start
+        children = { sink: [] } # type -> [(property, range, next type)] on shortest paths to the sink
+        forward_level = [start]
+        backward_level = [sink]
+        depth_f = depth_b = 0
+        meeting = []
+        while forward_level and backward_level and not meeting and depth_f + depth_b < hops:
+            if depth_b > 0 and len(forward_level) <= len(backward_level): # the sink's own level comes first
+                depth = depth_f = depth_f + 1
+                level = []
+                for x in forward_level:
+                    for (p, r) in self.edges.get(x, []):
+                        if r not in forward:
+                            forward[r] = depth
+                            parents[r] = []
+                            level.append(r)
+                        if forward[r] == depth:
+                            parents[r].append((x, p))
+                forward_level = level
+            else:
+                depth = depth_b = depth_b + 1
+                level = []
+                for y in backward_level:
+                    if y is sink:
+                        into = [(x, p, r) for r in ends for (x, p) in self.reverse.get(r, [])]
+                    else:
+                        into = [(x, p, y) for (x, p) in self.reverse.get(y, [])]
+                    for (x, p, r) in into:
+                        if x not in backward:
+                            backward[x] = depth
+                            children[x] = []
+                            level.append(x)
+                        if backward[x] == depth:
+                            children[x].append((p, r, y))
+                backward_level = level
+            meeting = [t for t in forward if t in backward]
+        if not meeting:
+            return []
+        # Each shortest path has one type at this position, reached by both searches.
+        shortest = min(forward[t] + backward[t] for t in meeting)
+        position = min(depth_f, shortest - 1)
+        paths = set()
+        for m in meeting:
+            if forward[m] == position and backward[m] == shortest - position:
+                for head in self.pathsTo(m, parents):
+                    for tail in self.pathsFrom(m, children):
+                        paths.add(tuple(head + tail))
+        return sorted(paths)
+
+    def pathsTo(self, t, parents):
+        if not parents[t]:
+            return [[]]
+        return [head + [(p, t)] for (x, p) in parents[t] for head in self.pathsTo(x, parents)]
+
+    def pathsFrom(self, t, children):
+        if t is None:
+            return [[]]
+        return [[(p, r)] + tail for (p, r, y) in children[t] for tail in self.pathsFrom(y, children)]
+
+def GetPropertyGraph(layers='core'):
+    """The PropertyGraph for these layers (see CachedIndex)."""
+    if isinstance(layers, basestring):
+        layers = [layers]
+    cachekey = "PropertyGraph:%s" % ",".join(sorted(layers))
+    return CachedIndex(cachekey, lambda: PropertyGraph(layers))
+
+hump_re = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z0-9]+') # "DDxElement" -> D, Dx, Element
+query_hump_re = re.compile(r'[A-Z][a-z0-9]*|[a-z0-9]+') # "LoBu" -> Lo, Bu; "LB" -> L, B
+
+class TermLookup:
+    """Finds terms by the start of their id, or by the starts of its CamelCase humps ("LoBu" for LocalBusiness).
+
+    Matching ignores case. Two sorted arrays, of lowercased ids and of hump
+    initials ("lb"), are searched with bisect; matches are ranked by Unit.usage.
+    Use GetTermLookup(), which keeps one per layer set.
+    """
+
+    def __init__(self, layers='core'):
+        self.layers = layers
+        terms = [] # (id, rdf:type ids, usage)
+        for node in GraphNodeMap().values():
+            if ":" in node.id:
+                continue
+            types = sorted(t.target.id for t in node.arcsOut if t.arc.id == "typeOf" and t.target != None and t.layer in layers)
+            if types:
+                terms.append((node.id, types, usageRank(node)))
+        terms.sort()
+        self.ids = [id for (id, types, usage) in terms]
+        self.types = [types for (id, types, usage) in terms]
+        self.humps = [[h.lower() for h in hump_re.findall(id)] for id in self.ids]
+        self.ranks = [(-usage, len(id), id) for (id, types, usage) in terms]
+        self.prefixes, self.prefix_terms = self.sortedKeys([id.lower() for id in self.ids])
+        self.initials, self.initial_terms = self.sortedKeys(["".join(h[0] for h in humps) for humps in self.humps])
+
+    @staticmethod
+    def sortedKeys(keys):
+        order = sorted(range(len(keys)), key=lambda i: keys[i])
+        return [keys[i] for i in order], order
+
+    @staticmethod
+    def startingWith(keys, positions, prefix):
+        i = bisect.bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            yield positions[i]
+            i += 1
+
+    def humpsMatch(self, term, query):
+        humps = self.humps[term]
+        if len(query) > len(humps):
+            return False
+        for (q, h) in zip(query, humps):
+            if not h.startswith(q):
+                return False
+        return True
+
+    def lookup(self, query, limit=10):
+        """Up to limit (id, rdf:type ids) matching query, exact matches first, then by usage."""
+        if not query:
+            return []
+        q = query.lower()
+        found = set(self.startingWith(self.prefixes, self.prefix_terms, q))
+        humps = [h.lower() for h in query_hump_re.findall(query)]
+        if len(humps) > 1:
+            initials = "".join(h[0] for h in humps)
+            found.update(t for t in self.startingWith(self.initials, self.initial_terms, initials) if self.humpsMatch(t, humps))
+        best = heapq.nsmallest(limit, found, key=lambda t: (self.ids[t].lower() != q, self.ranks[t]))
+        return [(self.ids[t], self.types[t]) for t in best]
+
+def GetTermLookup(layers='core'):
+    """The TermLookup for these layers (see CachedIndex)."""
+    if isinstance(layers, basestring):
+        layers = [layers]
+    cachekey = "TermLookup:%s" % ",".join(sorted(layers))
+    return CachedIndex(cachekey, lambda: TermLookup(layers))
+
+SPELLING_MAX_DISTANCE = 2 # edits (insert, delete, substitute or swap two letters) a suggestion may be from the missing id
+SPELLING_SHORT_ID = 4 # ids this long or shorter are only suggested one edit away
+SPELLING_PREFIX = 7 # only the deletes of this many leading characters are indexed, as in SymSpell
+SPELLING_REMEMBERED = 10000 # missing ids whose suggestions each SpellingIndex remembers
+
+def editDeletes(word, distance):
+    """word and every string made by deleting up to distance of its characters."""
+    found = set([word])
+    level = found
+    for i in range(distance):
+        level = set(w[:j] + w[j + 1:] for w in level for j in range(len(w)))
+        found |= level
+    return found
+
+def EditDistance(a, b, bound=None):
+    """Edits to turn a into b, counting a swap of adjacent characters as one (optimal string alignment distance).
+
+    Given a bound, stops early with some number above it once the distance must be more.
+    """
+    start = 0 # what the two share at either end costs nothing, so compare only the middles
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    previous2 = None
+    previous = range(len(b) + 1)
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], previous2[j - 2] + 1)
+        if bound is not None and min(row) > bound and min(previous) > bound:
+            return bound + 1
+        previous2, previous = previous, row
+    return previous[len(b)]
+
+class SpellingIndex:
+    """Suggests terms for a mistyped id ("Persn", "locaBusiness"), by symmetric delete.
+
+    The start of each id, lowercased, is filed under every string made by
+    deleting up to SPELLING_MAX_DISTANCE of its letters; a query's own deletes
+    find the candidates in a few dictionary lookups, and only those are
+    measured with EditDistance. Suggestions are ranked by distance, then Unit.usage, and
+    remembered per query. Use GetSpellingIndex(), which keeps one per layer set.
+    """
+
+    def __init__(self, layers='core'):
+        self.layers = layers
+        self.deletes = {} # deleted form -> positions in self.ids
+        self.ids = []
+        self.usage = []
+        self.longest = 0
+        self.remembered = OrderedDict() # lowercased query -> suggestions
+        self.remembering = threading.Lock() # requests on many threads share one index
+        for id, termlayers in sorted(all_terms.items()):
+            if ":" in id or (layers is not None and not any(l in layers for l in termlayers)):
+                continue
+            position = len(self.ids)
+            self.ids.append(id)
+            self.usage.append(usageRank(Unit.GetUnit(id)))
+            self.longest = max(self.longest, len(id))
+            for d in editDeletes(id.lower()[:SPELLING_PREFIX], self.maxDistance(id)):
+                self.deletes.setdefault(d, []).append(position)
+
+    @staticmethod
+    def maxDistance(word):
+        if len(word) <= SPELLING_SHORT_ID:
+            return 1
+        return SPELLING_MAX_DISTANCE
+
+    def suggest(self, query, limit=3):
+        """Up to limit ids within a few edits of query, closest and then most used first."""
+        q = query.lower()
+        with self.remembering:
+            suggestions = self.remembered.get(q)
+        if suggestions is None:
+            suggestions = self.lookup(q)
+            with self.remembering:
+                self.remembered[q] = suggestions
+                if len(self.remembered) > SPELLING_REMEMBERED:
+                    self.remembered.popitem(last=False)
+        return suggestions[:limit]
+
+    def lookup(self, q, limit=10):
+        distance = self.maxDistance(q)
+        if not q or len(q) > self.longest + distance:
+            return []
+        candidates = set()
+        for d in editDeletes(q[:SPELLING_PREFIX], distance):
+            candidates.update(self.deletes.get(d, []))
+        ranked = []
+        for t in candidates:
+            bound = min(distance, self.maxDistance(self.ids[t]))
+            if abs(len(self.ids[t]) - len(q)) > bound:
+                continue
+            edits = EditDistance(q, self.ids[t].lower(), bound)
+            if edits <= bound:
+                ranked.append((edits, -self.usage[t], self.ids[t]))
+        return [id for (edits, usage, id) in heapq.nsmallest(limit, ranked)]
+
+def GetSpellingIndex(layers='core'):
+    """The SpellingIndex for these layers, or None for all of them (see CachedIndex)."""
+    if isinstance(layers, basestring):
+        layers = [layers]
+    cachekey = "SpellingIndex:%s" % (",".join(sorted(layers)) if layers is not None else "*")
+    return CachedIndex(cachekey, lambda: SpellingIndex(layers))
+
+class RedirectTable:
+    """Where to send requests for paths that aren't a term's id but stand for one.
+
+    Each superseded term goes to the newest of its successors ("actors" to
+    "actor"), and a term's id in other cases ("person", "PERSON") to the term,
+    unless it could be more than one ("SEASON": Season or season). Use
+    GetRedirectTable(), which builds it once per graph change.
+    """
 
     def __init__(self):
-        self.txt = ""
+        terms = [id for id in all_terms if ":" not in id]
+        self.terms = set(terms)
+        successors = {}
+        for id in terms:
+            node = NodeIDMap.get(id)
+            if node is None:
+                continue
+            for t in node.arcsOut:
+                if t.arc.id == "supersededBy" and t.target is not None:
+                    successors[id] = t.target.id
+                    break
+        def newest(id):
+            seen = set()
+            while id in successors and id not in seen:
+                seen.add(id)
+                id = successors[id]
+            return id
+        self.superseded = dict((id, newest(id)) for id in successors) # superseded id -> id
+        spellings = {}
+        for id in terms:
+            spellings.setdefault(id.lower(), []).append(id)
+        self.spellings = dict((lower, newest(ids[0])) for (lower, ids) in spellings.items() if len(ids) == 1) # lowercased id -> id
+
+    def target(self, path):
+        """The id of the term to send path to, or None."""
+        target = self.superseded.get(path)
+        if target is None and path not in self.terms:
+            target = self.spellings.get(path.lower())
+        if target == path:
+            return None
+        return target
+
+def GetRedirectTable():
+    """The RedirectTable (see CachedIndex)."""
+    return CachedIndex("RedirectTable", RedirectTable)
+
+SEARCH_RELEASES_INDEXED = 4 # search indexes kept for graphs other than the live one; the first built is dropped first
+search_indexes = OrderedDict() # "<graph version>:<layers>" -> textindex.InvertedIndex; see GetSearchIndex
+search_lock = threading.Lock()
+
+def SearchText(node, layers='core'):
+    """The text that search finds a term by: its id, the words of its id and its rdfs:comments, in these layers."""
+    if ":" in node.id or not any(t.layer in layers for t in node.arcsOut):
+        return None
+    words = hump_re.findall(node.id)
+    text = node.id
+    if len(words) > 1:
+        text += u" (%s)" % u" ".join(words)
+    for t in node.arcsOut:
+        if t.arc.id == "rdfs:comment" and t.text is not None and t.layer in layers:
+            text += u". " + textindex.PlainText(t.text)
+    return text
+
+def GetSearchIndex(layers='core'):
+    """The full-text index of the terms in these layers, built on first use.
+
+    Unlike the indexes kept in DataCache, the live graph's are not rebuilt
+    after a reload or patch: ReloadSchemas and PatchTriples re-index just the
+    changed terms (see UpdateSearchIndexes). Other graphs are read-only, and
+    only the last SEARCH_RELEASES_INDEXED of their indexes are kept.
+    """
+    if isinstance(layers, basestring):
+        layers = [layers]
+    graph = ActiveGraph()
+    key = "%s:%s" % (graph.version if graph is not None else "latest", ",".join(sorted(layers)))
+    index = search_indexes.get(key)
+    if index is None:
+        with search_lock:
+            index = search_indexes.get(key)
+            if index is None:
+                index = textindex.InvertedIndex()
+                for node in GraphNodeMap().values():
+                    text = SearchText(node, layers)
+                    if text:
+                        index.add(node.id, text)
+                search_indexes[key] = index
+                released = [k for k in search_indexes if not k.startswith("latest:")]
+                for k in released[:-SEARCH_RELEASES_INDEXED]:
+                    del search_indexes[k]
+    return index
+
+def SearchTerms(query, layers='core', limit=10):
+    """The ids of the terms best matching query, with their BM25 scores: [(score, id)], best first."""
+    return GetSearchIndex(layers).search(query, limit)
+
+def UpdateSearchIndexes(ids):
+    """Re-index these terms of the live graph in each of its search indexes that has been built."""
+    with search_lock:
+        for key, index in search_indexes.items():
+            version, layers = key.split(":", 1)
+            if version != "latest":
+                continue
+            layers = layers.split(",")
+            for id in ids:
+                node = NodeIDMap.get(id)
+                text = SearchText(node, layers) if node is not None else None
+                if text:
+                    index.add(id, text)
+                else:
+                    index.remove(id)
+
+TREE_JSONLD_CONTEXT = OrderedDict([
+    ("rdfs", "http://www.w3.org/2000/01/rdf-schema#"),
+    ("schema", "http://schema.org/"),
+    ("rdfs:subClassOf", { "@type": "@id" }),
+    ("name", "rdfs:label"),
+    ("description", "rdfs:comment"),
+    ("children", { "@reverse": "rdfs:subClassOf" }),
+])
+
+def GetSubtypeTree(root, depth=None, layers='core'):
+    """The type hierarchy below root as JSON-LD ready data, in the same shape as docs/tree.jsonld.
+
+    With a depth, subtypes more than depth levels below root are left out and
+    the types whose children were cut off get a "childCount" instead. As in the
+    full tree, a type reached twice (e.g. Restaurant) is only listed the first
+    time, in depth-first order, so under the same supertype as there.
+    """
+    index = GetSchemaIndex(layers)
+    visited = set()
+
+    def describe(node, supertype, level):
+        visited.add(node)
+        comment = re.sub('<[^<]+?>', '', index.comment(node).strip())[:60]
+        entry = OrderedDict()
+        if supertype == None:
+            entry["@context"] = TREE_JSONLD_CONTEXT
+        entry["@type"] = "rdfs:Class"
+        if supertype != None:
+            entry["rdfs:subClassOf"] = "schema:%s" % supertype.id
+        entry["description"] = comment + "..."
+        entry["name"] = node.id
+        entry["@id"] = "schema:%s" % node.id
+        subtypes = [st for st in index.subtypesOf(node) if st not in visited]
+        if subtypes and depth != None and level >= depth:
+            entry["childCount"] = len(subtypes)
+        elif subtypes:
+            # a subtype may be listed by an earlier sibling's subtree meanwhile
+            entry["children"] = [describe(st, node, level + 1) for st in subtypes if st not in visited]
+        return entry
+
+    return describe(root, None, 0)
+
+class TypeHierarchyTree:
+    """HTML or JSON-LD rendering of the type hierarchy below a node.
+
+    generateHTML() and generateJSONLD() yield the output piece by piece, e.g.
+    for a streamed response or a template loop. The traverseFor* methods
+    write it to out (anything with a write() method) instead; without one it
+    is collected for toHTML() and toJSON(). Each node's sorted subtypes are
+    looked up once per tree, so use a tree with a single set of layers.
+    """
+
+    def __init__(self, out=None):
+        self.parts = []
+        if out is None:
+            self.write = self.parts.append
+        else:
+            self.write = out.write
         self.visited = {}
+        self.subtypes = {}
 
     def emit(self, s):
-        self.txt += s + "\n"
+        self.write(s)
+        self.write("\n")
 
     def toHTML(self):
-        return '<ul>%s</ul>' % self.txt
+        return '<ul>%s</ul>' % "".join(self.parts)
 
     def toJSON(self):
-        return self.txt
+        return "".join(self.parts)
+
+    def immediateSubtypes(self, node, layers='core'):
+        subs = self.subtypes.get(node.id)
+        if subs is None:
+            subs = GetImmediateSubtypes(node, layers=layers)
+            self.subtypes[node.id] = subs
+        return subs
+
+    def traverseForHTML(self, node, depth = 1, hashorslash="/", layers='core'):
+        """Generate a hierarchical tree view of the types. hashorslash is used for relative link prefixing."""
+        for s in self.htmlLines(node, depth, hashorslash, layers):
+            self.write(s)
 
-    def traverseForHTML(self, node, depth = 1, layers='core'):
+    def generateHTML(self, node, hashorslash="/", layers='core'):
+        """As toHTML() after traverseForHTML(node), but yielded as it is built."""
+        yield '<ul>'
+        for s in self.htmlLines(node, 1, hashorslash, layers):
+            yield s
+        yield '</ul>'
+
+    def htmlLines(self, node, depth, hashorslash, layers):
+
+        # log.debug("traverseForHTML: node=%s hashorslash=%s" % ( node.id, hashorslash ))
+        subtypes = self.immediateSubtypes(node, layers=layers)
+        indent = " " * 4 * depth
 
         # we are a supertype of some kind
-        if len(node.GetImmediateSubtypes(layers=layers)) > 0:
+        if len(subtypes) > 0:
 
             # and we haven't been here before
             if node.id not in self.visited:
                 self.visited[node.id] = True # remember our visit
-                self.emit( ' %s<li class="tbranch" id="%s"><a href="/%s">%s</a>' % (" " * 4 * depth, node.id, node.id, node.id) )
-                self.emit(' %s<ul>' % (" " * 4 * depth))
+                yield ' %s<li class="tbranch" id="%s"><a href="%s%s">%s</a>\n' % (indent, node.id, hashorslash, node.id, node.id)
+                yield ' %s<ul>\n' % indent
 
                 # handle our subtypes
-                for item in node.GetImmediateSubtypes(layers=layers):
-                    self.traverseForHTML(item, depth + 1, layers=layers)
-                self.emit( ' %s</ul>' % (" " * 4 * depth))
+                for item in subtypes:
+                    for s in self.htmlLines(item, depth + 1, hashorslash, layers):
+                        yield s
+                yield ' %s</ul>\n' % indent
             else:
                 # we are a supertype but we visited this type before, e.g. saw Restaurant via Place then via Organization
                 seen = '  <a href="#%s">*</a> ' % node.id
-                self.emit( ' %s<li class="tbranch" id="%s"><a href="/%s">%s</a>%s' % (" " * 4 * depth, node.id, node.id, node.id, seen) )
+                yield ' %s<li class="tbranch" id="%s"><a href="%s%s">%s</a>%s\n' % (indent, node.id, hashorslash, node.id, node.id, seen)
 
         # leaf nodes
-        if len(node.GetImmediateSubtypes(layers=layers)) == 0:
-            if node.id not in self.visited:
-                self.emit( '%s<li class="tleaf" id="%s"><a href="/%s">%s</a>%s' % (" " * depth, node.id, node.id, node.id, "" ))
-            #else:
-                #self.visited[node.id] = True # never...
-                # we tolerate "VideoGame" appearing under both Game and SoftwareApplication
-                # and would only suppress it if it had its own subtypes. Seems legit.
+        elif node.id not in self.visited:
+            yield '%s<li class="tleaf" id="%s"><a href="%s%s">%s</a>%s\n' % (" " * depth, node.id, hashorslash, node.id, node.id, "" )
+            # we tolerate "VideoGame" appearing under both Game and SoftwareApplication
+            # and would only suppress it if it had its own subtypes. Seems legit.
 
-        self.emit( ' %s</li>' % (" " * 4 * depth) )
+        yield ' %s</li>\n' % indent
 
-    # based on http://danbri.org/2013/SchemaD3/examples/4063550/hackathon-schema.js  - thanks @gregg, @sandro
     def traverseForJSONLD(self, node, depth = 0, last_at_this_level = True, supertype="None", layers='core'):
+        for s in self.jsonldLines(node, depth, last_at_this_level, supertype, layers):
+            self.write(s)
+
+    def generateJSONLD(self, node, layers='core'):
+        """As toJSON() after traverseForJSONLD(node), but yielded as it is built."""
+        return self.jsonldLines(node, 0, True, "None", layers)
+
+    # based on http://danbri.org/2013/SchemaD3/examples/4063550/hackathon-schema.js  - thanks @gregg, @sandro
+    def jsonldLines(self, node, depth, last_at_this_level, supertype, layers):
         emit_debug = False
         if node.id in self.visited:
-            # self.emit("skipping %s - already visited" % node.id)
+            # skipping, already visited
             return
         self.visited[node.id] = True
         p1 = " " * 4 * depth
         if emit_debug:
-            self.emit("%s# @id: %s last_at_this_level: %s" % (p1, node.id, last_at_this_level))
-        global namespaces;
-        ctx = "{}".format(""""@context": {
+            yield "%s# @id: %s last_at_this_level: %s\n" % (p1, node.id, last_at_this_level)
+        if last_at_this_level and depth==0:
+            ctx = """"@context": {
     "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
     "schema": "http://schema.org/",
     "rdfs:subClassOf": { "@type": "@id" },
     "name": "rdfs:label",
     "description": "rdfs:comment",
     "children": { "@reverse": "rdfs:subClassOf" }
-  },\n""" if last_at_this_level and depth==0 else '' )
+  },\n"""
+        else:
+            ctx = ''
 
         unseen_subtypes = []
-        for st in node.GetImmediateSubtypes(layers=layers):
+        for st in self.immediateSubtypes(node, layers=layers):
             if not st.id in self.visited:
                 unseen_subtypes.append(st)
         unvisited_subtype_count = len(unseen_subtypes)
-        subtype_count = len( node.GetImmediateSubtypes(layers=layers) )
 
-        supertx = "{}".format( '"rdfs:subClassOf": "schema:%s", ' % supertype.id if supertype != "None" else '' )
-        maybe_comma = "{}".format("," if unvisited_subtype_count > 0 else "")
+        supertx = '"rdfs:subClassOf": "schema:%s", ' % supertype.id if supertype != "None" else ''
+        maybe_comma = "," if unvisited_subtype_count > 0 else ""
         comment = GetComment(node, layers).strip()
         comment = comment.replace('"',"'")
         comment = re.sub('<[^<]+?>', '', comment)[:60]
 
-        self.emit('\n%s{\n%s\n%s"@type": "rdfs:Class", %s "description": "%s...",\n%s"name": "%s",\n%s"@id": "schema:%s"%s'
+        yield ('\n%s{\n%s\n%s"@type": "rdfs:Class", %s "description": "%s...",\n%s"name": "%s",\n%s"@id": "schema:%s"%s\n'
                   % (p1, ctx, p1,                 supertx,            comment,     p1,   node.id, p1,        node.id,  maybe_comma))
 
         i = 1
         if unvisited_subtype_count > 0:
-            self.emit('%s"children": ' % p1 )
-            self.emit("  %s["  % p1 )
+            yield '%s"children": \n' % p1
+            yield "  %s[\n"  % p1
             inner_lastness = False
             for t in unseen_subtypes:
                 if emit_debug:
-                    self.emit("%s  # In %s > %s i: %s unvisited_subtype_count: %s" %(p1, node.id, t.id, i, unvisited_subtype_count))
+                    yield "%s  # In %s > %s i: %s unvisited_subtype_count: %s\n" %(p1, node.id, t.id, i, unvisited_subtype_count)
                 if i == unvisited_subtype_count:
                     inner_lastness = True
                 i = i + 1
-                self.traverseForJSONLD(t, depth + 1, inner_lastness, supertype=node, layers=layers)
+                for s in self.jsonldLines(t, depth + 1, inner_lastness, node, layers):
+                    yield s
 
-            self.emit("%s  ]%s" % (p1,  "{}".format( "" if not last_at_this_level else '' ) ) )
+            yield "%s  ]\n" % p1
 
-        maybe_comma = "{}".format( ',' if not last_at_this_level else '' )
-        self.emit('\n%s}%s\n' % (p1, maybe_comma))
+        maybe_comma = ',' if not last_at_this_level else ''
+        yield '\n%s}%s\n\n' % (p1, maybe_comma)
 
 
 class Example ():
@@ -612,6 +1497,7 @@ class Example ():
 
 def GetExamples(node, layers='core'):
     """Returns the examples (if any) for some Unit node."""
+    caches.NoteDependency(node.id)
     return node.examples
 
 def GetExtMappingsRDFa(node, layers='core'):
@@ -637,43 +1523,34 @@ def GetExtMappingsRDFa(node, layers='core'):
             return markup
     return "<!-- no external mappings noted for this term. -->"
 
-def GetJsonLdContext(layers='core'):
-    """Generates a basic JSON-LD context file for schema.org."""
-    global namespaces;
-    jsonldcontext = "{\"@context\":    {\n"
-    jsonldcontext += namespaces ;
-    jsonldcontext += "        \"@vocab\": \"http://schema.org/\",\n"
-
-    url = Unit.GetUnit("URL")
-    date = Unit.GetUnit("Date")
-    datetime = Unit.GetUnit("DateTime")
-
-    properties = sorted(GetSources(Unit.GetUnit("typeOf"), Unit.GetUnit("rdf:Property"), layers=layers), key=lambda u: u.id)
-    for p in properties:
-        range = GetTargets(Unit.GetUnit("rangeIncludes"), p, layers=layers)
-        type = None
-
-        if url in range:
-            type = "@id"
-        elif date in range:
-            type = "Date"
-        elif datetime in range:
-            type = "DateTime"
-
-        if type:
-            jsonldcontext += "        \"" + p.id + "\": { \"@type\": \"" + type + "\" },"
-
-    jsonldcontext += "}}\n"
-    jsonldcontext = jsonldcontext.replace("},}}","}\n    }\n}")
-    jsonldcontext = jsonldcontext.replace("},","},\n")
+JSONLD_COERCIONS = [("URL", "@id"), ("Date", "Date"), ("DateTime", "DateTime")] # first range found wins
 
+def GetJsonLdContext(layers='core'):
+    """Generates a basic JSON-LD context file for schema.org: prefixes, @vocab, and the value types of properties
+    whose range includes URL, Date or DateTime. Cached per layer set, e.g. for extension hosts."""
+    if isinstance(layers, basestring):
+        layers = [layers]
+    cachekey = "JSONLDContext:%s" % ",".join(sorted(layers))
+    jsonldcontext = DataCache.get(cachekey)
+    if jsonldcontext != None:
+        return jsonldcontext
+
+    index = GetSchemaIndex(layers)
+    ctx = json.loads("{%s}" % namespaces.rstrip().rstrip(","), object_pairs_hook=OrderedDict)
+    ctx["@vocab"] = "http://schema.org/"
+    coercions = [(Unit.GetUnit(id), type) for (id, type) in JSONLD_COERCIONS]
+    for p in sorted(index.properties, key=lambda u: u.id):
+        ranges = index.ranges.get(p, ())
+        for (unit, type) in coercions:
+            if unit in ranges:
+                ctx[p.id] = { "@type": type }
+                break
+
+    jsonldcontext = json.dumps({ "@context": ctx }, indent=4, separators=(',', ': ')) + "\n"
+    DataCache[cachekey] = jsonldcontext
     return jsonldcontext
 
 
-
-
-
-
 #### UTILITIES
 
 
@@ -712,53 +1589,183 @@ def full_path(filename):
 
 
 
+def GraphSnapshotHash(filenames):
+    """md5 over the names and contents of the data files a graph was read from."""
+    import hashlib
+    digest = hashlib.md5()
+    for f in sorted(set(filenames)):
+        digest.update(f)
+        digest.update(open(full_path(f), 'rb').read())
+    return digest.hexdigest()
+
 def read_schemas(loadExtensions=False):
     """Read/parse/ingest schemas from data/*.rdfa. Also data/*examples.txt"""
+    global schemasInitialized, graph_version, graph_loaded
+    if (not schemasInitialized or DYNALOAD):
+        graph_version = GraphSnapshotHash(load_schema_files(loadExtensions))
+        graph_loaded = time.time()
+        caches.SetGraphVersion(graph_version)
+        schemasInitialized = True
+
+def load_schema_files(loadExtensions=False):
+    """Parse the schema, example and usage files into the graph; returns the files read."""
     import os.path
     import glob
     import re
 
-    global schemasInitialized
-    if (not schemasInitialized or DYNALOAD):
-        log.info("(re)loading core and annotations.")
-        files = glob.glob("data/*.rdfa")
-        file_paths = []
-        for f in files:
-            file_paths.append(full_path(f))
-        parser = parsers.MakeParserOfType('rdfa', None)
-        items = parser.parse(file_paths, "core")
-
-        if loadExtensions:
-            log.info("(re)scanning for extensions.")
-            extfiles = glob.glob("data/ext/*/*.rdfa")
-            log.info("Extensions found: %s ." % " , ".join(extfiles) )
-            fnstrip_re = re.compile("\/.*")
-            for ext in extfiles:
-                ext_file_path = full_path(ext)
-                extid = ext.replace('data/ext/', '')
-                extid = re.sub(fnstrip_re,'',extid)
-                log.info("Preparing to parse extension data: %s as '%s'" % (ext_file_path, "%s" % extid))
-                parser = parsers.MakeParserOfType('rdfa', None)
-                all_layers[extid] = "1"
-                extitems = parser.parse([ext_file_path], layer="%s" % extid) # put schema triples in a layer
-                # log.debug("Results: %s " % len( extitems) )
-                for x in extitems:
-                    if x is not None:
-                        log.debug("%s:%s" % ( extid, str(x.id) ))
-                # e.g. see 'data/ext/bib/bibdemo.rdfa'
-
-        files = glob.glob("data/*examples.txt")
-        example_contents = []
-        for f in files:
-            example_content = read_file(f)
-            example_contents.append(example_content)
-        parser = parsers.ParseExampleFile(None)
-        parser.parse(example_contents)
-
-        files = glob.glob("data/2015-04-vocab_counts.txt")
-
-        for file in files:
-            usage_data = read_file(file)
-            parser = parsers.UsageFileParser(None)
-            parser.parse(usage_data)
-        schemasInitialized = True
+    global extensions_loaded
+    extensions_loaded = loadExtensions
+    log.info("(re)loading core and annotations.")
+    files = glob.glob("data/*.rdfa")
+    snapshot_files = list(files)
+    file_paths = []
+    for f in files:
+        file_paths.append(full_path(f))
+    parser = parsers.MakeParserOfType('rdfa', None)
+    items = parser.parse(file_paths, "core")
+
+    if loadExtensions:
+        log.info("(re)scanning for extensions.")
+        extfiles = glob.glob("data/ext/*/*.rdfa")
+        snapshot_files.extend(extfiles)
+        log.info("Extensions found: %s ." % " , ".join(extfiles) )
+        fnstrip_re = re.compile("\/.*")
+        for ext in extfiles:
+            ext_file_path = full_path(ext)
+            extid = ext.replace('data/ext/', '')
+            extid = re.sub(fnstrip_re,'',extid)
+            log.info("Preparing to parse extension data: %s as '%s'" % (ext_file_path, "%s" % extid))
+            parser = parsers.MakeParserOfType('rdfa', None)
+            all_layers[extid] = "1"
+            extitems = parser.parse([ext_file_path], layer="%s" % extid) # put schema triples in a layer
+            # log.debug("Results: %s " % len( extitems) )
+            for x in extitems:
+                if x is not None:
+                    log.debug("%s:%s" % ( extid, str(x.id) ))
+            # e.g. see 'data/ext/bib/bibdemo.rdfa'
+
+    files = glob.glob("data/*examples.txt")
+    snapshot_files.extend(files)
+    example_contents = []
+    for f in files:
+        example_content = read_file(f)
+        example_contents.append(example_content)
+    parser = parsers.ParseExampleFile(None)
+    parser.parse(example_contents)
+
+    files = glob.glob("data/2015-04-vocab_counts.txt")
+    snapshot_files.extend(files)
+
+    for file in files:
+        usage_data = read_file(file)
+        parser = parsers.UsageFileParser(None)
+        parser.parse(usage_data)
+    return snapshot_files
+
+
+def TermDigest(node):
+    """md5 over everything a page about this term can show: its triples in both directions, examples and usage."""
+    import hashlib
+    parts = set()
+    for t in node.arcsOut:
+        if t.target is not None:
+            parts.add(u"> %s %s %s" % (t.arc.id, t.target.id, t.layer))
+        else:
+            parts.add(u"> %s \"%s\" %s" % (t.arc.id, t.text, t.layer))
+    for t in node.arcsIn:
+        parts.add(u"< %s %s %s" % (t.source.id, t.arc.id, t.layer))
+    for ex in node.examples:
+        parts.add(u"e %s" % hashlib.md5(ex.original_html.encode('utf-8')).hexdigest())
+    parts.add(u"u %s" % node.usage)
+    return hashlib.md5(u"\n".join(sorted(parts)).encode('utf-8')).hexdigest()
+
+def TermDigests():
+    """TermDigest for every unit in the graph, by id."""
+    digests = {}
+    for id, node in NodeIDMap.items():
+        digests[id] = TermDigest(node)
+    return digests
+
+def ResetGraph():
+    """Drop all triples, examples and usage, keeping the Unit objects so that references to them stay valid."""
+    for node in NodeIDMap.values():
+        node.arcsIn = []
+        node.arcsOut = []
+        node.examples = []
+        node.usage = 0
+    all_terms.clear()
+
+def evictChanged(changed):
+    """Evict cached output built from these changed terms of the live graph, and re-index them for search.
+
+    InvalidateTerms reaches only this process's entries, so with a shared
+    cache backend the caches move to the new graph_version instead, leaving
+    whatever was built from the old graph unreachable for every process.
+    """
+    if not changed:
+        return
+    if caches.SharedBackend():
+        caches.SetGraphVersion(graph_version)
+    else:
+        caches.InvalidateTerms(changed)
+    UpdateSearchIndexes(changed)
+
+def ReloadSchemas(loadExtensions=None):
+    """Re-read the data files into the live graph, evicting cached output only for terms whose triples changed.
+
+    Requests wait while the graph is reloaded (see GraphLock); the changed terms are returned.
+    """
+    global graph_version, graph_loaded
+    if loadExtensions is None:
+        loadExtensions = extensions_loaded
+    with graph_lock.writing():
+        before = TermDigests()
+        ResetGraph()
+        graph_version = GraphSnapshotHash(load_schema_files(loadExtensions))
+        graph_loaded = time.time()
+        after = TermDigests()
+        changed = sorted([id for id in set(before) | set(after) if before.get(id) != after.get(id)])
+        log.info("Reloaded schemas: %s term(s) changed." % len(changed))
+        evictChanged(changed)
+    return changed
+
+def PatchTriples(additions=None, removals=None, layer='core'):
+    """Add and remove (subject id, arc id, object) triples in the live graph, evicting dependent cache entries.
+
+    Objects are term ids, except for text-valued arcs (see text_arcs). Returns the ids of the changed terms.
+    """
+    import hashlib
+    global graph_version
+    additions = additions or []
+    removals = removals or []
+    changed = set()
+    with graph_lock.writing():
+        for (s, p, o) in removals:
+            source = Unit.GetUnit(s)
+            if source is None:
+                continue
+            for t in list(source.arcsOut):
+                if t.arc.id != p or t.layer != layer:
+                    continue
+                if t.target is not None and t.target.id == o:
+                    source.arcsOut.remove(t)
+                    t.target.arcsIn.remove(t)
+                    changed.update([s, o])
+                elif t.target is None and t.text == o:
+                    source.arcsOut.remove(t)
+                    changed.add(s)
+        for (s, p, o) in additions:
+            source = Unit.GetUnit(s, True)
+            arc = Unit.GetUnit(p, True)
+            if p in text_arcs:
+                Triple.AddTripleText(source, arc, o, layer)
+                changed.add(s)
+            else:
+                Triple.AddTriple(source, arc, Unit.GetUnit(o, True), layer)
+                changed.update([s, o])
+        changed = sorted(changed)
+        if changed:
+            patch = repr((sorted(additions), sorted(removals), layer))
+            graph_version = hashlib.md5(graph_version + patch).hexdigest() # the graph no longer matches its files
+            evictChanged(changed)
+    return changed
@@ -0,0 +1,651 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import re
+import json
+import time
+import heapq
+import socket
+import hashlib
+import logging
+import binascii
+import tempfile
+import threading
+import SocketServer
+
+logging.basicConfig(level=logging.INFO) # dev_appserver.py --log_level debug .
+log = logging.getLogger(__name__)
+
+# Caches: DataCache (api.py), PageCache and FragmentCache (sdoapp.py) are Cache
+# namespaces. Each keeps text in a backend: a plain in-process dict (the
+# default), a directory shared by the worker processes of one host, or a
+# memcached server shared by many instances. Anything that isn't text (e.g. the
+# lists of Units in DataCache) stays in the process that built it.
+#
+# Backend keys carry the namespace, the app version and the graph snapshot hash
+# (see SetGraphVersion), so a deploy never serves output built from older code
+# or data. They also carry the namespace's generation: Cache.clear() on a shared
+# backend bumps it, rather than emptying the backend that other namespaces, app
+# versions and instances use too.
+#
+# Within a process, each entry also remembers which terms it was built from:
+# code that builds a cached value runs inside a DependencyRecording, and the
+# graph accessors in api.py report the units they read via NoteDependency.
+# InvalidateTerms then evicts just the entries that read a changed term.
+# Entries cached outside any recording, or that read such an entry, depend
+# on "*" and are evicted by every invalidation.
+#
+# Output built from a graph other than the live one (e.g. a release's, see
+# api.UsingGraph) is cached inside a CacheScope, which keeps its keys apart.
+#
+# Each Cache also counts hits, misses, inserts and evictions, the text size it
+# has stored, the time from a miss to the matching insert (i.e. render time)
+# and hits for up to MAX_COUNTED_KEYS keys, under a lock as requests on many
+# threads share them. CacheStats() reports them; LogCacheStatsIfDue() writes
+# them as one JSON log line every STATS_LOG_INTERVAL seconds.
+
+CACHE_BACKEND = os.environ.get("SDO_CACHE_BACKEND", "memory") # "memory", "directory" or "memcache"
+CACHE_DIR = os.environ.get("SDO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "sdo-cache"))
+MEMCACHE_SERVERS = os.environ.get("SDO_MEMCACHE_SERVERS", "127.0.0.1:11211").split(",")
+MEMCACHE_TIMEOUT = 2.0 # seconds
+MEMCACHE_MAX_ITEM = 1024 * 1024 # memcached's default item size limit
+STATS_LOG_INTERVAL = 300 # seconds between "cachestats" log lines; 0 disables them
+STATS_TOP_KEYS = 10
+MAX_COUNTED_KEYS = 2000 # keys whose hits are counted; past it, only the most hit half are kept
+MAX_PENDING_MISSES = 1000 # misses awaiting an insert, for render timing
+GENERATION_CHECK_INTERVAL = 30 # seconds between looks at a shared namespace's generation, set by Cache.clear elsewhere
+
+app_version = os.environ.get("CURRENT_VERSION_ID", "dev")
+graph_version = ""
+graph_changes = 0 # counts SetGraphVersion and InvalidateTerms calls; see CaptureStream
+all_caches = []
+
+key_re = re.compile(r'^[!-~]{1,200}$') # printable ASCII, no whitespace: safe as a memcached key
+
+recorder = threading.local()
+scope = threading.local()
+
+
+class DependencyRecording:
+    """Collects the ids of the terms read while building a cached value.
+
+    Use as "with DependencyRecording(): ...". Recordings nest; when one ends,
+    its dependencies are added to the enclosing one, unless propagate is
+    False (for reads that don't go into what the enclosing one builds).
+    """
+
+    def __init__(self, propagate=True):
+        self.propagate = propagate
+
+    def __enter__(self):
+        self.dependencies = set()
+        recorder.__dict__.setdefault("stack", []).append(self.dependencies)
+        return self
+
+    def __exit__(self, *exc_info):
+        stack = recorder.stack
+        stack.pop()
+        if stack and self.propagate:
+            stack[-1].update(self.dependencies)
+        return False
+
+def NoteDependency(id):
+    """Record that whatever is being built read the term with this id."""
+    stack = getattr(recorder, "stack", None)
+    if stack:
+        stack[-1].add(id)
+
+def NoteDependencies(ids):
+    stack = getattr(recorder, "stack", None)
+    if stack:
+        stack[-1].update(ids)
+
+class CacheScope:
+    """Keeps the entries cached within it apart from all others.
+
+    Use as "with CacheScope("v2.0"): ..."; the same key then names a different
+    entry inside and outside the scope. Scopes nest; the innermost applies.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        scope.__dict__.setdefault("names", []).append(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        scope.names.pop()
+        return False
+
+def scopedKey(key):
+    names = getattr(scope, "names", None)
+    if names:
+        return "%s|%s" % (names[-1], key)
+    return key
+
+def currentDependencies():
+    """Dependencies of the innermost recording, or None when not recording."""
+    stack = getattr(recorder, "stack", None)
+    if stack:
+        return stack[-1]
+    return None
+
+
+class DictBackend:
+    """Keeps entries in a plain dict, private to this process."""
+
+    shared = False
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value):
+        self.store[key] = value
+        return True
+
+    def delete(self, key):
+        self.store.pop(key, None)
+
+    def clear(self):
+        self.store.clear()
+
+
+class DirectoryBackend:
+    """Keeps entries as files in a directory, shared by worker processes on one host.
+
+    Writes go to a temporary file that is renamed into place, so readers never
+    see a partial entry. Not usable where the filesystem is read-only (e.g. App
+    Engine standard).
+    """
+
+    shared = True
+
+    def __init__(self, directory=None):
+        self.directory = directory or CACHE_DIR
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def path(self, key):
+        digest = hashlib.md5(key).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key):
+        try:
+            f = open(self.path(key), 'rb')
+        except IOError:
+            return None
+        try:
+            return f.read().decode("utf-8")
+        finally:
+            f.close()
+
+    def set(self, key, value):
+        path = self.path(key)
+        folder = os.path.dirname(path)
+        try:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            fd, tmp = tempfile.mkstemp(dir=folder)
+            f = os.fdopen(fd, 'wb')
+            f.write(encodeValue(value))
+            f.close()
+            os.rename(tmp, path)
+            return True
+        except (IOError, OSError) as e:
+            log.warning("DirectoryBackend: could not write %s: %s" % (path, e))
+            return False
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Empty the whole directory, whoever's entries are in it (Cache.clear doesn't use this)."""
+        for folder, dirs, files in os.walk(self.directory):
+            for f in files:
+                try:
+                    os.remove(os.path.join(folder, f))
+                except OSError:
+                    pass
+
+
+class MemcacheBackend:
+    """Client for the memcached text protocol (get, set and delete).
+
+    Keys are spread over the servers by CRC32. Network errors are logged and
+    treated as misses, so an unavailable server slows us down but never breaks
+    page serving.
+    """
+
+    shared = True
+
+    def __init__(self, servers=None, timeout=None, expiry=0):
+        self.servers = servers or MEMCACHE_SERVERS
+        self.timeout = timeout or MEMCACHE_TIMEOUT
+        self.expiry = expiry
+        self.local = threading.local() # one connection per server per thread
+
+    def server(self, key):
+        return self.servers[(binascii.crc32(key) & 0xffffffff) % len(self.servers)]
+
+    def connection(self, server):
+        conns = self.local.__dict__.setdefault("conns", {})
+        if server not in conns:
+            host, port = server.rsplit(":", 1)
+            sock = socket.create_connection((host, int(port)), self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conns[server] = (sock, sock.makefile('rb'))
+        return conns[server]
+
+    def disconnect(self, server):
+        conns = self.local.__dict__.setdefault("conns", {})
+        if server in conns:
+            sock, f = conns.pop(server)
+            sock.close()
+
+    def close(self):
+        """Close this thread's connections."""
+        for server in self.servers:
+            self.disconnect(server)
+
+    def call(self, server, command, reply):
+        """Send command to a server and return reply(readfile); None on network errors."""
+        try:
+            sock, f = self.connection(server)
+            sock.sendall(command)
+            return reply(f)
+        except (socket.error, IOError, ValueError) as e:
+            log.warning("MemcacheBackend: %s failed: %s" % (server, e))
+            self.disconnect(server)
+            return None
+
+    def get(self, key):
+        def reply(f):
+            line = f.readline()
+            if not line.startswith("VALUE"):
+                if not line.startswith("END"):
+                    raise IOError("unexpected reply %r" % line)
+                return None
+            size = int(line.split()[3])
+            data = f.read(size + 2)[:size]
+            f.readline() # END
+            return data.decode("utf-8")
+        return self.call(self.server(key), "get %s\r\n" % key, reply)
+
+    def set(self, key, value):
+        data = encodeValue(value)
+        if len(data) > MEMCACHE_MAX_ITEM:
+            return False
+        def reply(f):
+            return f.readline().startswith("STORED")
+        return self.call(self.server(key), "set %s 0 %d %d\r\n%s\r\n" % (key, self.expiry, len(data), data), reply) or False
+
+    def delete(self, key):
+        self.call(self.server(key), "delete %s\r\n" % key, lambda f: f.readline())
+
+
+def MakeBackendOfType(kind):
+    """Return a new cache backend: 'memory', 'directory' or 'memcache'."""
+    if kind == "directory":
+        return DirectoryBackend()
+    elif kind == "memcache":
+        return MemcacheBackend()
+    else:
+        return DictBackend()
+
+def encodeValue(value):
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return str(value)
+
+
+class Cache:
+    """A named cache (e.g. "page", "data"), used like a dict.
+
+    Text values live in the backend under versioned keys; other values stay in
+    a local dict. If the backend refuses a value (e.g. too big for memcached)
+    it is kept locally instead.
+    """
+
+    def __init__(self, namespace, backend=None):
+        self.namespace = namespace
+        if backend is None:
+            backend = MakeBackendOfType(CACHE_BACKEND)
+        self.backend = backend
+        self.local = {}
+        self.deps = {} # key -> ids of terms the entry was built from
+        self.dependents = {} # term id (or "*") -> keys built from it
+        self.generation = 0
+        self.generation_checked = 0 # when the shared generation was last read
+        self.counting = threading.Lock() # held while updating or reading the statistics
+        self.resetStats()
+        all_caches.append(self)
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+        self.sizes = {} # key -> length of the text stored (0 for other values)
+        self.key_hits = {}
+        self.missed_at = {} # key -> time of its latest miss
+        self.renders = 0
+        self.render_time = 0.0
+
+    def stats(self, top=STATS_TOP_KEYS):
+        """Counters for this cache, with its top hottest keys."""
+        with self.counting:
+            lookups = self.hits + self.misses
+            hottest = heapq.nlargest(top, self.key_hits.items(), key=lambda kv: kv[1])
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(float(self.hits) / lookups, 4) if lookups else None,
+                "inserts": self.inserts,
+                "evictions": self.evictions,
+                "entries": len(self.sizes),
+                "bytes": sum(self.sizes.values()),
+                "renders": self.renders,
+                "avg_render_ms": round(1000 * self.render_time / self.renders, 2) if self.renders else None,
+                "hottest": [[k, n] for (k, n) in hottest],
+            }
+
+    def countHit(self, key):
+        with self.counting:
+            self.hits += 1
+            self.key_hits[key] = self.key_hits.get(key, 0) + 1
+            if len(self.key_hits) > MAX_COUNTED_KEYS:
+                self.key_hits = dict(heapq.nlargest(MAX_COUNTED_KEYS // 2, self.key_hits.items(), key=lambda kv: kv[1]))
+
+    def countMiss(self, key):
+        with self.counting:
+            self.misses += 1
+            if len(self.missed_at) >= MAX_PENDING_MISSES:
+                self.missed_at.clear()
+            self.missed_at[key] = time.time()
+
+    def countInsert(self, key, size):
+        with self.counting:
+            self.inserts += 1
+            self.sizes[key] = size
+            missed = self.missed_at.pop(key, None)
+            if missed is not None:
+                self.renders += 1
+                self.render_time += time.time() - missed
+
+    def backendKey(self, key):
+        """Backend key for key: namespace, app and graph versions, generation, then key (hashed if unsafe)."""
+        if isinstance(key, unicode):
+            key = key.encode("utf-8")
+        prefix = "%s:%s:%s:%d" % (self.namespace, app_version, graph_version, self.generation)
+        bkey = "%s:%s" % (prefix, key)
+        if not key_re.match(bkey):
+            bkey = "%s:#%s" % (prefix, hashlib.md5(key).hexdigest())
+        return bkey
+
+    def generationKey(self):
+        return "%s:%s:generation" % (self.namespace, app_version)
+
+    def checkGeneration(self):
+        """Follow a clear() made by another instance sharing the backend, looking at most every GENERATION_CHECK_INTERVAL."""
+        now = time.time()
+        if not self.backend.shared or now - self.generation_checked < GENERATION_CHECK_INTERVAL:
+            return
+        self.generation_checked = now
+        generation = self.sharedGeneration()
+        if generation != self.generation:
+            self.generation = generation
+            self.forgetEntries()
+
+    def get(self, key, default=None):
+        self.checkGeneration()
+        key = scopedKey(key)
+        if key in self.local:
+            value = self.local[key]
+        else:
+            value = self.backend.get(self.backendKey(key))
+        if value is None:
+            self.countMiss(key)
+            return default
+        self.countHit(key)
+        if key in self.deps:
+            NoteDependencies(self.deps[key]) # whatever uses this entry depends on what it was built from
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, value):
+        self.checkGeneration()
+        key = scopedKey(key)
+        if isinstance(value, basestring) and self.backend.set(self.backendKey(key), value):
+            self.local.pop(key, None)
+        else:
+            self.local[key] = value
+        self.countInsert(key, len(value) if isinstance(value, basestring) else 0)
+        self.forgetDependencies(key)
+        deps = currentDependencies()
+        if deps is None:
+            deps = ["*"]
+        deps = frozenset(deps)
+        self.deps[key] = deps
+        for id in deps:
+            self.dependents.setdefault(id, set()).add(key)
+
+    def __delitem__(self, key):
+        self.evict(scopedKey(key))
+
+    def evict(self, key):
+        self.local.pop(key, None)
+        self.backend.delete(self.backendKey(key))
+        with self.counting:
+            if self.sizes.pop(key, None) is not None:
+                self.evictions += 1
+        self.forgetDependencies(key)
+
+    def forgetDependencies(self, key):
+        for id in self.deps.pop(key, []):
+            keys = self.dependents.get(id)
+            if keys:
+                keys.discard(key)
+
+    def invalidate(self, ids):
+        """Evict the entries built from any of these term ids; returns how many."""
+        keys = set(self.dependents.get("*", []))
+        for id in ids:
+            keys.update(self.dependents.get(id, []))
+        for key in keys:
+            self.evict(key)
+        return len(keys)
+
+    def clear(self):
+        """Drop every entry of this namespace, here and, with a shared backend, in the instances sharing it."""
+        if self.backend.shared:
+            self.generation = max(self.generation, self.sharedGeneration()) + 1
+            self.backend.set(self.generationKey(), unicode(self.generation))
+            self.generation_checked = time.time()
+        else:
+            self.backend.clear()
+        self.forgetEntries()
+
+    def sharedGeneration(self):
+        try:
+            return int(self.backend.get(self.generationKey()) or 0)
+        except ValueError:
+            return 0
+
+    def forgetEntries(self):
+        """Forget the local values and what is known about the backend's entries, e.g. once they are unreachable."""
+        self.local.clear()
+        self.deps.clear()
+        self.dependents.clear()
+        with self.counting:
+            self.evictions += len(self.sizes)
+            self.sizes.clear()
+
+
+def SetGraphVersion(version):
+    """Record the snapshot hash of the loaded graph; entries built from another graph become unreachable."""
+    global graph_version, graph_changes
+    if version == graph_version:
+        return
+    log.info("Cache graph version: %s (was '%s')" % (version, graph_version))
+    graph_version = version
+    graph_changes += 1
+    for c in all_caches:
+        c.forgetEntries()
+        if not c.backend.shared:
+            c.backend.clear()
+
+def InvalidateTerms(ids):
+    """Evict entries in every cache that were built from any of these term ids."""
+    global graph_changes
+    graph_changes += 1
+    count = 0
+    for c in all_caches:
+        count += c.invalidate(ids)
+    log.info("Invalidated %s cache entries for %s changed term(s)." % (count, len(ids)))
+    return count
+
+def SharedBackend():
+    """Whether any cache keeps text where other processes read it too, so that InvalidateTerms can't reach all of it."""
+    return any(c.backend.shared for c in all_caches)
+
+def CaptureStream(cache, key, chunks):
+    """Pass chunks of text through, then store them joined in cache under key.
+
+    For responses streamed after the handler returns: each chunk is produced
+    inside its own DependencyRecording, and the entry depends on them all.
+    Nothing is stored if the stream is abandoned part way, or if the graph
+    changed while it was produced (its chunks may then come from both graphs).
+    """
+    started = graph_changes
+    parts = []
+    dependencies = set()
+    chunks = iter(chunks)
+    while True:
+        with DependencyRecording() as recording:
+            chunk = next(chunks, None)
+        dependencies.update(recording.dependencies)
+        if chunk is None:
+            break
+        parts.append(chunk)
+        yield chunk
+    if graph_changes != started:
+        return
+    with DependencyRecording():
+        NoteDependencies(dependencies)
+        cache[key] = "".join(parts)
+
+stats_logged_at = time.time()
+
+def CacheStats(top=STATS_TOP_KEYS):
+    """Counters for every cache, by namespace."""
+    stats = {}
+    for c in all_caches:
+        stats[c.namespace] = c.stats(top)
+    return stats
+
+def LogCacheStatsIfDue():
+    """Log CacheStats() as a single JSON line if STATS_LOG_INTERVAL has passed since the last one."""
+    global stats_logged_at
+    now = time.time()
+    if not STATS_LOG_INTERVAL or now - stats_logged_at < STATS_LOG_INTERVAL:
+        return False
+    stats_logged_at = now
+    log.info("cachestats %s" % json.dumps({"app_version": app_version, "graph_version": graph_version, "caches": CacheStats()}, sort_keys=True))
+    return True
+
+
+# A stand-in memcached server: enough of the text protocol for MemcacheBackend,
+# for tests and local development without a real memcached.
+#
+#   python caches.py 11211
+
+class LocalMemcacheHandler(SocketServer.StreamRequestHandler):
+
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.split()
+            if not parts:
+                continue
+            cmd = parts[0]
+            if cmd in ["get", "gets"]:
+                reply = []
+                for key in parts[1:]:
+                    with self.server.lock:
+                        entry = store.get(key)
+                    if entry is not None:
+                        reply.append("VALUE %s %s %d\r\n%s\r\n" % (key, entry[0], len(entry[1]), entry[1]))
+                reply.append("END\r\n")
+                self.wfile.write("".join(reply))
+            elif cmd == "set" and len(parts) >= 5:
+                data = self.rfile.read(int(parts[4]) + 2)[:-2]
+                if len(data) > MEMCACHE_MAX_ITEM:
+                    self.wfile.write("SERVER_ERROR object too large for cache\r\n")
+                    continue
+                with self.server.lock:
+                    store[parts[1]] = (parts[2], data)
+                self.wfile.write("STORED\r\n")
+            elif cmd == "delete" and len(parts) >= 2:
+                with self.server.lock:
+                    found = store.pop(parts[1], None) is not None
+                self.wfile.write("DELETED\r\n" if found else "NOT_FOUND\r\n")
+            elif cmd == "flush_all":
+                with self.server.lock:
+                    store.clear()
+                self.wfile.write("OK\r\n")
+            elif cmd == "quit":
+                return
+            else:
+                self.wfile.write("ERROR\r\n")
+
+class LocalMemcacheServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """In-process memcached stand-in. Use port 0 to pick a free port (see .address())."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        SocketServer.TCPServer.__init__(self, (host, port), LocalMemcacheHandler)
+        self.store = {}
+        self.lock = threading.Lock()
+
+    def address(self):
+        return "%s:%s" % self.server_address
+
+    def start(self):
+        """Serve from a background thread; returns self."""
+        thread = threading.Thread(target=self.serve_forever, name="LocalMemcacheServer")
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+if __name__ == "__main__":
+    import sys
+    port = 11211
+    if len(sys.argv) > 1:
+        port = int(sys.argv[1])
+    server = LocalMemcacheServer(port=port)
+    log.info("Stand-in memcached listening on %s" % server.address())
+    server.serve_forever()
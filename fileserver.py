@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import re
+import logging
+from email.utils import formatdate, parsedate_tz, mktime_tz
+
+try:
+    import mmap
+except ImportError: # not every runtime provides it; fall back to plain reads
+    mmap = None
+
+logging.basicConfig(level=logging.INFO) # dev_appserver.py --log_level debug .
+log = logging.getLogger(__name__)
+
+# Serves files from disk (e.g. release artifacts under data/releases/) without
+# reading them whole into memory:
+# - ETag and Last-Modified come from the file's size and mtime, so conditional
+#   GETs are answered with 304 without opening the file
+# - a single byte range ("Range: bytes=a-b") gets a 206; other range requests
+#   get the whole file
+# - a precompressed sibling (schema.nt.gz, see scripts/compress_releases.py) is
+#   sent to clients that accept gzip (with a q-value above 0), unless they asked
+#   for a range
+# - the body goes out through wsgi.file_wrapper when the server offers one,
+#   otherwise in chunks from a memory-mapped (or, lacking mmap, plainly read) file
+
+FILE_CHUNK_SIZE = 64 * 1024 # bytes per chunk when not using wsgi.file_wrapper
+
+range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def FileETag(stat):
+    """A validator for a file's current contents, from its size and mtime."""
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+def ByteRange(header, size):
+    """(first, last) for a single-range Range header, None to send the whole file, or False if unsatisfiable."""
+    match = range_re.match(header.replace(" ", ""))
+    if match is None:
+        return None # malformed, multiple ranges or another unit: ignore it
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "": # suffix range: the final `last` bytes
+        if int(last) == 0:
+            return False
+        return (max(0, size - int(last)), size - 1)
+    first = int(first)
+    last = size - 1 if last == "" else min(int(last), size - 1)
+    if first > last:
+        return False
+    return (first, last)
+
+def AcceptsEncoding(header, coding):
+    """Whether an Accept-Encoding header allows coding: named, or covered by "*", with a q-value above 0."""
+    star = None
+    for part in header.split(","):
+        params = part.split(";")
+        name = params[0].strip().lower()
+        q = 1.0
+        for param in params[1:]:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == coding or (coding == "gzip" and name == "x-gzip"):
+            return q > 0
+        if name == "*":
+            star = q
+    return star is not None and star > 0
+
+def notModified(request, etag, mtime):
+    tags = request.headers.get("If-None-Match")
+    if tags:
+        return tags.strip() == "*" or etag in [t.strip() for t in tags.split(",")]
+    since = request.headers.get("If-Modified-Since")
+    if since:
+        parsed = parsedate_tz(since)
+        return parsed is not None and int(mtime) <= mktime_tz(parsed)
+    return False
+
+def MappedFileChunks(path, first, last, size=FILE_CHUNK_SIZE):
+    """Bytes first..last (inclusive) of a file, in chunks, read through mmap where available."""
+    with open(path, "rb") as f:
+        if mmap is not None and last >= first:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for offset in xrange(first, last + 1, size):
+                    yield data[offset:min(offset + size, last + 1)]
+            finally:
+                data.close()
+        else:
+            f.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                chunk = f.read(min(size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+def ServeFile(request, response, path, content_type, filename=None):
+    """Send the file at path as the response, honouring conditional, range and gzip requests.
+
+    Returns False if there is no such file. filename, if given, is offered as
+    the name to save a download under.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+
+    # The precompressed copy is a separate representation, with its own ETag.
+    encoding = None
+    if not request.headers.get("Range") and AcceptsEncoding(request.headers.get("Accept-Encoding", ""), "gzip"):
+        try:
+            gzstat = os.stat(path + ".gz")
+            if gzstat.st_mtime >= stat.st_mtime:
+                encoding = "gzip"
+        except OSError:
+            pass
+
+    etag = FileETag(stat)
+    if encoding:
+        etag = etag[:-1] + '-gz"'
+    response.headers['Content-Type'] = content_type
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = formatdate(stat.st_mtime, usegmt=True)
+    response.headers['Accept-Ranges'] = "bytes"
+    vary = response.headers.get("Vary")
+    if not vary:
+        response.headers['Vary'] = "Accept-Encoding"
+    elif "accept-encoding" not in [v.strip().lower() for v in vary.split(",")]:
+        response.headers['Vary'] = vary + ", Accept-Encoding"
+    if filename:
+        response.headers['Content-Disposition'] = "attachment; filename=%s" % filename
+    if notModified(request, etag, stat.st_mtime):
+        response.status = 304
+        return True
+
+    if encoding:
+        path, stat = path + ".gz", gzstat
+        response.headers['Content-Encoding'] = encoding
+    size = stat.st_size
+    first, last = 0, size - 1
+    header = request.headers.get("Range")
+    if header and request.headers.get("If-Range", etag) == etag:
+        byterange = ByteRange(header, size)
+        if byterange is False:
+            response.status = 416
+            response.headers['Content-Range'] = "bytes */%d" % size
+            return True
+        if byterange:
+            first, last = byterange
+            response.status = 206
+            response.headers['Content-Range'] = "bytes %d-%d/%d" % (first, last, size)
+
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    if file_wrapper is not None and first == 0 and last == size - 1:
+        response.app_iter = file_wrapper(open(path, "rb"), FILE_CHUNK_SIZE)
+    else:
+        response.app_iter = MappedFileChunks(path, first, last)
+    response.headers['Content-Length'] = str(last - first + 1) # after app_iter, which resets it
+    return True
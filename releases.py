@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import re
+import json
+import array
+import itertools
+import hashlib
+import logging
+import threading
+
+import api
+import caches
+from api import Unit, Triple, UsingGraph, DataCache
+from serializers import PREFIXES, SCHEMA_BASE, FullURI
+
+logging.basicConfig(level=logging.INFO) # dev_appserver.py --log_level debug .
+log = logging.getLogger(__name__)
+
+# Releases: the schemas as published in each version, read from the snapshot in
+# data/releases/<version>/schema.nt the first time a version is asked for. Each
+# is a separate read-only graph, with the same ids as the live one (e.g.
+# "Person", "rdfs:Class", "typeOf"), so the usual API, handlers and templates
+# work on it within api.UsingGraph(release).
+#
+# Units can't be shared between graphs (each holds its own graph's arcs), but
+# their ids and the texts of comments and labels are: every graph refers to one
+# copy of each distinct string.
+#
+# ReleaseChanges compares two versions ("latest" being the live core schemas):
+# each graph's triples are written in a canonical form and hashed to 60 bits,
+# once per version (see ReleaseDigest), and the diff is a merge of the two
+# versions' sorted hashes.
+
+RELEASES_DIR = "data/releases"
+
+ARC_IDS = { "http://www.w3.org/1999/02/22-rdf-syntax-ns#type": "typeOf" } # URIs the graph knows by another id
+HASH_HALF_BITS = 30 # a hash is kept as two halves, which fit an array "L" item on any platform
+LINKING_ARCS = ["domainIncludes", "rangeIncludes", "rdfs:subClassOf", "supersededBy", "inverseOf"] # a triple on these also shows on its object's page
+
+ntriple_re = re.compile(r'^<([^>]*)> <([^>]*)> (?:<([^>]*)>|"((?:[^"\\]|\\.)*)"(?:@[\w\-]+|\^\^<[^>]*>)?) \.$')
+escape_re = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+escapes = { "t": u"\t", "n": u"\n", "r": u"\r", "b": u"\b", "f": u"\f", '"': u'"', "'": u"'", "\\": u"\\" }
+
+release_graphs = {} # version -> ReleaseGraph
+canonical_ids = {} # id -> CanonicalId(id)
+load_lock = threading.Lock()
+
+
+def GraphId(uri):
+    """The id the graph uses for a URI, e.g. "Person", "rdfs:Class" or "typeOf"."""
+    if uri in ARC_IDS:
+        return ARC_IDS[uri]
+    if uri.startswith(SCHEMA_BASE) and "/" not in uri[len(SCHEMA_BASE):]:
+        return uri[len(SCHEMA_BASE):]
+    for prefix, base in PREFIXES.items():
+        if uri.startswith(base) and re.match(r'^[A-Za-z_][\w\-]*$', uri[len(base):]):
+            return "%s:%s" % (prefix, uri[len(base):])
+    return uri
+
+def unescape(text):
+    def replace(match):
+        code = match.group(1)
+        if len(code) > 1:
+            return unichr(int(code[1:], 16))
+        return escapes.get(code, code)
+    return escape_re.sub(replace, text)
+
+def SharedStrings():
+    """One copy of each id and text in the live graph and the loaded releases, for a release being loaded to reuse.
+
+    Made afresh for each load and dropped after it, so that it keeps no
+    strings alive that the graphs no longer use (e.g. after a reload).
+    """
+    strings = {}
+    for nodes in [api.NodeIDMap] + [release.nodes for release in release_graphs.values()]:
+        for id, node in nodes.items():
+            strings.setdefault(id, id)
+            for t in node.arcsOut:
+                if t.text is not None:
+                    strings.setdefault(t.text, t.text)
+    return strings
+
+
+class ReleaseGraph:
+    """The schemas of a released version: Units by id, built from the release's N-Triples."""
+
+    def __init__(self, version, path, strings=None):
+        self.version = version
+        self.nodes = {}
+        self.triples = 0
+        with UsingGraph(self):
+            self.load(path, {} if strings is None else strings)
+
+    def load(self, path, strings):
+        """Read the N-Triples at path, using the copy in strings of each id and text (see SharedStrings)."""
+        def shared(text):
+            return strings.setdefault(text, text)
+
+        def unit(uri):
+            return Unit.GetUnit(shared(GraphId(uri)), True)
+
+        with open(path, "rb") as f:
+            for number, line in enumerate(f):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                match = ntriple_re.match(line.decode("utf-8"))
+                if match is None:
+                    log.warning("%s:%d: not an N-Triple, skipped." % (path, number + 1))
+                    continue
+                subject, predicate, target, text = match.groups()
+                if target is not None:
+                    Triple(unit(subject), unit(predicate), unit(target), None, layer='core')
+                else:
+                    Triple(unit(subject), unit(predicate), None, shared(unescape(text)), layer='core')
+                self.triples += 1
+
+    def __contains__(self, id):
+        return id in self.nodes
+
+
+class LiveCoreGraph:
+    """The live graph's core layer, as "latest" for ReleaseChanges."""
+
+    version = "latest"
+    layers = ["core"]
+
+    @property
+    def nodes(self):
+        return api.NodeIDMap
+
+LiveGraph = LiveCoreGraph()
+
+def CanonicalId(id):
+    """The one id for a term however a graph names it, e.g. "dc:description" for http://purl.org/dc/terms/description."""
+    canonical = canonical_ids.get(id)
+    if canonical is None:
+        canonical = canonical_ids[id] = GraphId(FullURI(id))
+    return canonical
+
+def CanonicalTriple(triple):
+    """triple as one line of text: subject, predicate and object ids, or the object text with whitespace collapsed."""
+    if triple.target is not None:
+        value = CanonicalId(triple.target.id)
+    else:
+        value = u'"%s"' % u" ".join(triple.text.split())
+    return u"%s %s %s" % (CanonicalId(triple.source.id), CanonicalId(triple.arc.id), value)
+
+def tripleHash(line):
+    return int(hashlib.md5(line.encode("utf-8")).hexdigest()[:15], 16)
+
+
+class ReleaseDigest:
+    """The triples of one version, canonicalised and hashed: the sorted hashes, and what each hash stands for.
+
+    The hashes are kept in two arrays, of their high and low halves, as
+    Python 2's arrays have no item type of 64 bits on every platform.
+    """
+
+    def __init__(self, graph):
+        self.version = graph.version
+        layers = getattr(graph, "layers", None)
+        self.lines = {} # hash -> canonical triple
+        self.subjects = {} # hash -> subject id
+        for node in graph.nodes.values():
+            for t in node.arcsOut:
+                if layers is not None and t.layer not in layers:
+                    continue
+                line = CanonicalTriple(t)
+                h = tripleHash(line)
+                self.lines[h] = line
+                self.subjects[h] = CanonicalId(node.id)
+        hashes = sorted(self.lines)
+        low = (1 << HASH_HALF_BITS) - 1
+        self.high = array.array("L", [h >> HASH_HALF_BITS for h in hashes])
+        self.low = array.array("L", [h & low for h in hashes])
+        self.terms = set(self.subjects.values())
+
+    def sortedHashes(self):
+        """The hashes, smallest first."""
+        for (high, low) in itertools.izip(self.high, self.low):
+            yield (high << HASH_HALF_BITS) | low
+
+
+def hashDifferences(a, b):
+    """The hashes only in digest a, and those only in digest b, from one merge of their sorted hashes."""
+    only_a, only_b = [], []
+    hashes_a, hashes_b = a.sortedHashes(), b.sortedHashes()
+    x, y = next(hashes_a, None), next(hashes_b, None)
+    while x is not None or y is not None:
+        if y is None or (x is not None and x < y):
+            only_a.append(x)
+            x = next(hashes_a, None)
+        elif x is None or y < x:
+            only_b.append(y)
+            y = next(hashes_b, None)
+        else:
+            x, y = next(hashes_a, None), next(hashes_b, None)
+    return only_a, only_b
+
+
+def GetGraph(version):
+    """The graph for a version: "latest" for the live one, or a release with a snapshot; None otherwise."""
+    if version == "latest":
+        return LiveGraph
+    return GetRelease(version)
+
+def GetReleaseDigest(version):
+    """The ReleaseDigest for a version, from DataCache if possible; None for an unknown version."""
+    cachekey = "ReleaseDigest:%s" % version
+    digest = DataCache.get(cachekey)
+    if digest == None:
+        graph = GetGraph(version)
+        if graph is None:
+            return None
+        with caches.DependencyRecording():
+            caches.NoteDependency("*") # built from every term
+            digest = ReleaseDigest(graph)
+            DataCache[cachekey] = digest
+    return digest
+
+def ReleaseChanges(old, new):
+    """What changed from version old to version new, as a dict (see below); None if either is unknown.
+
+    "added" and "removed" list terms with no triples in old or new, "changed"
+    gives each other term's added and removed triples, and "superseded" maps
+    terms that gained a supersededBy to their replacements.
+    """
+    a = GetReleaseDigest(old)
+    b = GetReleaseDigest(new)
+    if a is None or b is None:
+        return None
+    removed, added = hashDifferences(a, b)
+
+    changed = {}
+    for hashes, digest, key in [(removed, a, "removed"), (added, b, "added")]:
+        for h in hashes:
+            id = digest.subjects[h]
+            if id in a.terms and id in b.terms:
+                changed.setdefault(id, { "added": [], "removed": [] })[key].append(digest.lines[h])
+    superseded = {}
+    for h in added:
+        subject, arc, value = b.lines[h].split(" ", 2)
+        if arc == "supersededBy":
+            superseded[subject] = value
+    for lines in changed.values():
+        lines["added"].sort()
+        lines["removed"].sort()
+
+    return {
+        "from": old,
+        "to": new,
+        "triples": { "added": len(added), "removed": len(removed) },
+        "added": sorted(b.terms - a.terms),
+        "removed": sorted(a.terms - b.terms),
+        "changed": changed,
+        "superseded": superseded,
+    }
+
+def ChangedTerms(old, new):
+    """Ids of the terms whose pages differ between versions old and new; None if either is unknown.
+
+    These are the subjects of the added and removed triples, and their
+    objects too where the arc is one of LINKING_ARCS: e.g. a new property
+    with domainIncludes Person changes the page for Person.
+    """
+    a = GetReleaseDigest(old)
+    b = GetReleaseDigest(new)
+    if a is None or b is None:
+        return None
+    changed = set()
+    removed, added = hashDifferences(a, b)
+    for (digest, hashes) in [(a, removed), (b, added)]:
+        for h in hashes:
+            subject, arc, value = digest.lines[h].split(" ", 2)
+            changed.add(subject)
+            if arc in LINKING_ARCS:
+                changed.add(value)
+    return changed
+
+def ReleaseChangesJSON(old, new):
+    """ReleaseChanges(old, new) as JSON text, cached in DataCache; None if either version is unknown."""
+    cachekey = "ReleaseChanges:%s..%s" % (old, new)
+    text = DataCache.get(cachekey)
+    if text == None:
+        changes = ReleaseChanges(old, new)
+        if changes is None:
+            return None
+        text = json.dumps(changes, indent=2, sort_keys=True, separators=(",", ": "))
+        DataCache[cachekey] = text
+    return text
+
+
+def ReleasePath(version):
+    return os.path.join(RELEASES_DIR, version, "schema.nt")
+
+def GetRelease(version):
+    """The ReleaseGraph for version, loading it on first use; None if there is no snapshot of it."""
+    release = release_graphs.get(version)
+    if release is not None:
+        return release
+    path = ReleasePath(version)
+    if "/" in version or version.startswith(".") or not os.path.isfile(path):
+        return None
+    with load_lock:
+        if version not in release_graphs:
+            release = ReleaseGraph(version, path, SharedStrings())
+            log.info("Loaded release %s: %s triples, %s units." % (version, release.triples, len(release.nodes)))
+            release_graphs[version] = release
+    return release_graphs[version]
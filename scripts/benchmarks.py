@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import argparse
+import logging
+from os.path import expanduser
+
+# Stand-alone timings for the site-wide pages
+# - Like run_tests.py, finds the GAE library to load the app outside the appengine runner
+# - Times the type hierarchy builders behind docs/full.html and docs/tree.jsonld,
+#   then the site-wide pages via sdoapp with their cache entries removed before each run
+# - Run from the top level directory: python scripts/benchmarks.py --repeat 20
+
+def timed(label, repeat, f):
+    times = []
+    for i in range(repeat):
+        started = time.time()
+        size = len(f())
+        times.append(time.time() - started)
+    times.sort()
+    print "%-32s best %7.2fms  median %7.2fms  (%s chars)" % (label, 1000 * times[0], 1000 * times[len(times) / 2], size)
+
+def main(sdk_path, args):
+    if os.path.isdir(sdk_path):
+        sys.path.insert(0, sdk_path)
+        import dev_appserver
+        dev_appserver.fix_sys_path()
+    sys.path.insert(0, os.getcwd())
+    logging.disable(logging.INFO)
+
+    started = time.time()
+    import webapp2
+    import sdoapp
+    from api import Unit, TypeHierarchyTree, DataCache
+    print "Loaded schemas in %.2fs" % (time.time() - started)
+
+    thing = Unit.GetUnit("Thing")
+    datatype = Unit.GetUnit("DataType")
+
+    def treeHTML():
+        tree = TypeHierarchyTree()
+        tree.traverseForHTML(thing, layers=["core"])
+        return tree.toHTML()
+
+    def treeHTMLWithDataTypes():
+        tree = TypeHierarchyTree()
+        tree.traverseForHTML(datatype, layers=["core"])
+        return treeHTML() + tree.toHTML()
+
+    def treeJSONLD():
+        tree = TypeHierarchyTree()
+        tree.traverseForJSONLD(thing, layers=["core"])
+        return tree.toJSON()
+
+    def page(path, cachekey):
+        def fetch():
+            if cachekey in DataCache:
+                del DataCache[cachekey]
+            return webapp2.Request.blank("/" + path).get_response(sdoapp.app).body
+        return fetch
+
+    timed("TypeHierarchyTree HTML", args.repeat, treeHTMLWithDataTypes)
+    timed("TypeHierarchyTree JSON-LD", args.repeat, treeJSONLD)
+    timed("docs/full.html (uncached)", args.repeat, page("docs/full.html", "FullTreePage"))
+    timed("docs/tree.jsonld (uncached)", args.repeat, page("docs/tree.jsonld", "JSONLDThingTree"))
+    timed("version/latest/ (uncached)", args.repeat, page("version/latest/", "FullReleasePage:latest"))
+    timed("schema-all.json (uncached)", args.repeat, page("version/latest/schema-all.json", "FullReleaseJSON"))
+    timed("schema.nt (uncached)", args.repeat, page("version/latest/schema.nt", "FullReleaseGraph:core:nt"))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Timings for schema.org site-wide pages.')
+    parser.add_argument('--repeat', type=int, default=10, help='Runs per measurement.')
+    parser.add_argument('--sdk', default=expanduser("~") + '/google-cloud-sdk/platform/google_appengine/', help='Path to the GAE SDK.')
+    args = parser.parse_args()
+    main(args.sdk, args)
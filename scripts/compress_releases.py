@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import glob
+import gzip
+import shutil
+import argparse
+
+# Writes a gzip-compressed copy beside each release artifact, e.g.
+# data/releases/2.0/schema.nt.gz, for fileserver.ServeFile to send to clients
+# that accept gzip.
+# - Each copy is given its source's mtime; ServeFile only uses a copy at least as new as its source
+# - Copies that are already up to date are left alone
+# - Run from the top level directory before deploying: python scripts/compress_releases.py
+
+def compress(path, level):
+    target = path + ".gz"
+    mtime = os.stat(path).st_mtime
+    if os.path.exists(target) and os.stat(target).st_mtime == mtime:
+        return False
+    with open(path, "rb") as source:
+        with open(target, "wb") as f:
+            out = gzip.GzipFile(os.path.basename(path), "wb", level, f, mtime)
+            shutil.copyfileobj(source, out)
+            out.close()
+    os.utime(target, (mtime, mtime))
+    return True
+
+def main(args):
+    paths = [p for p in glob.glob(os.path.join(args.releases, "*", "*")) if os.path.isfile(p) and not p.endswith(".gz")]
+    written = 0
+    for path in sorted(paths):
+        if args.clean and os.path.exists(path + ".gz"):
+            os.remove(path + ".gz")
+        if compress(path, args.level):
+            written += 1
+            print "%s: %d -> %d bytes" % (path, os.stat(path).st_size, os.stat(path + ".gz").st_size)
+    print "Compressed %s of %s release files." % (written, len(paths))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Precompress the schema.org release artifacts.')
+    parser.add_argument('--clean', action='store_true', help='Rewrite every compressed copy.')
+    parser.add_argument('--level', type=int, default=9, help='gzip compression level.')
+    parser.add_argument('--releases', default='data/releases', help='Directory of release directories.')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+from os.path import expanduser
+
+# Lists what changed between two versions of the schemas, as /version/<old>..<new>/changes does
+# - Like run_tests.py, finds the GAE library to load the app outside the appengine runner
+# - Versions are releases with a snapshot in data/releases/, or "latest" for the current schemas
+# - Run from the top level directory: python scripts/release_diff.py 2.0 latest [--json]
+
+def main(sdk_path, args):
+    if os.path.isdir(sdk_path):
+        sys.path.insert(0, sdk_path)
+        import dev_appserver
+        dev_appserver.fix_sys_path()
+    sys.path.insert(0, os.getcwd())
+    logging.disable(logging.INFO)
+
+    import sdoapp
+    import releases
+
+    started = time.time()
+    changes = releases.ReleaseChanges(args.old, args.new)
+    if changes is None:
+        print >> sys.stderr, "Unknown version: %s or %s" % (args.old, args.new)
+        sys.exit(1)
+    elapsed = time.time() - started
+
+    if args.json:
+        print json.dumps(changes, indent=2, sort_keys=True, separators=(",", ": "))
+        return
+    print "Changes from %s to %s: %s triples added, %s removed (%.2fs)" % (args.old, args.new,
+        changes["triples"]["added"], changes["triples"]["removed"], elapsed)
+    for id in changes["added"]:
+        print "+ %s" % id
+    for id in changes["removed"]:
+        print "- %s" % id
+    for id, lines in sorted(changes["changed"].items()):
+        print "~ %s" % id
+        for line in lines["removed"]:
+            print "    - %s" % line.encode("utf-8")
+        for line in lines["added"]:
+            print "    + %s" % line.encode("utf-8")
+    for old, new in sorted(changes["superseded"].items()):
+        print "> %s superseded by %s" % (old, new)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Differences between two versions of the schema.org schemas.')
+    parser.add_argument('old', help='Earlier version, e.g. 2.0')
+    parser.add_argument('new', nargs='?', default='latest', help='Later version (default: latest).')
+    parser.add_argument('--json', action='store_true', help='Print the changes as JSON.')
+    parser.add_argument('--sdk', default=expanduser("~") + '/google-cloud-sdk/platform/google_appengine/', help='Path to the GAE SDK.')
+    args = parser.parse_args()
+    main(args.sdk, args)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+import io
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import itertools
+import collections
+import logging
+import multiprocessing
+from os.path import expanduser
+
+# Validates structured data extracted from crawled pages against the schemas, with validator.py
+# - Like run_tests.py, finds the GAE library to load the app outside the appengine runner
+# - Reads JSON Lines, one item per line (JSON-LD, or microdata as JSON), from a file or stdin ("-"), gzipped or not
+# - The schemas are loaded once, here, as read_schemas builds them; worker processes are given the
+#   ValidationTables made from them and validate batches of lines, with only a few batches per worker
+#   read ahead, so memory use stays the same however large the input
+# - Writes {"line": n, "diagnostics": [...]} for each item with something to report, then counts by code and term
+# - Run from the top level directory: python scripts/validate_items.py items.jsonl.gz --output diagnostics.jsonl
+
+GZIP_MAGIC = b"\x1f\x8b"
+BATCH_LINES = 1000 # lines in each batch a worker validates
+BATCHES_AHEAD = 4 # batches read ahead for each worker
+RESULT_WAIT = 24 * 3600 # seconds; waiting with a timeout lets Ctrl-C through
+
+worker = None # this process's Validator
+worker_field = None
+
+def startWorker(tables, field):
+    global worker, worker_field
+    from validator import Validator
+    worker = Validator(tables)
+    worker_field = field
+
+def validateBatch(batch):
+    """Diagnostics for (first line number, lines): as output text, and the batch's ValidationSummary."""
+    from validator import ValidateLines, ValidationSummary
+    number, lines = batch
+    worker.summary = ValidationSummary()
+    reports = ValidateLines(worker, lines, number, worker_field)
+    text = "".join(json.dumps({ "line": n, "diagnostics": d }) + "\n" for (n, d) in reports) # unsorted keys: the C encoder
+    return text, worker.summary
+
+def openItems(path):
+    """A stream of the lines of path ("-" for stdin), decompressed if it is gzipped."""
+    stream = io.open(sys.stdin.fileno() if path == "-" else path, "rb")
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = io.BufferedReader(gzip.GzipFile(fileobj=stream, mode="rb"))
+    return stream
+
+def batches(stream, size):
+    number = 1
+    lines = []
+    for line in stream:
+        lines.append(line)
+        if len(lines) == size:
+            yield (number, lines)
+            number += size
+            lines = []
+    if lines:
+        yield (number, lines)
+
+def boundedMap(pool, f, tasks, ahead):
+    """As pool.imap(f, tasks), but reading no more than ahead tasks before their results are taken."""
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.apply_async(f, (task,)))
+        if len(pending) >= ahead:
+            yield pending.popleft().get(RESULT_WAIT)
+    while pending:
+        yield pending.popleft().get(RESULT_WAIT)
+
+def main(sdk_path, args):
+    if os.path.isdir(sdk_path):
+        sys.path.insert(0, sdk_path)
+        import dev_appserver
+        dev_appserver.fix_sys_path()
+    sys.path.insert(0, os.getcwd())
+    logging.disable(logging.INFO)
+
+    import sdoapp
+    from validator import GetValidationTables, ValidationSummary
+
+    tables = GetValidationTables(args.layers.split(","))
+    out = sys.stdout if args.output == "-" else open(args.output, "wb")
+    summary = ValidationSummary()
+    started = time.time()
+    work = batches(openItems(args.items), args.batch)
+    pool = None
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, startWorker, (tables, args.field))
+        results = boundedMap(pool, validateBatch, work, args.workers * BATCHES_AHEAD)
+    else:
+        startWorker(tables, args.field)
+        results = itertools.imap(validateBatch, work)
+    try:
+        for text, batch in results:
+            out.write(text)
+            summary.merge(batch)
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        if pool is not None:
+            pool.terminate() # after an error or Ctrl-C, rather than leaving the workers running
+    if out is not sys.stdout:
+        out.close()
+    elapsed = time.time() - started
+
+    report = summary.report()
+    report["elapsed"] = round(elapsed, 3)
+    report["workers"] = args.workers
+    report["throughput"] = round(summary.items / elapsed, 1) if elapsed else 0.0
+    if args.summary:
+        with open(args.summary, "wb") as f:
+            json.dump(report, f, indent=2, sort_keys=True, separators=(",", ": "))
+
+    print >> sys.stderr, "Validated %s items in %.2fs with %s workers: %.0f items/s (%.0f items/s per worker)" % (
+        summary.items, elapsed, args.workers, report["throughput"], summary.itemsPerSecond())
+    print >> sys.stderr, "%s items with errors; %s errors, %s warnings" % (summary.invalid, summary.errors, summary.warnings)
+    counts = [(count, code, term) for (code, terms) in summary.counts.items() for (term, count) in terms.items()]
+    for (count, code, term) in sorted(counts, key=lambda c: (-c[0], c[1], c[2]))[:args.top]:
+        print >> sys.stderr, "%10d  %-26s %s" % (count, code, term.encode("utf-8"))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Validate structured data items against the schema.org schemas.')
+    parser.add_argument('items', help='JSON Lines file of items, optionally gzipped; "-" for stdin.')
+    parser.add_argument('--output', default='-', help='Where to write the diagnostics (default: stdout).')
+    parser.add_argument('--summary', help='Also write the counts as JSON to this file.')
+    parser.add_argument('--field', help='Take each item from this key of the JSON object on its line.')
+    parser.add_argument('--layers', default='core', help='Comma-separated layers to validate against (default: core).')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='Worker processes (default: one per core).')
+    parser.add_argument('--batch', type=int, default=BATCH_LINES, help='Lines in each batch given to a worker.')
+    parser.add_argument('--top', type=int, default=20, help='Number of the most frequent diagnostics to list.')
+    parser.add_argument('--sdk', default=expanduser("~") + '/google-cloud-sdk/platform/google_appengine/', help='Path to the GAE SDK.')
+    args = parser.parse_args()
+    main(args.sdk, args)
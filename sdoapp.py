@@ -3,24 +3,38 @@
 
 import os
 import re
+import json
+import time
+import types
+import hashlib
+import threading
 import webapp2
 import jinja2
 import logging
 
 from markupsafe import Markup, escape # https://pypi.python.org/pypi/MarkupSafe
 
+import api
 import parsers
-
+import serializers
+from fileserver import ServeFile
+from caches import Cache, DependencyRecording, CacheStats, LogCacheStatsIfDue, CaptureStream
 
 from google.appengine.ext import ndb
 from google.appengine.ext import blobstore
 from google.appengine.api import users
 from google.appengine.ext.webapp import blobstore_handlers
 
-from api import inLayer, read_file, full_path, read_schemas, namespaces, DataCache
-from api import Unit, GetTargets, GetSources
+from api import inLayer, read_file, full_path, read_schemas, namespaces, DataCache, GetJsonLdContext
+from api import Unit, GetTargets, GetSources, usageRank
 from api import GetComment, all_terms, GetAllTypes, GetAllProperties
-from api import GetParentList, GetImmediateSubtypes, HasMultipleBaseTypes
+from api import GetParentList, GetImmediateSubtypes, HasMultipleBaseTypes, TypeHierarchyTree, GetSchemaIndex, GetSubtypeTree
+from api import GetTermLookup, SearchTerms, GetSpellingIndex, GetRedirectTable, GetPropertyGraph, PATH_MAX_HOPS
+from api import GetInheritedDomain, GetInheritedRange, GetApplicableProperties, GetIncomingProperties
+from textindex import PlainText
+from api import JINJA_ENVIRONMENT
+from api import UsingGraph, GraphStream, ReadingStream, graph_lock
+from releases import GetRelease, ReleaseChangesJSON, ChangedTerms
 
 logging.basicConfig(level=logging.INFO) # dev_appserver.py --log_level debug .
 log = logging.getLogger(__name__)
@@ -41,155 +55,173 @@ silent_skip_list =  [ "favicon.ico" ] # Do nothing for now
 
 all_layers = {}
 ext_re = re.compile(r'([^\w,])+')
-PageCache = {}
+sitemap_page_re = re.compile(r'^sitemap-([1-9]\d*)\.xml$')
+term_href_re = re.compile(r'''href=(["'])(?:https?://schema\.org)?/([\w:\-]+)\1''') # links to terms, e.g. href="/Person" or href='http://schema.org/Person'
+PageCache = Cache("page")
+FragmentCache = Cache("fragment") # rendered table rows and lists, shared between pages. See GetCachedFragment.
 
 #TODO: Modes:
 # mainsite
 # webschemadev
 # known extension (not skiplist'd, eg. demo1 on schema.org)
 
-JINJA_ENVIRONMENT = jinja2.Environment(
-    loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')),
-    extensions=['jinja2.ext.autoescape'], autoescape=True)
-
 ENABLE_JSONLD_CONTEXT = True
 ENABLE_CORS = True
 ENABLE_HOSTED_EXTENSIONS = True
 
 ENABLED_EXTENSIONS = [ 'admin', 'auto', 'bib' ]
 
+# Optional warm-up stage: after read_schemas, render and cache the site-wide
+# pages and then term pages in descending Unit.usage order on a background thread.
+ENABLE_CACHE_WARMUP = False
+WARMUP_TIME_BUDGET = 120 # seconds of warm-up work before giving up
+WARMUP_MEMORY_BUDGET = 64 * 1024 * 1024 # bytes of rendered output to cache
+WARMUP_YIELD_DELAY = 0.05 # seconds to sleep while live requests are in flight
+WARMUP_HOST = os.environ.get("DEFAULT_VERSION_HOSTNAME", "localhost:8080") # host the warm-up pretends to serve
 
-debugging = False
-# debugging = True
+STREAM_CHUNK_SIZE = 16 * 1024 # characters per chunk when streaming generated pages
 
-def cleanPath(node):
-    """Return the substring of a string matching chars approved for use in our URL paths."""
-    return re.sub(r'[^a-zA-Z0-9\-/,\.]', '', str(node), flags=re.DOTALL)
+PATH_LIMIT = 20 # default number of paths docs/paths.json gives
+PATH_MAX_LIMIT = 100
+PATH_LONGEST = 5 # the most properties a path may be asked to have (?hops=)
 
+SPELLING_SUGGESTIONS = 3 # terms a 404 page suggests for a mistyped one
 
+AUTOCOMPLETE_LIMIT = 10 # default number of terms docs/autocomplete.json suggests
+AUTOCOMPLETE_MAX_LIMIT = 50
 
-class HTMLOutput:
-    """Used in place of http response when we're collecting HTML to pass to template engine."""
-
-    def __init__(self):
-        self.outputStrings = []
-
-    def write(self, str):
-        self.outputStrings.append(str)
-
-    def toHTML(self):
-        return Markup ( "".join(self.outputStrings)  )
+SEARCH_LIMIT = 20 # default number of results docs/search.json gives
+SEARCH_MAX_LIMIT = 100
 
-    def __str__(self):
-        return self.toHTML()
+SITEMAP_PAGE_SIZE = 50000 # URLs per sitemap, the protocol's limit; past it sitemap.xml becomes an index of sitemap-<n>.xml
 
-# Core API: we have a single schema graph built from triples and units.
-# now in api.py
 
+debugging = False
+# debugging = True
 
-class TypeHierarchyTree:
+def cleanPath(node):
+    """Return the substring of a string matching chars approved for use in our URL paths."""
+    return re.sub(r'[^a-zA-Z0-9\-/,\.]', '', str(node), flags=re.DOTALL)
 
-    def __init__(self):
-        self.txt = ""
-        self.visited = {}
 
-    def emit(self, s):
-        self.txt += s + "\n"
 
-    def toHTML(self):
-        return '<ul>%s</ul>' % self.txt
+term_macros = None
 
-    def toJSON(self):
-        return self.txt
+def TermMacros():
+    """The macros in templates/termMacros.tpl, e.g. TermMacros().ml(node)."""
+    global term_macros
+    if term_macros is None:
+        term_macros = JINJA_ENVIRONMENT.get_template('termMacros.tpl').module
+    return term_macros
 
-    def traverseForHTML(self, node, depth = 1, hashorslash="/", layers='core'):
+def TermListHTML(listclass, terms, hashorslash="/"):
+    """A simple list of links to these terms, e.g. a type's properties on the full release page."""
+    items = ["<li><a href='%s%s'>%s</a></li>" % (hashorslash, t.id, t.id) for t in terms]
+    return Markup("<ul class='%s'>%s</ul>\n\n" % (listclass, "".join(items)))
 
-        """Generate a hierarchical tree view of the types. hashorslash is used for relative link prefixing."""
+def GetCachedFragment(kind, node, layers, hashorslash, render):
+    """Return a rendered fragment (e.g. the rows of a type's property table) for node, from FragmentCache if possible.
 
-        # log.debug("traverseForHTML: node=%s hashorslash=%s" % ( node.id, hashorslash ))
+    Fragments are keyed by kind, term, layer set and link prefix; on a miss
+    render(node, layers=layers, hashorslash=hashorslash) builds it, recording
+    the terms it reads so that changes to them evict just this fragment.
+    """
+    if isinstance(layers, basestring):
+        layers = [layers]
+    cachekey = "%s:%s:%s:%s" % (kind, ",".join(sorted(layers)), hashorslash, node.id)
+    fragment = FragmentCache.get(cachekey)
+    if fragment == None:
+        with DependencyRecording():
+            fragment = render(node, layers=layers, hashorslash=hashorslash)
+            FragmentCache[cachekey] = fragment
+    return fragment
+
+def Rechunk(pieces, size=STREAM_CHUNK_SIZE):
+    """Group small pieces of text (e.g. from template.generate()) into chunks of about size characters."""
+    buf = []
+    buflen = 0
+    for piece in pieces:
+        buf.append(piece)
+        buflen += len(piece)
+        if buflen >= size:
+            yield "".join(buf)
+            buf = []
+            buflen = 0
+    if buf:
+        yield "".join(buf)
+
+def RelinkStream(chunks, relink):
+    """Pass chunks of HTML through relink(text), cut after a ">" so that no tag (or link in it) is split between two calls."""
+    carry = ""
+    for chunk in chunks:
+        text = carry + chunk
+        cut = text.rfind(">") + 1
+        carry = text[cut:]
+        if cut:
+            yield relink(text[:cut])
+    if carry:
+        yield relink(carry)
+
+def SitemapTerms(layers):
+    """The terms described in these layers, by id, for sitemaps."""
+    ids = sorted(id for id in all_terms.keys() if ":" not in id)
+    return [u for u in (Unit.GetUnit(id) for id in ids) if inLayer(layers, u)]
+
+def SitemapLastModified(layers):
+    """Term id -> date, for terms whose pages are as they were in the newest release with a snapshot."""
+    versions = sorted((date, version) for version, date in releaselog.items() if GetRelease(version) is not None)
+    if not versions:
+        return {}
+    date, version = versions[-1]
+    changed = ChangedTerms(version, "latest")
+    extended = lambda id: any(l != "core" and l in layers for l in all_terms.get(id, []))
+    return dict((id, date) for id in GetRelease(version).nodes if id not in changed and not extended(id))
+
+def GraphLoadedDate():
+    """The date the live graph was loaded, for pages changed since the last release."""
+    return time.strftime("%Y-%m-%d", time.gmtime(api.graph_loaded)) if api.graph_loaded else None
+
+def SitemapXML(base, terms, lastmods, loaded=None):
+    """A sitemap of the pages for terms, a line at a time. Priority follows Unit.usage.
+
+    lastmods gives the dates of terms unchanged since a release; others are
+    dated loaded, if given.
+    """
+    yield u'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for u in terms:
+        date = lastmods.get(u.id, loaded)
+        lastmod = u"<lastmod>%s</lastmod>" % date if date else u""
+        priority = min(1.0, 0.5 + 0.05 * usageRank(u))
+        yield u"<url><loc>%s%s</loc>%s<priority>%.2f</priority></url>\n" % (escape(base), escape(u.id), lastmod, priority)
+    yield u"</urlset>\n"
+
+def SitemapIndexXML(base, pages):
+    """A sitemap index listing sitemap-1.xml to sitemap-<pages>.xml."""
+    yield u'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for n in range(1, pages + 1):
+        yield u"<sitemap><loc>%ssitemap-%d.xml</loc></sitemap>\n" % (escape(base), n)
+    yield u"</sitemapindex>\n"
+
+class LazyTermInfo:
+    """Read-only mapping from a term to a dict of details about it, built on demand.
+
+    Only the latest term's details are kept, so a template looping over many
+    terms holds one term's worth at a time.
+    """
 
-        # we are a supertype of some kind
-        if len(node.GetImmediateSubtypes(layers=layers)) > 0:
+    def __init__(self, build):
+        self.build = build
+        self.term = None
+        self.info = None
 
-            # and we haven't been here before
-            if node.id not in self.visited:
-                self.visited[node.id] = True # remember our visit
-                self.emit( ' %s<li class="tbranch" id="%s"><a href="%s%s">%s</a>' % (" " * 4 * depth, node.id, hashorslash, node.id, node.id) )
-                self.emit(' %s<ul>' % (" " * 4 * depth))
+    def __getitem__(self, term):
+        if term is not self.term:
+            self.info = self.build(term)
+            self.term = term
+        return self.info
 
-                # handle our subtypes
-                for item in node.GetImmediateSubtypes(layers=layers):
-                    self.traverseForHTML(item, depth + 1, hashorslash=hashorslash, layers=layers)
-                self.emit( ' %s</ul>' % (" " * 4 * depth))
-            else:
-                # we are a supertype but we visited this type before, e.g. saw Restaurant via Place then via Organization
-                seen = '  <a href="#%s">*</a> ' % node.id
-                self.emit( ' %s<li class="tbranch" id="%s"><a href="%s%s">%s</a>%s' % (" " * 4 * depth, node.id, hashorslash, node.id, node.id, seen) )
-
-        # leaf nodes
-        if len(node.GetImmediateSubtypes(layers=layers)) == 0:
-            if node.id not in self.visited:
-                self.emit( '%s<li class="tleaf" id="%s"><a href="%s%s">%s</a>%s' % (" " * depth, node.id, hashorslash, node.id, node.id, "" ))
-            #else:
-                #self.visited[node.id] = True # never...
-                # we tolerate "VideoGame" appearing under both Game and SoftwareApplication
-                # and would only suppress it if it had its own subtypes. Seems legit.
-
-        self.emit( ' %s</li>' % (" " * 4 * depth) )
-
-    # based on http://danbri.org/2013/SchemaD3/examples/4063550/hackathon-schema.js  - thanks @gregg, @sandro
-    def traverseForJSONLD(self, node, depth = 0, last_at_this_level = True, supertype="None", layers='core'):
-        emit_debug = False
-        if node.id in self.visited:
-            # self.emit("skipping %s - already visited" % node.id)
-            return
-        self.visited[node.id] = True
-        p1 = " " * 4 * depth
-        if emit_debug:
-            self.emit("%s# @id: %s last_at_this_level: %s" % (p1, node.id, last_at_this_level))
-        global namespaces;
-        ctx = "{}".format(""""@context": {
-    "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
-    "schema": "http://schema.org/",
-    "rdfs:subClassOf": { "@type": "@id" },
-    "name": "rdfs:label",
-    "description": "rdfs:comment",
-    "children": { "@reverse": "rdfs:subClassOf" }
-  },\n""" if last_at_this_level and depth==0 else '' )
-
-        unseen_subtypes = []
-        for st in node.GetImmediateSubtypes(layers=layers):
-            if not st.id in self.visited:
-                unseen_subtypes.append(st)
-        unvisited_subtype_count = len(unseen_subtypes)
-        subtype_count = len( node.GetImmediateSubtypes(layers=layers) )
-
-        supertx = "{}".format( '"rdfs:subClassOf": "schema:%s", ' % supertype.id if supertype != "None" else '' )
-        maybe_comma = "{}".format("," if unvisited_subtype_count > 0 else "")
-        comment = GetComment(node, layers).strip()
-        comment = comment.replace('"',"'")
-        comment = re.sub('<[^<]+?>', '', comment)[:60]
-
-        self.emit('\n%s{\n%s\n%s"@type": "rdfs:Class", %s "description": "%s...",\n%s"name": "%s",\n%s"@id": "schema:%s"%s'
-                  % (p1, ctx, p1,                 supertx,            comment,     p1,   node.id, p1,        node.id,  maybe_comma))
-
-        i = 1
-        if unvisited_subtype_count > 0:
-            self.emit('%s"children": ' % p1 )
-            self.emit("  %s["  % p1 )
-            inner_lastness = False
-            for t in unseen_subtypes:
-                if emit_debug:
-                    self.emit("%s  # In %s > %s i: %s unvisited_subtype_count: %s" %(p1, node.id, t.id, i, unvisited_subtype_count))
-                if i == unvisited_subtype_count:
-                    inner_lastness = True
-                i = i + 1
-                self.traverseForJSONLD(t, depth + 1, inner_lastness, supertype=node, layers=layers)
-
-            self.emit("%s  ]%s" % (p1,  "{}".format( "" if not last_at_this_level else '' ) ) )
-
-        maybe_comma = "{}".format( ',' if not last_at_this_level else '' )
-        self.emit('\n%s}%s\n' % (p1, maybe_comma))
+# Core API: we have a single schema graph built from triples and units.
+# now in api.py
 
 
 class Example ():
@@ -258,43 +290,25 @@ def GetExtMappingsRDFa(node, layers='core'):
             return markup
     return "<!-- no external mappings noted for this term. -->"
 
-def GetJsonLdContext(layers='core'):
-    """Generates a basic JSON-LD context file for schema.org."""
-
-    if DataCache.get('JSONLDCONTEXT'):
-        log.debug("DataCache: recycled JSONLDCONTEXT")
-        return DataCache.get('JSONLDCONTEXT')
-    else:
-        global namespaces
-        jsonldcontext = "{\"@context\":    {\n"
-        jsonldcontext += namespaces ;
-        jsonldcontext += "        \"@vocab\": \"http://schema.org/\",\n"
-
-        url = Unit.GetUnit("URL")
-        date = Unit.GetUnit("Date")
-        datetime = Unit.GetUnit("DateTime")
-
-        properties = sorted(GetSources(Unit.GetUnit("typeOf"), Unit.GetUnit("rdf:Property"), layers=layers), key=lambda u: u.id)
-        for p in properties:
-            range = GetTargets(Unit.GetUnit("rangeIncludes"), p, layers=layers)
-            type = None
-
-            if url in range:
-                type = "@id"
-            elif date in range:
-                type = "Date"
-            elif datetime in range:
-                type = "DateTime"
-
-            if type:
-                jsonldcontext += "        \"" + p.id + "\": { \"@type\": \"" + type + "\" },"
-
-        jsonldcontext += "}}\n"
-        jsonldcontext = jsonldcontext.replace("},}}","}\n    }\n}")
-        jsonldcontext = jsonldcontext.replace("},","},\n")
-        DataCache['JSONLDCONTEXT'] = jsonldcontext
-        log.debug("DataCache: added JSONLDCONTEXT")
-        return jsonldcontext
+class LiveRequestCounter:
+    """Counts requests currently being served, so background work can stay out of their way."""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def enter(self):
+        with self.lock:
+            self.count += 1
+
+    def leave(self):
+        with self.lock:
+            self.count -= 1
+
+    def busy(self):
+        return self.count > 0
+
+LiveRequests = LiveRequestCounter()
 
 class ShowUnit (webapp2.RequestHandler):
     """ShowUnit exposes schema.org terms via Web RequestHandler
@@ -304,6 +318,20 @@ class ShowUnit (webapp2.RequestHandler):
 #    def __init__(self):
 #        self.outputStrings = []
 
+    def dispatch(self):
+        """Dispatch a live request, keeping LiveRequests up to date.
+
+        Pages cached while handling it depend on every term the request read,
+        and the live graph doesn't change while it is read (see api.GraphLock).
+        """
+        LiveRequests.enter()
+        try:
+            with graph_lock.reading(), DependencyRecording():
+                return webapp2.RequestHandler.dispatch(self)
+        finally:
+            LiveRequests.leave()
+            LogCacheStatsIfDue()
+
     def emitCacheHeaders(self):
         """Send cache-related headers via HTTP."""
         self.response.headers['Cache-Control'] = "public, max-age=43200" # 12h
@@ -313,11 +341,7 @@ class ShowUnit (webapp2.RequestHandler):
         """Return page text from node.id cache (if found, otherwise None)."""
         global PageCache
         cachekey = "%s:%s" % ( layers, node.id ) # was node.id
-        #if (node.id in PageCache):
-        if (cachekey in PageCache):
-            return PageCache[cachekey]
-        else:
-            return None
+        return PageCache.get(cachekey) # one lookup: a shared backend may drop the entry between two
 
     def AddCachedText(self, node, textStrings, layers='core'):
         """Cache text of our page for this node via its node.id.
@@ -336,51 +360,19 @@ class ShowUnit (webapp2.RequestHandler):
         self.outputStrings.append(str)
 
 
-    def moreInfoBlock(self, node, layer='core'):
-
+    def moreInfoItems(self, node, layer='core'):
+        """Entries for the [more...] box on a term page."""
         # if we think we have more info on this term, show a bulleted list of extra items.
-
-        # defaults
-        bugs = ["No known open issues."]
-        mappings = ["No recorded schema mappings."]
-        items = bugs + mappings
-
         items = [
 
          "<a href='https://github.com/schemaorg/schemaorg/issues?q=is%3Aissue+is%3Aopen+{0}'>Check for open issues.</a>".format(node.id)
         ]
 
-        for l in all_terms[node.id]:
+        for l in all_terms.get(node.id, []): # terms only in a release aren't in all_terms
             l = l.replace("#","")
             if ENABLE_HOSTED_EXTENSIONS:
                 items.append("'{0}' is mentioned in extension layer: <a href='?ext={1}'>{2}</a>".format( node.id, l, l ))
-
-        moreinfo = """<div>
-        <div id='infobox' style='text-align: right;'><b><span style="cursor: pointer;">[more...]</span></b></div>
-        <div id='infomsg' style='display: none; background-color: #EEEEEE; text-align: left; padding: 0.5em;'>
-        <ul>"""
-
-        for i in items:
-            moreinfo += "<li>%s</li>" % i
-
-#          <li>mappings to other terms.</li>
-#          <li>or links to open issues.</li>
-
-        moreinfo += """</ul>
-          </div>
-        </div</div>
-        <script type="text/javascript">
-        $("#infobox").click(function(x) {
-            element = $("#infomsg");
-            if (! $(element).is(":visible")) {
-                $("#infomsg").show(300);
-            } else {
-                $("#infomsg").hide(300);
-
-            }
-        });
-</script>"""
-        return moreinfo
+        return items
 
     def GetParentStack(self, node, layers='core'):
         """Returns a hiearchical structured used for site breadcrumbs."""
@@ -428,263 +420,142 @@ class ShowUnit (webapp2.RequestHandler):
            hyperlinks.append(self.ml(f, f.id, tooltip))
         return (", ".join(hyperlinks))
 
-    def emitUnitHeaders(self, node, layers='core'):
-        """Write out the HTML page headers for this node."""
-        self.write("<h1 class=\"page-title\">\n")
-        ind = len(self.parentStack)
+    def breadcrumb(self, node, layers='core'):
+        """The part of self.parentStack shown in a term page's heading: from Thing (or a DataType) down to node."""
+        crumbs = []
         thing_seen = False
-        while (ind > 0) :
-            ind = ind -1
-            nn = self.parentStack[ind]
+        for nn in reversed(self.parentStack):
             if (nn.id == "Thing" or thing_seen or nn.isDataType(layers=layers)):
                 thing_seen = True
-                self.write(self.ml(nn) )
-                if ind == 1 and node.isEnumerationValue(layers=layers):
-                    self.write(" :: ")
-                elif ind > 0:
-                    self.write(" &gt; ")
-                if ind == 1:
-                    self.write("<span property=\"rdfs:label\">")
-                if ind == 0:
-                    self.write("</span>")
-        self.write("</h1>")
-        comment = GetComment(node, layers)
-        self.write(" <div property=\"rdfs:comment\">%s</div>\n\n" % (comment) + "\n")
-
-        self.write(" <br><div>Usage: %s</div>\n\n" % (node.UsageStr()) + "\n")
-
-        self.write(self.moreInfoBlock(node))
-
-        if (node.isClass(layers=layers) and not node.isDataType(layers=layers)):
-
-            self.write("<table class=\"definition-table\">\n        <thead>\n  <tr><th>Property</th><th>Expected Type</th><th>Description</th>               \n  </tr>\n  </thead>\n\n")
-
-
-    def emitSimplePropertiesPerType(self, cl, layers="core", out=None, hashorslash="/"):
-        """Emits a simple list of properties applicable to the specified type."""
-
-        if not out:
-            out = self
-
-        out.write("<ul class='props4type'>")
-        for prop in sorted(GetSources(  Unit.GetUnit("domainIncludes"), cl, layers=layers), key=lambda u: u.id):
-            if (prop.superseded(layers=layers)):
-                continue
-            out.write("<li><a href='%s%s'>%s</a></li>" % ( hashorslash, prop.id, prop.id  ))
-        out.write("</ul>\n\n")
-
-    def emitSimplePropertiesIntoType(self, cl, layers="core", out=None, hashorslash="/"):
-        """Emits a simple list of properties whose values are the specified type."""
-
-        if not out:
-            out = self
-
-        out.write("<ul class='props2type'>")
-        for prop in sorted(GetSources(  Unit.GetUnit("rangeIncludes"), cl, layers=layers), key=lambda u: u.id):
-            if (prop.superseded(layers=layers)):
-                continue
-            out.write("<li><a href='%s%s'>%s</a></li>" % ( hashorslash, prop.id, prop.id  ))
-        out.write("</ul>\n\n")
-
-    def ClassProperties (self, cl, subclass=False, layers="core", out=None, hashorslash="/"):
-        """Write out a table of properties for a per-type page."""
-        if not out:
-            out = self
-
-        headerPrinted = False
+                crumbs.append(nn)
+        return crumbs
+
+    def classPropertyTables(self, layers="core", hashorslash="/"):
+        """For each type in self.parentStack, the rows of its table on a per-type page."""
+        tables = []
+        for cl in self.parentStack:
+            rows = GetCachedFragment("ClassPropertyRows", cl, layers, hashorslash, self.classPropertyRows)
+            tables.append({ 'cls': cl, 'subclass': cl == self.parentStack[0], 'rows': rows })
+        return tables
+
+    def classPropertyRows(self, cl, layers="core", hashorslash="/"):
+        """Markup for the rows of a type's table on per-type pages: the same on the pages of all its subtypes."""
         di = Unit.GetUnit("domainIncludes")
-        ri = Unit.GetUnit("rangeIncludes")
+        rows = []
         for prop in sorted(GetSources(di, cl, layers=layers), key=lambda u: u.id):
             if (prop.superseded(layers=layers)):
                 continue
-            supersedes = prop.supersedes(layers=layers)
-            olderprops = prop.supersedes_all(layers=layers)
-            inverseprop = prop.inverseproperty(layers=layers)
-            subprops = prop.subproperties(layers=layers)
-            superprops = prop.superproperties(layers=layers)
-            ranges = GetTargets(ri, prop, layers=layers)
-            comment = GetComment(prop, layers=layers)
-            if (not headerPrinted):
-                class_head = self.ml(cl)
-                if subclass:
-                    class_head = self.ml(cl, prop="rdfs:subClassOf")
-                out.write("<thead class=\"supertype\">\n  <tr>\n    <th class=\"supertype-name\" colspan=\"3\">Properties from %s</th>\n  </tr>\n</thead>\n\n<tbody class=\"supertype\">\n  " % (class_head))
-                headerPrinted = True
-
-            out.write("<tr typeof=\"rdfs:Property\" resource=\"http://schema.org/%s\">\n    \n      <th class=\"prop-nam\" scope=\"row\">\n\n<code property=\"rdfs:label\">%s</code>\n    </th>\n " % (prop.id, self.ml(prop)))
-            out.write("<td class=\"prop-ect\">\n")
-            first_range = True
-            for r in ranges:
-                if (not first_range):
-                    out.write(" or <br/> ")
-                first_range = False
-                out.write(self.ml(r, prop='rangeIncludes'))
-                out.write("&nbsp;")
-            out.write("</td>")
-            out.write("<td class=\"prop-desc\" property=\"rdfs:comment\">%s" % (comment))
-            if (len(olderprops) > 0):
-                olderlinks = ", ".join([self.ml(o) for o in olderprops])
-                out.write(" Supersedes %s." % olderlinks )
-            if (inverseprop != None):
-                out.write("<br/> Inverse property: %s." % (self.ml(inverseprop)))
-
-            out.write("</td></tr>")
-            subclass = False
-
-        if subclass: # in case the superclass has no defined attributes
-            out.write("<meta property=\"rdfs:subClassOf\" content=\"%s\">" % (cl.id))
-
-    def emitClassIncomingProperties (self, cl, layers="core", out=None, hashorslash="/"):
-        """Write out a table of incoming properties for a per-type page."""
-        if not out:
-            out = self
-
-        headerPrinted = False
-        di = Unit.GetUnit("domainIncludes")
+            rows.append(self.classPropertyRow(prop, layers=layers, hashorslash=hashorslash))
+        return "".join(rows)
+
+    def classPropertyRow(self, prop, layers="core", hashorslash="/"):
+        """Markup for one property's row in a per-type table. Written out here rather than by a macro, as there are many."""
+        ri = Unit.GetUnit("rangeIncludes")
+        olderprops = prop.supersedes_all(layers=layers)
+        inverseprop = prop.inverseproperty(layers=layers)
+        ranges = GetTargets(ri, prop, layers=layers)
+        comment = GetComment(prop, layers=layers)
+
+        html = []
+        html.append("<tr typeof=\"rdfs:Property\" resource=\"http://schema.org/%s\">\n    \n      <th class=\"prop-nam\" scope=\"row\">\n\n<code property=\"rdfs:label\"><a href=\"%s%s\">%s</a></code>\n    </th>\n " % (prop.id, hashorslash, prop.id, prop.id))
+        html.append("<td class=\"prop-ect\">\n")
+        html.append(" or <br/> ".join(["<a href=\"%s%s\" property=\"rangeIncludes\">%s</a>&nbsp;" % (hashorslash, r.id, r.id) for r in ranges]))
+        html.append("</td><td class=\"prop-desc\" property=\"rdfs:comment\">%s" % (comment))
+        if (len(olderprops) > 0):
+            html.append(" Supersedes %s." % ", ".join(["<a href=\"%s%s\">%s</a>" % (hashorslash, o.id, o.id) for o in olderprops]))
+        if (inverseprop != None):
+            html.append("<br/> Inverse property: <a href=\"%s%s\">%s</a>." % (hashorslash, inverseprop.id, inverseprop.id))
+        html.append("</td></tr>")
+        return "".join(html)
+
+    def incomingPropertyRows(self, cl, layers="core", hashorslash="/"):
+        """Markup for the rows of the table of properties whose values may be of this type."""
+        rows = []
         ri = Unit.GetUnit("rangeIncludes")
         for prop in sorted(GetSources(ri, cl, layers=layers), key=lambda u: u.id):
             if (prop.superseded(layers=layers)):
                 continue
-            supersedes = prop.supersedes(layers=layers)
-            inverseprop = prop.inverseproperty(layers=layers)
-            subprops = prop.subproperties(layers=layers)
-            superprops = prop.superproperties(layers=layers)
-            ranges = GetTargets(di, prop, layers=layers)
-            comment = GetComment(prop, layers=layers)
-
-            if (not headerPrinted):
-                self.write("<br/><br/>Instances of %s may appear as values for the following properties<br/>" % (self.ml(cl)))
-                self.write("<table class=\"definition-table\">\n        \n  \n<thead>\n  <tr><th>Property</th><th>On Types</th><th>Description</th>               \n  </tr>\n</thead>\n\n")
-
-                headerPrinted = True
-
-            self.write("<tr>\n<th class=\"prop-nam\" scope=\"row\">\n <code>%s</code>\n</th>\n " % (self.ml(prop)) + "\n")
-            self.write("<td class=\"prop-ect\">\n")
-            first_range = True
-            for r in ranges:
-                if (not first_range):
-                    self.write(" or<br/> ")
-                first_range = False
-                self.write(self.ml(r))
-                self.write("&nbsp;")
-            self.write("</td>")
-            self.write("<td class=\"prop-desc\">%s " % (comment))
-            if (supersedes != None):
-                self.write(" Supersedes %s." % (self.ml(supersedes)))
-            if (inverseprop != None):
-                self.write("<br/> inverse property: %s." % (self.ml(inverseprop)) )
-
-            self.write("</td></tr>")
-        if (headerPrinted):
-            self.write("</table>\n")
-
-
-    def emitRangeTypesForProperty(self, node, layers="core", out=None, hashorslash="/"):
-        """Write out simple HTML summary of this property's expected types."""
-        if not out:
-            out = self
-
-        out.write("<ul class='attrrangesummary'>")
-        for rt in sorted(GetTargets(Unit.GetUnit("rangeIncludes"), node, layers=layers), key=lambda u: u.id):
-            out.write("<li><a href='%s%s'>%s</a></li>" % ( hashorslash, rt.id, rt.id  ))
-        out.write("</ul>\n\n")
-
-
-    def emitDomainTypesForProperty(self, node, layers="core", out=None, hashorslash="/"):
-        """Write out simple HTML summary of types that expect this property."""
-        if not out:
-            out = self
-
-        out.write("<ul class='attrdomainsummary'>")
-        for dt in sorted(GetTargets(Unit.GetUnit("domainIncludes"), node, layers=layers), key=lambda u: u.id):
-            out.write("<li><a href='%s%s'>%s</a></li>" % ( hashorslash, dt.id, dt.id  ))
-        out.write("</ul>\n\n")
-
-
-
-    def emitAttributeProperties(self, node, layers="core", out=None, hashorslash="/"):
-        """Write out properties of this property, for a per-property page."""
-        if not out:
-            out = self
+            rows.append(self.incomingPropertyRow(prop, layers=layers, hashorslash=hashorslash))
+        return "".join(rows)
 
+    def incomingPropertyRow(self, prop, layers="core", hashorslash="/"):
+        """Markup for one property's row in a per-type incoming properties table."""
+        di = Unit.GetUnit("domainIncludes")
+        supersedes = prop.supersedes(layers=layers)
+        inverseprop = prop.inverseproperty(layers=layers)
+        domains = GetTargets(di, prop, layers=layers)
+        comment = GetComment(prop, layers=layers)
+
+        html = []
+        html.append("<tr>\n<th class=\"prop-nam\" scope=\"row\">\n <code><a href=\"%s%s\">%s</a></code>\n</th>\n \n" % (hashorslash, prop.id, prop.id))
+        html.append("<td class=\"prop-ect\">\n")
+        html.append(" or<br/> ".join(["<a href=\"%s%s\">%s</a>&nbsp;" % (hashorslash, d.id, d.id) for d in domains]))
+        html.append("</td><td class=\"prop-desc\">%s " % (comment))
+        if (supersedes != None):
+            html.append(" Supersedes <a href=\"%s%s\">%s</a>." % (hashorslash, supersedes.id, supersedes.id))
+        if (inverseprop != None):
+            html.append("<br/> inverse property: <a href=\"%s%s\">%s</a>." % (hashorslash, inverseprop.id, inverseprop.id))
+        html.append("</td></tr>")
+        return "".join(html)
+
+
+    def attributeInfo(self, node, layers="core"):
+        """What a per-property page shows about this property: inverse, ranges, domains and related properties.
+
+        Links are (node, title) pairs, or (node, title, prop) in 'tables'.
+        """
         di = Unit.GetUnit("domainIncludes")
         ri = Unit.GetUnit("rangeIncludes")
         ranges = sorted(GetTargets(ri, node, layers=layers), key=lambda u: u.id)
         domains = sorted(GetTargets(di, node, layers=layers), key=lambda u: u.id)
-        first_range = True
 
         newerprop = node.supersededBy(layers=layers) # None of one. e.g. we're on 'seller'(new) page, we get 'vendor'(old)
-        olderprop = node.supersedes(layers=layers) # None or one
         olderprops = node.supersedes_all(layers=layers) # list, e.g. 'seller' has 'vendor', 'merchant'.
 
-        inverseprop = node.inverseproperty(layers=layers)
         subprops = node.subproperties(layers=layers)
         superprops = node.superproperties(layers=layers)
 
-
-        if (inverseprop != None):
-            tt = "This means the same thing, but with the relationship direction reversed."
-            out.write("<p>Inverse-property: %s.</p>" % (self.ml(inverseprop, inverseprop.id,tt, prop=False, hashorslash=hashorslash)) )
-
-        out.write("<table class=\"definition-table\">\n")
-        out.write("<thead>\n  <tr>\n    <th>Values expected to be one of these types</th>\n  </tr>\n</thead>\n\n  <tr>\n    <td>\n      ")
+        info = { 'inverseprop': node.inverseproperty(layers=layers), 'ranges': [], 'domains': [], 'tables': [] }
+        tt = "This means the same thing, but with the relationship direction reversed."
 
         for r in ranges:
-            if (not first_range):
-                out.write("<br/>")
-            first_range = False
             tt = "The '%s' property has values that include instances of the '%s' type." % (node.id, r.id)
-            out.write(" <code>%s</code> " % (self.ml(r, r.id, tt, prop="rangeIncludes", hashorslash=hashorslash) +"\n"))
-        out.write("    </td>\n  </tr>\n</table>\n\n")
-        first_domain = True
-
-        out.write("<table class=\"definition-table\">\n")
-        out.write("  <thead>\n    <tr>\n      <th>Used on these types</th>\n    </tr>\n</thead>\n<tr>\n  <td>")
+            info['ranges'].append((r, tt))
         for d in domains:
-            if (not first_domain):
-                out.write("<br/>")
-            first_domain = False
             tt = "The '%s' property is used on the '%s' type." % (node.id, d.id)
-            out.write("\n    <code>%s</code> " % (self.ml(d, d.id, tt, prop="domainIncludes",hashorslash=hashorslash)+"\n" ))
-        out.write("      </td>\n    </tr>\n</table>\n\n")
+            info['domains'].append((d, tt))
 
+        # The Super-properties, Supersedes and supersededBy links have always
+        # passed "/" as ml()'s prop, and supersededBy reuses the last title.
         if (subprops != None and len(subprops) > 0):
-            out.write("<table class=\"definition-table\">\n")
-            out.write("  <thead>\n    <tr>\n      <th>Sub-properties</th>\n    </tr>\n</thead>\n")
+            links = []
             for sbp in subprops:
                 c = GetComment(sbp,layers=layers)
                 tt = "%s: ''%s''" % ( sbp.id, c)
-                out.write("\n    <tr><td><code>%s</code></td></tr>\n" % (self.ml(sbp, sbp.id, tt, hashorslash=hashorslash)))
-            out.write("\n</table>\n\n")
+                links.append((sbp, tt, ''))
+            info['tables'].append(("Sub-properties", links))
 
-        # Super-properties
         if (superprops != None and  len(superprops) > 0):
-            out.write("<table class=\"definition-table\">\n")
-            out.write("  <thead>\n    <tr>\n      <th>Super-properties</th>\n    </tr>\n</thead>\n")
+            links = []
             for spp in superprops:
                 c = GetComment(spp, layers=layers)           # markup needs to be stripped from c, e.g. see 'logo', 'photo'
                 c = re.sub(r'<[^>]*>', '', c) # This is not a sanitizer, we trust our input.
                 tt = "%s: ''%s''" % ( spp.id, c)
-                out.write("\n    <tr><td><code>%s</code></td></tr>\n" % (self.ml(spp, spp.id, tt,hashorslash)))
-            out.write("\n</table>\n\n")
+                links.append((spp, tt, '/'))
+            info['tables'].append(("Super-properties", links))
 
-        # Supersedes
         if (olderprops != None and len(olderprops) > 0):
-            out.write("<table class=\"definition-table\">\n")
-            out.write("  <thead>\n    <tr>\n      <th>Supersedes</th>\n    </tr>\n</thead>\n")
-
+            links = []
             for o in olderprops:
                 c = GetComment(o, layers=layers)
                 tt = "%s: ''%s''" % ( o.id, c)
-                out.write("\n    <tr><td><code>%s</code></td></tr>\n" % (self.ml(o, o.id, tt, hashorslash)))
-            out.write("\n</table>\n\n")
+                links.append((o, tt, '/'))
+            info['tables'].append(("Supersedes", links))
 
         # supersededBy (at most one direct successor)
         if (newerprop != None):
-            out.write("<table class=\"definition-table\">\n")
-            out.write("  <thead>\n    <tr>\n      <th><a href=\"/supersededBy\">supersededBy</a></th>\n    </tr>\n</thead>\n")
-            out.write("\n    <tr><td><code>%s</code></td></tr>\n" % (self.ml(newerprop, newerprop.id, tt,hashorslash)))
-            out.write("\n</table>\n\n")
+            info['tables'].append(('<a href="/supersededBy">supersededBy</a>', [(newerprop, tt, '/')]))
+        return info
 
     def rep(self, markup):
         """Replace < and > with HTML escape chars."""
@@ -693,7 +564,7 @@ class ShowUnit (webapp2.RequestHandler):
         # TODO: Ampersand? Check usage with examples.
         return m2
 
-    def handleHomepage(self, node):
+    def handleHomepage(self, node, layerlist='core'):
         """Send the homepage, or if no HTML accept header received and JSON-LD was requested, send JSON-LD context file.
 
         typical browser accept list: ('Accept', 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8')
@@ -705,9 +576,6 @@ class ShowUnit (webapp2.RequestHandler):
         accept_header = self.request.headers.get('Accept').split(',')
         logging.info("accepts: %s" % self.request.headers.get('Accept'))
 
-        if ENABLE_JSONLD_CONTEXT:
-            jsonldcontext = GetJsonLdContext()
-
         # Homepage is content-negotiated. HTML or JSON-LD.
         mimereq = {}
         for ah in accept_header:
@@ -722,7 +590,7 @@ class ShowUnit (webapp2.RequestHandler):
         if (ENABLE_JSONLD_CONTEXT and (jsonld_score < html_score and jsonld_score < xhtml_score)):
             self.response.headers['Content-Type'] = "application/ld+json"
             self.emitCacheHeaders()
-            self.response.out.write( jsonldcontext )
+            self.response.out.write( GetJsonLdContext(layers=layerlist) )
             return True
         else:
             # Serve a homepage from template
@@ -797,7 +665,6 @@ class ShowUnit (webapp2.RequestHandler):
     def emitExactTermPage(self, node, layers="core"):
         """Emit a Web page that exactly matches this node."""
         log.debug("EXACT PAGE: %s" % node.id)
-        self.outputStrings = [] # blank slate
         ext_mappings = GetExtMappingsRDFa(node, layers=layers)
 
         global sitemode, sitename
@@ -807,12 +674,6 @@ class ShowUnit (webapp2.RequestHandler):
 
         self.emitSchemaorgHeaders(node.id, node.isClass(), ext_mappings, sitemode, sitename)
 
-        if ( ENABLE_HOSTED_EXTENSIONS and ("core" not in layers or len(layers)>1) ):
-            ll = " ".join(layers).replace("core","")
-
-            s = "<p id='lli' class='layerinfo %s'><a href=\"https://github.com/schemaorg/schemaorg/wiki/ExtensionList\">extensions shown</a>: %s [<a href='http://%s/'>x</a>]</p>\n" % (ll, ll, mybasehost )
-            self.write(s)
-
         cached = self.GetCachedText(node, layers)
         if (cached != None):
             self.response.write(cached)
@@ -821,78 +682,51 @@ class ShowUnit (webapp2.RequestHandler):
         self.parentStack = []
         self.GetParentStack(node, layers=layers)
 
-        self.emitUnitHeaders(node,  layers=layers) # writes <h1><table>...
-
-        if (node.isClass(layers=layers)):
-            subclass = True
-            for p in self.parentStack:
-                self.ClassProperties(p, p==self.parentStack[0], layers=layers)
-            self.write("</table>\n")
-            self.emitClassIncomingProperties(node, layers=layers)
-        elif (Unit.isAttribute(node, layers=layers)):
-            self.emitAttributeProperties(node, layers=layers)
+        is_class = node.isClass(layers=layers)
+        is_property = Unit.isAttribute(node, layers=layers)
+        values = {
+            'node': node,
+            'show_layerinfo': ENABLE_HOSTED_EXTENSIONS and ("core" not in layers or len(layers)>1),
+            'layerinfo': " ".join(layers).replace("core",""),
+            'mybasehost': mybasehost,
+            'breadcrumb': self.breadcrumb(node, layers=layers),
+            'is_enumeration_value': node.isEnumerationValue(layers=layers),
+            'comment': GetComment(node, layers),
+            'usage': node.UsageStr(),
+            'moreinfo_items': self.moreInfoItems(node),
+            'is_class': is_class,
+            'is_datatype': node.isDataType(layers=layers),
+            'is_property': is_property,
+            'schema_version': SCHEMA_VERSION,
+            'acks': None,
+        }
 
-        if (not Unit.isAttribute(node, layers=layers)):
-            self.write("\n\n</table>\n\n") # no supertype table for properties
-
-        if (node.isClass(layers=layers)):
-            children = sorted(GetSources(Unit.GetUnit("rdfs:subClassOf"), node, layers=layers), key=lambda u: u.id)
-            if (len(children) > 0):
-                self.write("<br/><b>More specific Types</b>");
-                for c in children:
-                    self.write("<li> %s" % (self.ml(c)))
+        if is_class:
+            values['class_tables'] = self.classPropertyTables(layers=layers)
+            values['incoming_rows'] = GetCachedFragment("IncomingPropertyRows", node, layers, "/", self.incomingPropertyRows)
+            values['subtypes'] = sorted(GetSources(Unit.GetUnit("rdfs:subClassOf"), node, layers=layers), key=lambda u: u.id)
+        elif is_property:
+            values['attr'] = self.attributeInfo(node, layers=layers)
 
         if (node.isEnumeration(layers=layers)):
-            children = sorted(GetSources(Unit.GetUnit("typeOf"), node, layers=layers), key=lambda u: u.id)
-            if (len(children) > 0):
-                self.write("<br/><br/>Enumeration members");
-                for c in children:
-                    self.write("<li> %s" % (self.ml(c)))
+            values['members'] = sorted(GetSources(Unit.GetUnit("typeOf"), node, layers=layers), key=lambda u: u.id)
 
         ackorgs = GetTargets(Unit.GetUnit("dc:source"), node, layers=layers)
         if (len(ackorgs) > 0):
-            self.write("<h4  id=\"acks\">Acknowledgements</h4>\n")
+            values['acks'] = []
             for ao in ackorgs:
-                acks = sorted(GetTargets(Unit.GetUnit("rdfs:comment"), ao, layers))
-                for ack in acks:
-                    self.write(str(ack+"<br/>"))
-
-        examples = GetExamples(node, layers=layers)
-        if (len(examples) > 0):
-            example_labels = [
-              ('Without Markup', 'original_html', 'selected'),
-              ('Microdata', 'microdata', ''),
-              ('RDFa', 'rdfa', ''),
-              ('JSON-LD', 'jsonld', ''),
-            ]
-            self.write("<br/><br/><b><a id=\"examples\">Examples</a></b><br/><br/>\n\n")
-            for ex in examples:
-                if "id" in ex.egmeta:
-                    self.write('<span id="%s"></span>' % ex.egmeta["id"])
-                self.write("<div class='ds-selector-tabs ds-selector'>\n")
-                self.write("  <div class='selectors'>\n")
-                for label, example_type, selected in example_labels:
-                    self.write("    <a value='%s' data-selects='%s' class='%s'>%s</a>\n"
-                               % (example_type, example_type, selected, label))
-                self.write("</div>\n\n")
-                for label, example_type, selected in example_labels:
-                    self.write("<pre class=\"prettyprint lang-html linenums %s %s\">%s</pre>\n\n"
-                               % (example_type, selected, self.rep(ex.get(example_type))))
-                self.write("</div>\n\n")
-
-        self.write("<p class=\"version\"><b>Schema Version %s</b></p>\n\n" % SCHEMA_VERSION)
-        # TODO: add some version info regarding the extension
+                values['acks'].extend(sorted(GetTargets(Unit.GetUnit("rdfs:comment"), ao, layers)))
 
-        # Analytics
-	self.write("""<script>(function(i,s,o,g,r,a,m){i['GoogleAnalyticsObject']=r;i[r]=i[r]||function(){
-	  (i[r].q=i[r].q||[]).push(arguments)},i[r].l=1*new Date();a=s.createElement(o),
-	  m=s.getElementsByTagName(o)[0];a.async=1;a.src=g;m.parentNode.insertBefore(a,m)
-	  })(window,document,'script','//www.google-analytics.com/analytics.js','ga');
-	  ga('create', 'UA-52672119-1', 'auto');ga('send', 'pageview');</script>""")
+        values['examples'] = []
+        for ex in GetExamples(node, layers=layers):
+            example = { 'id': ex.egmeta.get("id") }
+            for example_type in ['original_html', 'microdata', 'rdfa', 'jsonld']:
+                example[example_type] = self.rep(ex.get(example_type))
+            values['examples'].append(example)
 
-        self.write(" \n\n</div>\n</body>\n</html>")
-
-        self.response.write(self.AddCachedText(node, self.outputStrings, layers))
+        # TODO: add some version info regarding the extension
+        template = JINJA_ENVIRONMENT.get_template('termPage.tpl')
+        self.response.write(self.AddCachedText(node, [template.render(values)], layers))
 
     def emitHTTPHeaders(self, node):
         if ENABLE_CORS:
@@ -900,8 +734,27 @@ class ShowUnit (webapp2.RequestHandler):
             # see http://en.wikipedia.org/wiki/Cross-origin_resource_sharing
 
     def handleHTTPRedirection(self, node):
-        return False # none yet.
+        """301 to the term a path stands for: another spelling of its id (/person), or a superseded term (/actors).
+
+        The same goes for the term's data (/person.ttl to /Person.ttl); see
+        api.RedirectTable. Any query string is kept.
+        """
         # https://github.com/schemaorg/schemaorg/issues/4
+        extension = ""
+        if "." in node:
+            base, format = node.rsplit(".", 1)
+            if format in serializers.FORMATS:
+                node, extension = base, "." + format
+        with DependencyRecording(propagate=False): # the page served, if any, doesn't depend on the table
+            target = GetRedirectTable().target(node)
+        if target is None:
+            return False
+        location = "/" + target + extension
+        if self.request.query_string:
+            location += "?" + self.request.query_string
+        self.redirect(location, permanent=True)
+        self.emitCacheHeaders()
+        return True
 
     def setupExtensionLayerlist(self, node):
         # Identify which extension layer(s) are requested
@@ -931,7 +784,19 @@ class ShowUnit (webapp2.RequestHandler):
         log.debug("layerlist: %s" % layerlist)
         return layerlist
 
-    def handleJSONContext(self, node):
+    def handleCacheStats(self, node):
+        """Per-namespace cache counters as JSON. app.yaml restricts /admin/ to app admins."""
+        top = self.request.get("top")
+        if top.isdigit():
+            stats = CacheStats(int(top))
+        else:
+            stats = CacheStats()
+        self.response.headers['Content-Type'] = "application/json"
+        self.response.headers['Cache-Control'] = "no-cache"
+        self.response.out.write( json.dumps(stats, indent=2, sort_keys=True) )
+        return True
+
+    def handleJSONContext(self, node, layerlist='core'):
         """Handle JSON-LD Context non-homepage requests (including refuse if not enabled)."""
 
         if not ENABLE_JSONLD_CONTEXT:
@@ -939,13 +804,13 @@ class ShowUnit (webapp2.RequestHandler):
             self.response.out.write('<title>404 Not Found.</title><a href="/">404 Not Found (JSON-LD Context not enabled.)</a><br/><br/>')
             return True
         if (node=="docs/jsonldcontext.json.txt"):
-            jsonldcontext = GetJsonLdContext()
+            jsonldcontext = GetJsonLdContext(layers=layerlist)
             self.response.headers['Content-Type'] = "text/plain"
             self.emitCacheHeaders()
             self.response.out.write( jsonldcontext )
             return True
         if (node=="docs/jsonldcontext.json"):
-            jsonldcontext = GetJsonLdContext()
+            jsonldcontext = GetJsonLdContext(layers=layerlist)
             self.response.headers['Content-Type'] = "application/ld+json"
             self.emitCacheHeaders()
             self.response.out.write( jsonldcontext )
@@ -953,6 +818,17 @@ class ShowUnit (webapp2.RequestHandler):
         return False
         # see also handleHomepage for conneg'd version.
 
+    def streamCachedPage(self, cachekey, pieces):
+        """Send generated text to the client as it is produced, storing all of it in DataCache under cachekey at the end.
+
+        This saves rendering the page ahead of the first byte, not memory: the
+        text is gathered for the cache as it goes (see CaptureStream), and
+        App Engine buffers an app_iter whole before sending it.
+        """
+        self.response.charset = "utf-8"
+        chunks = CaptureStream(DataCache, cachekey, ReadingStream(Rechunk(pieces)))
+        self.response.app_iter = (chunk.encode("utf-8") for chunk in chunks)
+
     def handleFullHierarchyPage(self, node,  layerlist='core'):
         self.response.headers['Content-Type'] = "text/html"
         self.emitCacheHeaders()
@@ -966,48 +842,57 @@ class ShowUnit (webapp2.RequestHandler):
             uThing = Unit.GetUnit("Thing")
             uDataType = Unit.GetUnit("DataType")
 
-            mainroot = TypeHierarchyTree()
-            mainroot.traverseForHTML(uThing, layers=layerlist)
-            thing_tree = mainroot.toHTML()
-
-            dtroot = TypeHierarchyTree()
-            dtroot.traverseForHTML(uDataType, layers=layerlist)
-            datatype_tree = dtroot.toHTML()
-            page = template.render({ 'thing_tree': thing_tree, 'datatype_tree': datatype_tree })
+            thing_tree = TypeHierarchyTree().generateHTML(uThing, layers=layerlist)
+            datatype_tree = TypeHierarchyTree().generateHTML(uDataType, layers=layerlist)
+            page = template.generate({ 'thing_tree': thing_tree, 'datatype_tree': datatype_tree })
 
-            self.response.out.write( page )
+            self.streamCachedPage("FullTreePage", page)
             log.debug("Serving fresh FullTreePage.")
-            DataCache["FullTreePage"] = page
 
             return True
 
-    def handleJSONSchemaTree(self, node, layerlist='core'):
-        """Handle a request for a JSON-LD tree representation of the schemas (RDFS-based)."""
+    def preferredTermFormat(self):
+        """The serializers format (e.g. "ttl") whose media type the Accept header prefers to HTML, or None."""
+        if not self.request.headers.get('Accept'):
+            return None
+        offers = ["text/html"] + serializers.FORMATS.values()
+        best = self.request.accept.best_match(offers)
+        for format, mimetype in serializers.FORMATS.items():
+            if mimetype == best:
+                return format
+        return None
+
+    def handleTermData(self, node, layers='core'):
+        """Handle requests for a term as JSON-LD, N-Triples or Turtle, by extension (/Person.jsonld) or Accept header."""
+        format = None
+        if "." in node:
+            base, extension = node.rsplit(".", 1)
+            if extension in serializers.FORMATS:
+                node, format = base, extension
+        schema_node = Unit.GetUnit(node)
+        if not inLayer(layers, schema_node):
+            return False
+        if format == None:
+            format = self.preferredTermFormat()
+            if format == None:
+                return False
 
-        self.response.headers['Content-Type'] = "application/ld+json"
+        cachekey = "%s:%s.%s" % (layers, schema_node.id, format)
+        text = PageCache.get(cachekey)
+        if text == None:
+            text = serializers.Serialize(format, schema_node, layers)
+            PageCache[cachekey] = text
+        self.response.headers['Content-Type'] = "%s; charset=utf-8" % serializers.FORMATS[format]
         self.emitCacheHeaders()
-
-        if DataCache.get('JSONLDThingTree'):
-            self.response.out.write( DataCache.get('JSONLDThingTree') )
-            log.debug("Serving recycled JSONLDThingTree.")
-            return True
-        else:
-            uThing = Unit.GetUnit("Thing")
-            mainroot = TypeHierarchyTree()
-            mainroot.traverseForJSONLD(Unit.GetUnit("Thing"), layers=layerlist)
-            thing_tree = mainroot.toJSON()
-            self.response.out.write( thing_tree )
-            log.debug("Serving fresh JSONLDThingTree.")
-            DataCache["JSONLDThingTree"] = thing_tree
-            return True
-        return False
-
+        self.response.out.write(text)
+        return True
 
     def handleExactTermPage(self, node, layers='core'):
         """Handle with requests for specific terms like /Person, /fooBar. """
 
         #self.outputStrings = [] # blank slate
         schema_node = Unit.GetUnit(node) # e.g. "Person", "CreativeWork".
+        self.response.headers['Vary'] = "Accept" # the same URL serves data for other Accept headers; see handleTermData
 
         if inLayer(layers, schema_node):
             self.emitExactTermPage(schema_node, layers=layers)
@@ -1040,6 +925,14 @@ class ShowUnit (webapp2.RequestHandler):
         base_term = Unit.GetUnit( node.rsplit('/')[0] )
         if base_term != None :
             self.response.out.write('<div>Perhaps you meant: <a href="/%s">%s</a></div> <br/><br/> ' % ( base_term.id, base_term.id ))
+        else:
+            word = clean_node.split('/')[0]
+            suggestions = GetSpellingIndex(layers).suggest(word, SPELLING_SUGGESTIONS)
+            if not suggestions and ENABLE_HOSTED_EXTENSIONS: # extension terms have a page saying where they are
+                suggestions = GetSpellingIndex(None).suggest(word, SPELLING_SUGGESTIONS)
+            if suggestions:
+                links = ", ".join('<a href="/%s">%s</a>' % (id, id) for id in suggestions)
+                self.response.out.write('<div>Did you mean: %s?</div> <br/><br/> ' % links)
 
         base_actionprop = Unit.GetUnit( node.rsplit('-')[0] )
         if base_actionprop != None :
@@ -1047,24 +940,58 @@ class ShowUnit (webapp2.RequestHandler):
 
         return True
 
+    def emitWithETag(self, cachekey, build):
+        """Send the text cached under cachekey (made by build() on a miss) with its ETag, or a 304 if the client already has it."""
+        body = DataCache.get(cachekey)
+        if body == None:
+            body = build()
+            DataCache[cachekey] = body
+        etag = DataCache.get(cachekey + ":etag")
+        if etag == None:
+            etag = hashlib.md5(body.encode('utf-8')).hexdigest()
+            DataCache[cachekey + ":etag"] = etag
+        self.response.headers['ETag'] = '"%s"' % etag
+        if etag in self.request.if_none_match:
+            self.response.status = 304
+            return
+        self.response.out.write(body)
+
     def handleJSONSchemaTree(self, node, layerlist='core'):
-        """Handle a request for a JSON-LD tree representation of the schemas (RDFS-based)."""
+        """Handle a request for a JSON-LD tree representation of the schemas (RDFS-based).
+
+        ?root=CreativeWork&depth=2 asks for just that part of the tree; see GetSubtypeTree.
+        """
 
         self.response.headers['Content-Type'] = "application/ld+json"
         self.emitCacheHeaders()
 
+        rootid = self.request.get("root", "")
+        depth = self.request.get("depth", "")
+        if rootid or depth:
+            root = Unit.GetUnit(rootid or "Thing")
+            if root == None or not root.isClass(layers=layerlist):
+                self.response.status = 404
+                self.response.out.write('{ "error": "root should be a type" }')
+                return True
+            if depth and not depth.isdigit():
+                self.response.status = 400
+                self.response.out.write('{ "error": "depth should be a whole number" }')
+                return True
+            depth = int(depth) if depth else None
+            if isinstance(layerlist, basestring):
+                layerlist = [layerlist]
+            cachekey = "JSONLDTree:%s:%s:%s" % (",".join(sorted(layerlist)), root.id, depth)
+            self.emitWithETag(cachekey, lambda: unicode(json.dumps(GetSubtypeTree(root, depth, layers=layerlist), separators=(',', ':'))))
+            return True
+
         if DataCache.get('JSONLDThingTree'):
             self.response.out.write( DataCache.get('JSONLDThingTree') )
             log.debug("Serving recycled JSONLDThingTree.")
             return True
         else:
-            uThing = Unit.GetUnit("Thing")
-            mainroot = TypeHierarchyTree()
-            mainroot.traverseForJSONLD(Unit.GetUnit("Thing"), layers=layerlist)
-            thing_tree = mainroot.toJSON()
-            self.response.out.write( thing_tree )
+            thing_tree = TypeHierarchyTree().generateJSONLD(Unit.GetUnit("Thing"), layers=layerlist)
+            self.streamCachedPage("JSONLDThingTree", thing_tree)
             log.debug("Serving fresh JSONLDThingTree.")
-            DataCache["JSONLDThingTree"] = thing_tree
             return True
         return False
 
@@ -1075,7 +1002,7 @@ class ShowUnit (webapp2.RequestHandler):
     def handleFullReleasePage(self, node,  layerlist='core'):
 
         """Deal with a request for a full release summary page. Lists all terms and their descriptions inline in one long page.
-        version/latest/ is from current schemas, others will need to be loaded and emitted from stored HTML snapshots (for now)."""
+        version/latest/ is from current schemas, released versions from their snapshots (see handleReleaseView)."""
 
         # http://jinja.pocoo.org/docs/dev/templates/
 
@@ -1107,32 +1034,28 @@ class ShowUnit (webapp2.RequestHandler):
                 DataCache["tocVersionPage"] = page
                 return True
 
+        # /version/2.0..latest/changes
+        if ".." in requested_version and requested_format == "changes":
+            return self.handleReleaseChanges(requested_version)
+
         if requested_version in releaselog:
             log.info("Version '%s' was released on %s. Serving from filesystem." % ( node, releaselog[requested_version] ))
 
             version_rdfa = "data/releases/%s/schema.rdfa" % requested_version
-            version_allhtml = "data/releases/%s/schema-all.html" % requested_version
             version_nt = "data/releases/%s/schema.nt" % requested_version
 
-            if requested_format=="":
-                #self.response.out.write( open(version_allhtml, 'r').read() )
-                #return True
-                log.info("Skipping filesystem for now.")
-
             if requested_format=="schema.rdfa":
-                self.response.headers['Content-Type'] = "application/octet-stream" # It is HTML but ... not really.
-                self.response.headers['Content-Disposition']= "attachment; filename=schemaorg_%s.rdfa.html" % requested_version
-                self.response.out.write( open(version_rdfa, 'r').read() )
-                return True
+                # It is HTML but ... not really.
+                return ServeFile(self.request, self.response, version_rdfa, "application/octet-stream",
+                                 filename="schemaorg_%s.rdfa.html" % requested_version)
 
             if requested_format=="schema.nt":
-                self.response.headers['Content-Type'] = "application/n-triples" # It is HTML but ... not really.
-                self.response.headers['Content-Disposition']= "attachment; filename=schemaorg_%s.rdfa.nt" % requested_version
-                self.response.out.write( open(version_nt, 'r').read() )
-                return True
+                return ServeFile(self.request, self.response, version_nt, "application/n-triples",
+                                 filename="schemaorg_%s.rdfa.nt" % requested_version)
 
-            if requested_format != "":
-                return False # Turtle, csv etc.
+            # The summary page, term pages, trees and contexts, from the release's own graph:
+            # version/2.0/, version/2.0/Person, version/2.0/docs/full.html
+            return self.handleReleaseView(requested_version, clean_node.split("/", 2)[2] if requested_format else "")
 
         else:
             log.info("Unreleased version requested. We only understand requests for latest if unreleased.")
@@ -1144,74 +1067,254 @@ class ShowUnit (webapp2.RequestHandler):
                 log.info("generating a live view of this latest release.")
 
 
-        if DataCache.get('FullReleasePage'):
-            self.response.out.write( DataCache.get('FullReleasePage') )
-            log.debug("Serving recycled FullReleasePage.")
+        if requested_format == "schema-all.json":
+            return self.emitFullReleaseJSON()
+
+        if requested_format.startswith("schema.") and requested_format[len("schema."):] in serializers.GRAPH_FORMATS:
+            return self.emitFullReleaseGraph(requested_format[len("schema."):], requested_version, layerlist)
+
+        return self.emitFullReleasePage(requested_version, layerlist)
+
+    def emitFullReleasePage(self, version, layerlist='core'):
+        """The summary page of a version: every term, with its description, in one long page; cached per version."""
+        cachekey = "FullReleasePage:%s" % version
+        if DataCache.get(cachekey):
+            self.response.out.write( DataCache.get(cachekey) )
+            log.debug("Serving recycled %s." % cachekey)
             return True
         else:
             template = JINJA_ENVIRONMENT.get_template('fullReleasePage.tpl')
-            mainroot = TypeHierarchyTree()
-            mainroot.traverseForHTML(Unit.GetUnit("Thing"), hashorslash="#term_", layers=layerlist)
-            thing_tree = mainroot.toHTML()
-            base_href = "/version/%s/" % requested_version
+            thing_tree = TypeHierarchyTree().generateHTML(Unit.GetUnit("Thing"), hashorslash="#term_", layers=layerlist)
+            base_href = "/version/%s/" % version
 
             az_types = GetAllTypes()
             az_types.sort( key=lambda u: u.id)
-            az_type_meta = {}
 
             az_props = GetAllProperties()
             az_props.sort( key = lambda u: u.id)
-            az_prop_meta = {}
 
-
-#TODO: ClassProperties (self, cl, subclass=False, layers="core", out=None, hashorslash="/"):
+            # All lists and comments come from one sweep over the core triples; see SchemaIndex.
+            index = GetSchemaIndex()
+            macros = TermMacros()
 
             # TYPES
-            for t in az_types:
-                props4type = HTMLOutput() # properties applicable for a type
-                props2type = HTMLOutput() # properties that go into a type
-
-                self.emitSimplePropertiesPerType(t, out=props4type, hashorslash="#term_" )
-                self.emitSimplePropertiesIntoType(t, out=props2type, hashorslash="#term_" )
-
-                #self.ClassProperties(t, out=typeInfo, hashorslash="#term_" )
-                tcmt = Markup(GetComment(t))
-                az_type_meta[t]={}
-                az_type_meta[t]['comment'] = tcmt
-                az_type_meta[t]['props4type'] = props4type.toHTML()
-                az_type_meta[t]['props2type'] = props2type.toHTML()
+            def typeInfo(t):
+                return { 'comment': Markup(index.comment(t)),
+                         'props4type': TermListHTML("props4type", index.propertiesOf(t), "#term_"),
+                         'props2type': TermListHTML("props2type", index.propertiesInto(t), "#term_") }
 
             # PROPERTIES
-            for pt in az_props:
-                attrInfo = HTMLOutput()
-                rangeList = HTMLOutput()
-                domainList = HTMLOutput()
-                # self.emitAttributeProperties(pt, out=attrInfo, hashorslash="#term_" )
-                # self.emitSimpleAttributeProperties(pt, out=rangedomainInfo, hashorslash="#term_" )
-
-                self.emitRangeTypesForProperty(pt, out=rangeList, hashorslash="#term_" )
-                self.emitDomainTypesForProperty(pt, out=domainList, hashorslash="#term_" )
-
-                cmt = Markup(GetComment(pt))
-                az_prop_meta[pt] = {}
-                az_prop_meta[pt]['comment'] = cmt
-                az_prop_meta[pt]['attrinfo'] = attrInfo.toHTML()
-                az_prop_meta[pt]['rangelist'] = rangeList.toHTML()
-                az_prop_meta[pt]['domainlist'] = domainList.toHTML()
-
-            page = template.render({ "base_href": base_href, 'thing_tree': thing_tree,
+            def propInfo(pt):
+                return { 'comment': Markup(index.comment(pt)),
+                         'rangelist': TermListHTML("attrrangesummary", index.rangesOf(pt), "#term_"),
+                         'domainlist': TermListHTML("attrdomainsummary", index.domainsOf(pt), "#term_") }
+
+            # Details are built as the template reaches each term, and the page is sent as it is generated.
+            page = template.generate({ "base_href": base_href, 'thing_tree': thing_tree,
                     'liveversion': SCHEMA_VERSION,
-                    'requested_version': requested_version,
-                    'releasedate': releaselog[str(SCHEMA_VERSION)],
+                    'requested_version': version,
+                    'releasedate': releaselog[str(SCHEMA_VERSION) if version == "latest" else version],
                     'az_props': az_props, 'az_types': az_types,
-                    'az_prop_meta': az_prop_meta, 'az_type_meta': az_type_meta })
+                    'az_prop_meta': LazyTermInfo(propInfo), 'az_type_meta': LazyTermInfo(typeInfo) })
 
-            self.response.out.write( page )
-            log.debug("Serving fresh FullReleasePage.")
-            DataCache["FullReleasePage"] = page
+            self.streamCachedPage(cachekey, page)
+            log.debug("Serving fresh %s." % cachekey)
             return True
 
 
+    def handleAutocomplete(self, node, layerlist='core'):
+        """Terms matching the start of ?q= (or its CamelCase humps, e.g. LoBu), most used first, as JSON; see api.TermLookup."""
+        query = self.request.get("q").strip()
+        limit = self.requestLimit(AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT)
+        terms = [{ "id": id, "types": types } for (id, types) in GetTermLookup(layerlist).lookup(query, limit)]
+        self.response.headers['Content-Type'] = "application/json"
+        self.emitCacheHeaders()
+        self.response.out.write( json.dumps({ "query": query, "terms": terms }, separators=(',', ':')) )
+        return True
+
+    def handleSearch(self, node, layerlist='core'):
+        """Terms whose id or comment best match the words of ?q=, as JSON; see api.SearchTerms."""
+        query = self.request.get("q").strip()
+        limit = self.requestLimit(SEARCH_LIMIT, SEARCH_MAX_LIMIT)
+        results = []
+        for (score, id) in SearchTerms(query, layerlist, limit):
+            comment = GetComment(Unit.GetUnit(id), layerlist)
+            results.append({ "id": id, "score": round(score, 3), "comment": " ".join(PlainText(comment).split()) })
+        self.response.headers['Content-Type'] = "application/json"
+        self.emitCacheHeaders()
+        self.response.out.write( json.dumps({ "query": query, "results": results }, separators=(',', ':')) )
+        return True
+
+    def handlePropertyPaths(self, node, layerlist='core'):
+        """The shortest chains of properties from ?from= to ?to= (types), as JSON; see api.PropertyGraph.
+
+        ?hops= sets the longest path looked for.
+        """
+        start = self.request.get("from")
+        goal = self.request.get("to")
+        graph = GetPropertyGraph(layerlist)
+        if start not in graph or goal not in graph:
+            return False
+        hops = self.requestLimit(PATH_MAX_HOPS, PATH_LONGEST, "hops")
+        paths = graph.paths(start, goal, hops, self.requestLimit(PATH_LIMIT, PATH_MAX_LIMIT))
+        paths = [[{ "property": p, "type": t } for (p, t) in path] for path in paths]
+        self.response.headers['Content-Type'] = "application/json"
+        self.emitCacheHeaders()
+        self.response.out.write( json.dumps({ "from": start, "to": goal, "paths": paths }, separators=(',', ':')) )
+        return True
+
+    def handleInherited(self, node, layerlist='core'):
+        """What applies to ?term= once inheritance is counted, as JSON: a type's properties, or a property's types.
+
+        Superseded terms are left out unless ?superseded=1; see api.ClosureIndex.
+        """
+        term = Unit.GetUnit(self.request.get("term"))
+        if term is None or not inLayer(layerlist, term):
+            return False
+        superseded = self.request.get("superseded") in ["1", "true"]
+        ids = lambda terms: [t.id for t in terms]
+        if term.isAttribute(layers=layerlist):
+            result = { "id": term.id,
+                "domain": ids(GetInheritedDomain(term, layerlist, superseded)),
+                "range": ids(GetInheritedRange(term, layerlist, superseded)) }
+        elif term.isClass(layers=layerlist) or term.isDataType(layers=layerlist):
+            result = { "id": term.id,
+                "properties": ids(GetApplicableProperties(term, layerlist, superseded)),
+                "incoming": ids(GetIncomingProperties(term, layerlist, superseded)) }
+        else:
+            return False
+        self.response.headers['Content-Type'] = "application/json"
+        self.emitCacheHeaders()
+        self.response.out.write( json.dumps(result, separators=(',', ':')) )
+        return True
+
+    def requestLimit(self, default, maximum, name="limit"):
+        """The ?limit= (or other named) number in the request, no more than maximum; default if it is missing or not a number."""
+        limit = self.request.get(name)
+        if limit.isdigit():
+            return min(int(limit), maximum)
+        return default
+
+    def handleSitemap(self, node, layerlist='core'):
+        """sitemap.xml, sitemap-<n>.xml and the plain term index sitemap.txt, for the terms in layerlist.
+
+        Each is built whole, as they are small, so that even the first response has an ETag; then it is served from DataCache.
+        """
+        if isinstance(layerlist, basestring):
+            layerlist = [layerlist]
+        base = self.request.host_url + "/"
+        cachekey = "Sitemap:%s:%s:%s" % (base, ",".join(sorted(layerlist)), node)
+        body = DataCache.get(cachekey)
+        if body == None:
+            terms = SitemapTerms(layerlist)
+            pages = max(1, (len(terms) + SITEMAP_PAGE_SIZE - 1) / SITEMAP_PAGE_SIZE)
+            if node == "sitemap.txt":
+                pieces = (u"%s%s\n" % (base, u.id) for u in terms)
+            elif node == "sitemap.xml" and pages > 1:
+                pieces = SitemapIndexXML(base, pages)
+            else:
+                page = 1 if node == "sitemap.xml" else int(sitemap_page_re.match(node).group(1))
+                if page > pages:
+                    return False
+                first = (page - 1) * SITEMAP_PAGE_SIZE
+                pieces = SitemapXML(base, terms[first:first + SITEMAP_PAGE_SIZE], SitemapLastModified(layerlist), GraphLoadedDate())
+            body = u"".join(pieces)
+        self.response.headers['Content-Type'] = "text/plain" if node.endswith(".txt") else "application/xml"
+        self.emitCacheHeaders()
+        self.emitWithETag(cachekey, lambda: body)
+        return True
+
+    def handleReleaseChanges(self, versions):
+        """What changed between two versions ("2.0..latest") as JSON; see releases.ReleaseChanges."""
+        old, new = versions.split("..", 1)
+        if old != "latest" and old not in releaselog or new != "latest" and new not in releaselog:
+            return False
+        text = ReleaseChangesJSON(old, new)
+        if text == None:
+            return False
+        self.response.headers['Content-Type'] = "application/json"
+        self.response.out.write( text )
+        return True
+
+    def handleReleaseView(self, version, path):
+        """Serve path (a term, one of the docs pages below, or "" for the summary page) as it was in a released version, from its ReleaseGraph.
+
+        Output is cached per version (see api.UsingGraph); links to terms in
+        HTML pages are rewritten to stay within the release.
+        """
+        release = GetRelease(version)
+        if release is None:
+            return False
+        layers = ["core"]
+        html = False
+        with UsingGraph(release):
+            if path in ["docs/jsonldcontext.json.txt", "docs/jsonldcontext.json"]:
+                handled = self.handleJSONContext(path, layerlist=layers)
+            elif path == "":
+                handled = html = self.emitFullReleasePage(version, layerlist=layers)
+            elif path == "docs/full.html":
+                handled = html = self.handleFullHierarchyPage(path, layerlist=layers)
+            elif path in ["docs/tree.jsonld", "docs/tree.json"]:
+                handled = self.handleJSONSchemaTree(path, layerlist=layers)
+            elif self.handleTermData(path, layers=layers):
+                handled = True
+            elif self.handleExactTermPage(path, layers=layers):
+                handled = html = True
+            else:
+                handled = False
+        streamed = isinstance(self.response.app_iter, types.GeneratorType)
+        if streamed:
+            self.response.app_iter = GraphStream(release, self.response.app_iter) # streamed pages are generated later
+        if html:
+            prefix = "/version/%s/" % version
+            def relink(match):
+                if match.group(2) in release:
+                    return 'href=%s%s%s%s' % (match.group(1), prefix, match.group(2), match.group(1))
+                return match.group(0)
+            if streamed:
+                self.response.app_iter = RelinkStream(self.response.app_iter, lambda text: term_href_re.sub(relink, text))
+            else:
+                self.response.body = term_href_re.sub(relink, self.response.body)
+        return handled
+
+    def emitFullReleaseGraph(self, format, version, layers='core'):
+        """The whole graph for these layers in one of serializers.GRAPH_FORMATS, sent with streamCachedPage and cached per layer set."""
+        if isinstance(layers, basestring):
+            layers = [layers]
+        self.response.headers['Content-Type'] = serializers.GRAPH_FORMATS[format]
+        self.response.headers['Content-Disposition'] = "attachment; filename=schemaorg_%s.%s" % (version, format)
+        cachekey = "FullReleaseGraph:%s:%s" % (",".join(sorted(layers)), format)
+        text = DataCache.get(cachekey)
+        if text != None:
+            self.response.charset = "utf-8"
+            self.response.out.write( text )
+            log.debug("Serving recycled %s." % cachekey)
+        else:
+            self.streamCachedPage(cachekey, serializers.SerializeGraph(format, layers))
+            log.debug("Serving fresh %s." % cachekey)
+        return True
+
+    def emitFullReleaseJSON(self):
+        """The full release summary as JSON: each type and property with its comment and related terms, from SchemaIndex."""
+        self.response.headers['Content-Type'] = "application/json"
+        summary = DataCache.get('FullReleaseJSON')
+        if summary == None:
+            index = GetSchemaIndex()
+            ids = lambda terms: [t.id for t in terms]
+            types = [{ 'id': t.id, 'comment': index.comment(t),
+                       'properties': ids(index.propertiesOf(t)),
+                       'incomingProperties': ids(index.propertiesInto(t)) }
+                     for t in sorted(GetAllTypes(), key=lambda u: u.id)]
+            props = [{ 'id': p.id, 'comment': index.comment(p),
+                       'domainIncludes': ids(index.domainsOf(p)),
+                       'rangeIncludes': ids(index.rangesOf(p)) }
+                     for p in sorted(GetAllProperties(), key=lambda u: u.id)]
+            summary = json.dumps({ 'version': str(SCHEMA_VERSION), 'releaseDate': releaselog[str(SCHEMA_VERSION)],
+                                   'types': types, 'properties': props }, indent=2, sort_keys=True)
+            DataCache['FullReleaseJSON'] = summary
+        self.response.out.write(summary)
+        return True
+
     def setupHostinfo(self, node):
         global debugging, host_ext, myhost, mybasehost
 
@@ -1273,14 +1376,18 @@ class ShowUnit (webapp2.RequestHandler):
 
         log.debug("EXT: set sitename to %s " % sitename)
         if (node in ["", "/"]):
-            if self.handleHomepage(node):
+            if self.handleHomepage(node, layerlist=layerlist):
                 return
             else:
                 log.info("Error handling homepage: %s" % node)
                 return
 
+        if node == "admin/cachestats.json":
+            if self.handleCacheStats(node):
+                return
+
         if node in ["docs/jsonldcontext.json.txt", "docs/jsonldcontext.json"]:
-            if self.handleJSONContext(node):
+            if self.handleJSONContext(node, layerlist=layerlist):
                 return
             else:
                 log.info("Error handling JSON-LD context: %s" % node)
@@ -1311,6 +1418,30 @@ class ShowUnit (webapp2.RequestHandler):
                     log.info("Error handling 404 under /version/")
                     return
 
+        if node == "docs/autocomplete.json":
+            if self.handleAutocomplete(node, layerlist=layerlist):
+                return
+
+        if node == "docs/search.json":
+            if self.handleSearch(node, layerlist=layerlist):
+                return
+
+        if node == "docs/paths.json":
+            if self.handlePropertyPaths(node, layerlist=layerlist):
+                return
+
+        if node == "docs/inherited.json":
+            if self.handleInherited(node, layerlist=layerlist):
+                return
+
+        if node in ["sitemap.xml", "sitemap.txt"] or sitemap_page_re.match(node):
+            if self.handleSitemap(node, layerlist=layerlist):
+                return
+
+        # Machine-readable descriptions of a term, e.g. /Person.ttl, or /Person with Accept: text/turtle
+        if self.handleTermData(node, layers=layerlist):
+            return
+
         # Pages based on request path matching a Unit in the term graph:
         if self.handleExactTermPage(node, layers=layerlist):
             return
@@ -1318,15 +1449,89 @@ class ShowUnit (webapp2.RequestHandler):
             log.info("Error handling exact term page. Assuming a 404: %s" % node)
 
             # Drop through to 404 as default exit.
-            if self.handle404Failure(node):
+            if self.handle404Failure(node, layers=layerlist):
                 return
             else:
                 log.info("Error handling 404.")
                 return
 
 
+class CacheWarmer:
+    """Renders and caches pages ahead of their first visitor.
+
+    Site-wide artifacts (full hierarchy, JSON-LD tree and context) are warmed
+    first, then term pages in descending Unit.usage order. Pages are fetched
+    through ShowUnit.get() so they land under the same cache keys as live
+    requests. Work stops once the time or memory budget is spent, and pauses
+    while live requests are in flight.
+    """
+
+    def __init__(self, host=None, time_budget=None, memory_budget=None, layers=["core"]):
+        self.host = host or WARMUP_HOST
+        self.time_budget = time_budget or WARMUP_TIME_BUDGET
+        self.memory_budget = memory_budget or WARMUP_MEMORY_BUDGET
+        self.layers = layers
+        self.bytes_cached = 0
+        self.warmed = []
+
+    def warmupPaths(self):
+        """Paths to warm, in order: site-wide pages, then terms by descending usage."""
+        paths = [ "docs/full.html", "docs/tree.jsonld", "docs/jsonldcontext.json" ]
+        terms = []
+        for id in all_terms.keys():
+            node = Unit.GetUnit(id)
+            if inLayer(self.layers, node):
+                terms.append(node)
+        terms.sort(key=lambda u: (-usageRank(u), u.id))
+        return paths + [ t.id for t in terms ]
+
+    def warmPath(self, path):
+        """Render one path as a live request would, returning the size of the output."""
+        request = webapp2.Request.blank("/" + path, base_url="http://%s" % self.host)
+        handler = ShowUnit(request, webapp2.Response())
+        with graph_lock.reading(), DependencyRecording():
+            handler.get(path)
+        return len(handler.response.body)
+
+    def run(self):
+        started = time.time()
+        deadline = started + self.time_budget
+        for path in self.warmupPaths():
+            while LiveRequests.busy() and time.time() < deadline:
+                time.sleep(WARMUP_YIELD_DELAY)
+            if time.time() >= deadline:
+                log.info("Cache warm-up: time budget spent.")
+                break
+            if self.bytes_cached >= self.memory_budget:
+                log.info("Cache warm-up: memory budget spent.")
+                break
+            try:
+                self.bytes_cached += self.warmPath(path)
+                self.warmed.append(path)
+            except Exception as e:
+                log.warning("Cache warm-up failed for %s: %s" % (path, e))
+        log.info("Cache warm-up warmed %s pages (%s bytes) in %.1fs." % (len(self.warmed), self.bytes_cached, time.time() - started))
+
+def StartCacheWarmup(**args):
+    """Run a CacheWarmer in the background, using an App Engine background thread where available."""
+    warmer = CacheWarmer(**args)
+    try:
+        from google.appengine.api import background_thread
+        background_thread.start_new_background_thread(warmer.run, [])
+    except Exception:
+        thread = threading.Thread(target=warmer.run, name="CacheWarmer")
+        thread.daemon = True
+        thread.start()
+    return warmer
+
+
 #log.info("STARTING UP... reading schemas.")
 read_schemas(loadExtensions=ENABLE_HOSTED_EXTENSIONS)
 schemasInitialized = True
+GetTermLookup(["core"]) # so that autocomplete is quick from the first request
+GetRedirectTable()
+
+if ENABLE_CACHE_WARMUP:
+    StartCacheWarmup()
 
 app = ndb.toplevel(webapp2.WSGIApplication([("/(.*)", ShowUnit)]))
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import re
+import json
+import logging
+from collections import OrderedDict
+
+import api
+import caches
+
+logging.basicConfig(level=logging.INFO) # dev_appserver.py --log_level debug .
+log = logging.getLogger(__name__)
+
+# Serializers: machine-readable descriptions of a single term (e.g. /Person.ttl),
+# made straight from the triples whose subject is the term, and of the whole graph
+# (e.g. /version/latest/schema.nt), generated a piece at a time for a streamed response.
+# Ids in the graph are local names ("Person"), prefixed names ("rdfs:Class") or
+# absolute URIs.
+
+SCHEMA_BASE = "http://schema.org/"
+
+PREFIXES = OrderedDict([
+    ("schema", SCHEMA_BASE),
+    ("rdf", "http://www.w3.org/1999/02/22-rdf-syntax-ns#"),
+    ("rdfs", "http://www.w3.org/2000/01/rdf-schema#"),
+    ("owl", "http://www.w3.org/2002/07/owl#"),
+    ("dc", "http://purl.org/dc/terms/"),
+])
+
+ARC_NAMES = { "typeOf": "rdf:type" } # arcs the graph keeps under another name
+
+FORMATS = OrderedDict([ # file extension -> media type
+    ("jsonld", "application/ld+json"),
+    ("nt", "application/n-triples"),
+    ("ttl", "text/turtle"),
+])
+
+GRAPH_FORMATS = OrderedDict([ # whole-graph formats: file extension -> media type
+    ("nt", "application/n-triples"),
+    ("nq", "application/n-quads"),
+    ("ttl", "text/turtle"),
+    ("jsonld", "application/ld+json"),
+])
+
+local_name_re = re.compile(r'^[A-Za-z_][\w\-]*$')
+
+def PrefixedName(id):
+    """The prefixed form of a graph id, e.g. "schema:Person", or None for URIs with no known prefix."""
+    if id.startswith("http://") or id.startswith("https://"):
+        for prefix, base in PREFIXES.items():
+            if id.startswith(base) and local_name_re.match(id[len(base):]):
+                return "%s:%s" % (prefix, id[len(base):])
+        return None
+    if ":" in id:
+        return id if id.split(":", 1)[0] in PREFIXES else None
+    return "schema:%s" % id
+
+def FullURI(id):
+    """The absolute URI for a graph id."""
+    name = PrefixedName(id)
+    if name is None:
+        return id
+    prefix, local = name.split(":", 1)
+    return PREFIXES.get(prefix, prefix + ":") + local
+
+def LayerGraphName(layer):
+    """The graph name for a layer's triples in N-Quads: the site that serves the layer."""
+    if layer == "core":
+        return SCHEMA_BASE
+    return "http://%s.schema.org/" % layer
+
+def TermQuads(node, layers='core'):
+    """(predicate name, object, layer) for node's triples in these layers, rdf:type first then sorted; objects are Units or text."""
+    caches.NoteDependency(node.id)
+    quads = set()
+    for t in node.arcsOut:
+        if t.layer not in layers:
+            continue
+        predicate = PrefixedName(ARC_NAMES.get(t.arc.id, t.arc.id)) or t.arc.id
+        quads.add((predicate, t.target if t.target is not None else t.text, t.layer))
+    return sorted(quads, key=lambda t: (t[0] != "rdf:type", t[0], isinstance(t[1], basestring), t[1] if isinstance(t[1], basestring) else t[1].id, t[2]))
+
+def TermTriples(node, layers='core'):
+    """(predicate name, object) pairs for node's triples in these layers, rdf:type first then sorted; objects are Units or text."""
+    triples = []
+    for predicate, o, layer in TermQuads(node, layers):
+        if not triples or triples[-1] != (predicate, o):
+            triples.append((predicate, o))
+    return triples
+
+def GraphTerms(layers='core'):
+    """Every unit that is the subject of a triple in these layers, in id order."""
+    caches.NoteDependency("*") # the whole graph
+    nodes = [node for node in api.GraphNodeMap().values() if any(t.layer in layers for t in node.arcsOut)]
+    return sorted(nodes, key=lambda u: u.id)
+
+def quoteLiteral(text):
+    return u'"%s"' % text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+
+def ntriplesLines(node, layers, graph=False):
+    """N-Triples lines for node, or N-Quads lines naming each triple's layer graph."""
+    subject = u"<%s>" % FullURI(node.id)
+    if graph:
+        quads = TermQuads(node, layers)
+    else:
+        quads = [(predicate, o, None) for predicate, o in TermTriples(node, layers)]
+    for predicate, o, layer in quads:
+        value = quoteLiteral(o) if isinstance(o, basestring) else u"<%s>" % FullURI(o.id)
+        if graph:
+            yield u"%s <%s> %s <%s> .\n" % (subject, FullURI(predicate), value, LayerGraphName(layer))
+        else:
+            yield u"%s <%s> %s .\n" % (subject, FullURI(predicate), value)
+
+def NTriples(node, layers='core'):
+    """N-Triples for node, one triple per line."""
+    return u"".join(ntriplesLines(node, layers))
+
+def turtleName(id):
+    prefixed = PrefixedName(id)
+    return prefixed if prefixed else u"<%s>" % id
+
+def turtleStatement(node, layers, used):
+    """One Turtle statement for node, with a line per predicate and object; adds the prefixes it uses to used."""
+    used.add(turtleName(node.id).split(":")[0])
+    statements = []
+    for predicate, o in TermTriples(node, layers):
+        value = quoteLiteral(o) if isinstance(o, basestring) else turtleName(o.id)
+        if predicate == "rdf:type":
+            predicate = "a"
+        else:
+            used.add(predicate.split(":")[0])
+        if not isinstance(o, basestring) and not value.startswith("<"):
+            used.add(value.split(":")[0])
+        statements.append(u"%s %s" % (predicate, value))
+    if not statements:
+        return u""
+    return u"%s %s .\n" % (turtleName(node.id), u" ;\n    ".join(statements))
+
+def turtlePrefixes(used=None):
+    return u"".join(u"@prefix %s: <%s> .\n" % (prefix, base) for prefix, base in PREFIXES.items() if used is None or prefix in used)
+
+def Turtle(node, layers='core'):
+    """Turtle for node: the prefixes it uses, then one statement with a line per predicate and object."""
+    used = set()
+    statement = turtleStatement(node, layers, used)
+    if not statement:
+        return turtlePrefixes(used)
+    return u"%s\n%s" % (turtlePrefixes(used), statement)
+
+def jsonLdNode(node, layers):
+    """node's triples as a compact JSON-LD node object, without a context."""
+    def ref(id):
+        return PrefixedName(id) or id
+
+    doc = OrderedDict()
+    doc["@id"] = ref(node.id)
+    for predicate, o in TermTriples(node, layers):
+        if predicate == "rdf:type":
+            key, value = "@type", ref(o.id)
+        elif isinstance(o, basestring):
+            key, value = predicate, o
+        else:
+            key, value = predicate, { "@id": ref(o.id) }
+        if key not in doc:
+            doc[key] = value
+        elif isinstance(doc[key], list):
+            doc[key].append(value)
+        else:
+            doc[key] = [doc[key], value]
+    return doc
+
+def JsonLd(node, layers='core'):
+    """Compact JSON-LD for node, using the prefixes in PREFIXES."""
+    doc = OrderedDict([("@context", PREFIXES)])
+    doc.update(jsonLdNode(node, layers))
+    return unicode(json.dumps(doc, indent=2, separators=(',', ': '), ensure_ascii=False)) + u"\n"
+
+def Serialize(format, node, layers='core'):
+    """node in one of FORMATS: "jsonld", "nt" or "ttl"."""
+    if format == "jsonld":
+        return JsonLd(node, layers)
+    if format == "nt":
+        return NTriples(node, layers)
+    if format == "ttl":
+        return Turtle(node, layers)
+    raise ValueError("Unknown format: %s" % format)
+
+def GraphNTriples(layers='core', graph=False):
+    """N-Triples (or with graph, N-Quads) for every term in these layers, a line at a time."""
+    for node in GraphTerms(layers):
+        for line in ntriplesLines(node, layers, graph):
+            yield line
+
+def GraphTurtle(layers='core'):
+    """Turtle for every term in these layers: all of PREFIXES, then a statement at a time."""
+    yield turtlePrefixes()
+    for node in GraphTerms(layers):
+        statement = turtleStatement(node, layers, set())
+        if statement:
+            yield u"\n" + statement
+
+def GraphJsonLd(layers='core'):
+    """JSON-LD for every term in these layers, as one @graph, a node object at a time."""
+    context = json.dumps(PREFIXES, indent=2, separators=(',', ': '))
+    yield u'{\n  "@context": %s,\n  "@graph": [' % context.replace("\n", "\n  ")
+    separator = u"\n    "
+    for node in GraphTerms(layers):
+        text = json.dumps(jsonLdNode(node, layers), indent=2, separators=(',', ': '), ensure_ascii=False)
+        yield separator + unicode(text).replace(u"\n", u"\n    ")
+        separator = u",\n    "
+    yield u"\n  ]\n}\n"
+
+def SerializeGraph(format, layers='core'):
+    """A generator of the text of the whole graph in one of GRAPH_FORMATS: "nt", "nq", "ttl" or "jsonld"."""
+    if format == "nt":
+        return GraphNTriples(layers)
+    if format == "nq":
+        return GraphNTriples(layers, graph=True)
+    if format == "ttl":
+        return GraphTurtle(layers)
+    if format == "jsonld":
+        return GraphJsonLd(layers)
+    raise ValueError("Unknown format: %s" % format)
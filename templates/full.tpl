@@ -69,7 +69,7 @@ super-type, here we show each type in one branch of the tree only.
 <h4>DataType</h4>
 
 <div>
-{{ datatype_tree | safe }}
+{% for chunk in datatype_tree %}{{ chunk | safe }}{% endfor %}
 </div> -->
 
 <h4>Thing</h4>
@@ -80,7 +80,7 @@ Although a type may have more than one super-type, here we show each type in one
 </p>
 
 <div>
-{{ thing_tree | safe }}
+{% for chunk in thing_tree %}{{ chunk | safe }}{% endfor %}
 </div>
 
 
@@ -109,7 +109,7 @@ that are useful for publishers and consumers of schema.org data.
 
 <div id="alltypes">
 <small>
-{{ thing_tree | safe }}
+{% for chunk in thing_tree %}{{ chunk | safe }}{% endfor %}
 </small>
 </div>
 
@@ -0,0 +1,6 @@
+{# Markup for term pages (termPage.tpl) and page fragments. sdoapp.py calls these
+   macros from Python too; see TermMacros(). Whitespace here is part of the output. #}
+
+{% macro ml(node, label='', title='', prop='', hashorslash='/') -%}
+<a href="{{ hashorslash }}{{ node.id }}"{% if prop %} property="{{ prop }}"{% endif %}{% if title != '' %} title="{{ title|safe }}"{% endif %}>{{ (node.id if label == '' else label)|safe }}</a>
+{%- endmacro %}
@@ -0,0 +1,150 @@
+{# Body of a term page, after genericTermPageHeader.tpl. Whitespace here is part of the output. -#}
+{% import "termMacros.tpl" as m -%}
+{% if show_layerinfo %}<p id='lli' class='layerinfo {{ layerinfo }}'><a href="https://github.com/schemaorg/schemaorg/wiki/ExtensionList">extensions shown</a>: {{ layerinfo }} [<a href='http://{{ mybasehost }}/'>x</a>]</p>
+{% endif -%}
+<h1 class="page-title">
+{% for nn in breadcrumb %}{{ m.ml(nn) }}
+{%- if loop.revindex0 == 1 %}{% if is_enumeration_value %} :: {% else %} &gt; {% endif %}<span property="rdfs:label">
+{%- elif not loop.last %} &gt; {% else %}</span>{% endif %}
+{%- endfor %}</h1> <div property="rdfs:comment">{{ comment|safe }}</div>
+
+
+ <br><div>Usage: {{ usage|safe }}</div>
+
+
+<div>
+        <div id='infobox' style='text-align: right;'><b><span style="cursor: pointer;">[more...]</span></b></div>
+        <div id='infomsg' style='display: none; background-color: #EEEEEE; text-align: left; padding: 0.5em;'>
+        <ul>{% for i in moreinfo_items %}<li>{{ i|safe }}</li>{% endfor %}</ul>
+          </div>
+        </div</div>
+        <script type="text/javascript">
+        $("#infobox").click(function(x) {
+            element = $("#infomsg");
+            if (! $(element).is(":visible")) {
+                $("#infomsg").show(300);
+            } else {
+                $("#infomsg").hide(300);
+
+            }
+        });
+</script>
+{%- if is_class and not is_datatype %}<table class="definition-table">
+        <thead>
+  <tr><th>Property</th><th>Expected Type</th><th>Description</th>               
+  </tr>
+  </thead>
+
+{% endif %}
+
+{%- if is_class %}
+{%- for t in class_tables %}
+{%- if t.rows %}<thead class="supertype">
+  <tr>
+    <th class="supertype-name" colspan="3">Properties from {% if t.subclass %}{{ m.ml(t.cls, prop="rdfs:subClassOf") }}{% else %}{{ m.ml(t.cls) }}{% endif %}</th>
+  </tr>
+</thead>
+
+<tbody class="supertype">
+  {{ t.rows|safe }}
+{%- elif t.subclass %}<meta property="rdfs:subClassOf" content="{{ t.cls.id }}">{% endif %}
+{%- endfor %}</table>
+{% if incoming_rows %}<br/><br/>Instances of {{ m.ml(node) }} may appear as values for the following properties<br/><table class="definition-table">
+        
+  
+<thead>
+  <tr><th>Property</th><th>On Types</th><th>Description</th>               
+  </tr>
+</thead>
+
+{{ incoming_rows|safe }}</table>
+{% endif %}
+
+{%- elif is_property %}
+{%- if attr.inverseprop != None %}<p>Inverse-property: {{ m.ml(attr.inverseprop, attr.inverseprop.id, "This means the same thing, but with the relationship direction reversed.") }}.</p>{% endif -%}
+<table class="definition-table">
+<thead>
+  <tr>
+    <th>Values expected to be one of these types</th>
+  </tr>
+</thead>
+
+  <tr>
+    <td>
+      {% for r, tt in attr.ranges %}{% if not loop.first %}<br/>{% endif %} <code>{{ m.ml(r, r.id, tt, prop="rangeIncludes") }}
+</code> {% endfor %}    </td>
+  </tr>
+</table>
+
+<table class="definition-table">
+  <thead>
+    <tr>
+      <th>Used on these types</th>
+    </tr>
+</thead>
+<tr>
+  <td>{% for d, tt in attr.domains %}{% if not loop.first %}<br/>{% endif %}
+    <code>{{ m.ml(d, d.id, tt, prop="domainIncludes") }}
+</code> {% endfor %}      </td>
+    </tr>
+</table>
+
+{% for heading, links in attr.tables %}<table class="definition-table">
+  <thead>
+    <tr>
+      <th>{{ heading|safe }}</th>
+    </tr>
+</thead>
+{% for n, tt, prop in links %}
+    <tr><td><code>{{ m.ml(n, n.id, tt, prop) }}</code></td></tr>
+{% endfor %}
+</table>
+
+{% endfor %}
+{%- endif %}
+
+{%- if not is_property %}
+
+</table>
+
+{% endif %}
+
+{%- if subtypes %}<br/><b>More specific Types</b>{% for c in subtypes %}<li> <a href="/{{ c.id }}">{{ c.id|safe }}</a>{% endfor %}{% endif %}
+
+{%- if members %}<br/><br/>Enumeration members{% for c in members %}<li> <a href="/{{ c.id }}">{{ c.id|safe }}</a>{% endfor %}{% endif %}
+
+{%- if acks != None %}<h4  id="acks">Acknowledgements</h4>
+{% for ack in acks %}{{ ack|safe }}<br/>{% endfor %}{% endif %}
+
+{%- if examples %}<br/><br/><b><a id="examples">Examples</a></b><br/><br/>
+
+{% for ex in examples %}{% if ex.id != None %}<span id="{{ ex.id }}"></span>{% endif %}<div class='ds-selector-tabs ds-selector'>
+  <div class='selectors'>
+    <a value='original_html' data-selects='original_html' class='selected'>Without Markup</a>
+    <a value='microdata' data-selects='microdata' class=''>Microdata</a>
+    <a value='rdfa' data-selects='rdfa' class=''>RDFa</a>
+    <a value='jsonld' data-selects='jsonld' class=''>JSON-LD</a>
+</div>
+
+<pre class="prettyprint lang-html linenums original_html selected">{{ ex.original_html|safe }}</pre>
+
+<pre class="prettyprint lang-html linenums microdata ">{{ ex.microdata|safe }}</pre>
+
+<pre class="prettyprint lang-html linenums rdfa ">{{ ex.rdfa|safe }}</pre>
+
+<pre class="prettyprint lang-html linenums jsonld ">{{ ex.jsonld|safe }}</pre>
+
+</div>
+
+{% endfor %}{% endif -%}
+<p class="version"><b>Schema Version {{ schema_version }}</b></p>
+
+<script>(function(i,s,o,g,r,a,m){i['GoogleAnalyticsObject']=r;i[r]=i[r]||function(){
+	  (i[r].q=i[r].q||[]).push(arguments)},i[r].l=1*new Date();a=s.createElement(o),
+	  m=s.getElementsByTagName(o)[0];a.async=1;a.src=g;m.parentNode.insertBefore(a,m)
+	  })(window,document,'script','//www.google-analytics.com/analytics.js','ga');
+	  ga('create', 'UA-52672119-1', 'auto');ga('send', 'pageview');</script> 
+
+</div>
+</body>
+</html>
\ No newline at end of file
@@ -2,11 +2,24 @@ import unittest
 import os
 import logging # https://docs.python.org/2/library/logging.html#logging-levels
 import sys
+import tempfile
+import threading
 sys.path.append( os.getcwd() )
 
 #from api import *
 from sdoapp import *
+import sdoapp
+import api
+import caches
+import validator
 from parsers import *
+from api import ReloadSchemas, PatchTriples, TemplateBytecodeCache
+from caches import InvalidateTerms, DictBackend
+from api import UsingGraph, NodeIDMap, Triple, GetTermLookup, GetSearchIndex, SearchTerms
+from api import GetSpellingIndex, EditDistance, GetRedirectTable, GetPropertyGraph
+from api import GetInheritedDomain, GetInheritedRange, GetApplicableProperties, GetIncomingProperties
+from validator import Validator, ValidationSummary, GetValidationTables, ValidateItem, ValidateLines
+from releases import GetRelease, GetReleaseDigest, ReleaseDigest, ReleaseChanges
 
 schema_path = './data/schema.rdfa'
 examples_path = './data/examples.txt'
@@ -412,8 +425,833 @@ class AdvancedJSONLDTests(unittest.TestCase):
        ctx = json.loads(GetJsonLdContext())
        self.assertTrue( "sameAs" in ctx["@context"] , "sameAs should be defined." )
 
+    def test_extension_layer_jsonld(self):
+       import json
+       ctx = json.loads(GetJsonLdContext(layers=["core", "auto"]))
+       self.assertEqual( ctx["@context"]["modelDate"], { "@type": "Date" }, "Extension properties should get their coercions." )
+       self.assertFalse( "modelDate" in json.loads(GetJsonLdContext())["@context"], "modelDate is not in core." )
+
+    def test_extension_host_jsonld(self):
+       import json
+       response = webapp2.Request.blank("/docs/jsonldcontext.json", base_url="http://auto.localhost:8080").get_response(app)
+       self.assertTrue( "modelDate" in json.loads(response.body)["@context"] )
+
 #      self.assertTrue( HasMultipleBaseTypes( Unit.GetUnit("LocalBusiness") ) , "LocalBusiness is subClassOf Place + Organization." )
 
+class CacheWarmupTests(unittest.TestCase):
+
+    def test_sitewide_pages_first(self):
+       paths = CacheWarmer().warmupPaths()
+       self.assertEqual( paths[:3], ["docs/full.html", "docs/tree.jsonld", "docs/jsonldcontext.json"], "Site-wide pages should be warmed first." )
+
+    def test_terms_by_usage(self):
+       paths = CacheWarmer().warmupPaths()[3:]
+       ranks = [ usageRank(Unit.GetUnit(p)) for p in paths ]
+       self.assertEqual( ranks, sorted(ranks, reverse=True), "Terms should be warmed in descending usage order." )
+       self.assertTrue( "Person" in paths, "Core terms should be warmed." )
+
+    def test_memory_budget(self):
+       warmer = CacheWarmer(memory_budget=1)
+       warmer.run()
+       self.assertEqual( warmer.warmed, ["docs/full.html"], "Warm-up should stop once the memory budget is spent." )
+       self.assertTrue( DataCache.get("FullTreePage") != None, "Warm-up should cache the full hierarchy page." )
+
+
+class PageCacheLookupTests(unittest.TestCase):
+
+    def setUp(self):
+       self.cache = sdoapp.PageCache
+
+    def tearDown(self):
+       sdoapp.PageCache = self.cache
+
+    def test_entry_dropped_between_lookups(self):
+       class Forgetful(DictBackend):
+           """Drops each entry once it has been read, as a busy shared backend may."""
+           shared = True
+           def get(self, key):
+               return self.store.pop(key, None)
+       sdoapp.PageCache = Cache("test-page", Forgetful())
+       person = Unit.GetUnit("Person")
+       sdoapp.PageCache["core:Person"] = u"<html>Person</html>"
+       self.assertEqual( ShowUnit().GetCachedText(person), u"<html>Person</html>" )
+       self.assertEqual( ShowUnit().GetCachedText(person), None )
+
+
+class FragmentCacheTests(unittest.TestCase):
+
+    def test_fragment_rendered_once(self):
+       calls = []
+       def render(node, layers, hashorslash):
+           calls.append(node.id)
+           return "<tr>%s</tr>" % node.id
+       name = Unit.GetUnit("name")
+       first = GetCachedFragment("TestRow", name, "core", "/", render)
+       second = GetCachedFragment("TestRow", name, ["core"], "/", render)
+       self.assertEqual( first, second, "Cached fragment should be reused." )
+       self.assertEqual( calls, ["name"], "Fragment should be rendered once per (term, layers, prefix)." )
+       GetCachedFragment("TestRow", name, "core", "#term_", render)
+       self.assertEqual( len(calls), 2, "A different link prefix is a different fragment." )
+
+class DependencyInvalidationTests(unittest.TestCase):
+
+    def setUp(self):
+       for path in ["Book", "Person"]:
+           webapp2.Request.blank("/" + path).get_response(app)
+
+    def cachedPages(self):
+       return [key.split(":")[-1] for key in PageCache.deps.keys()]
+
+    def test_narrow_change(self):
+       self.assertTrue( "Book" in self.cachedPages() and "Person" in self.cachedPages() )
+       InvalidateTerms(["bookEdition"])
+       self.assertTrue( "Book" not in self.cachedPages(), "Book lists bookEdition so its page should be evicted." )
+       self.assertTrue( "Person" in self.cachedPages(), "Person doesn't mention bookEdition so its page should survive." )
+
+    def test_broad_change(self):
+       InvalidateTerms(["Thing"])
+       self.assertTrue( "Book" not in self.cachedPages() and "Person" not in self.cachedPages(), "Every type page reads Thing." )
+
+    def test_patch_evicts_and_applies(self):
+       edit = [("bookEdition", "rdfs:comment", "Patched comment.")]
+       changed = PatchTriples(additions=edit)
+       self.assertEqual( changed, ["bookEdition"] )
+       self.assertTrue( "Book" not in self.cachedPages() )
+       self.assertTrue( "Patched comment." in GetTargets(Unit.GetUnit("rdfs:comment"), Unit.GetUnit("bookEdition")) )
+       PatchTriples(removals=edit)
+       self.assertTrue( "Patched comment." not in GetTargets(Unit.GetUnit("rdfs:comment"), Unit.GetUnit("bookEdition")) )
+
+    def test_reload_unchanged_data(self):
+       self.assertEqual( ReloadSchemas(loadExtensions=ENABLE_HOSTED_EXTENSIONS), [], "Re-reading the same files should change no terms." )
+       self.assertTrue( "Person" in self.cachedPages(), "Nothing changed, so cached pages should survive a reload." )
+
+class GraphLockTests(unittest.TestCase):
+
+    def test_writer_waits_for_readers(self):
+       lock = api.GraphLock()
+       events = []
+       def write():
+           with lock.writing():
+               events.append("write")
+       with lock.reading():
+           writer = threading.Thread(target=write)
+           writer.start()
+           writer.join(0.2)
+           events.append("read done")
+       writer.join()
+       self.assertEqual( events, ["read done", "write"] )
+
+    def test_nesting(self):
+       lock = api.GraphLock()
+       with lock.writing():
+           with lock.reading():
+               with lock.writing():
+                   pass
+       with lock.reading():
+           with lock.reading():
+               self.assertRaises( RuntimeError, lambda: lock.writing().__enter__() )
+
+    def test_reload_never_seen_half_done(self):
+       done = threading.Event()
+       seen = []
+       def read():
+           while not done.is_set():
+               with api.graph_lock.reading():
+                   seen.append(len(Unit.GetUnit("Person").arcsOut))
+       reader = threading.Thread(target=read)
+       reader.start()
+       try:
+           ReloadSchemas(loadExtensions=ENABLE_HOSTED_EXTENSIONS)
+       finally:
+           done.set()
+           reader.join()
+       self.assertTrue( seen and min(seen) > 0, "A request must never read the graph while it is reset and reloaded." )
+
+    def test_shared_backend_patch_moves_graph_version(self):
+       original = api.graph_version
+       PageCache.backend.shared = True
+       try:
+           edit = [("bookEdition", "rdfs:comment", "Patched comment.")]
+           PatchTriples(additions=edit)
+           patched = api.graph_version
+           self.assertNotEqual( patched, original, "Other processes sharing the backend would serve pages of the unpatched graph." )
+           self.assertEqual( caches.graph_version, patched )
+           PatchTriples(removals=edit)
+       finally:
+           del PageCache.backend.shared
+           api.graph_version = original
+           caches.SetGraphVersion(original)
+
+class CacheStatsEndpointTests(unittest.TestCase):
+
+    def test_cachestats_json(self):
+       webapp2.Request.blank("/Person").get_response(app)
+       response = webapp2.Request.blank("/admin/cachestats.json").get_response(app)
+       self.assertEqual( response.headers["Content-Type"], "application/json" )
+       stats = json.loads(response.body)
+       for namespace in ["page", "fragment", "data"]:
+           self.assertTrue( namespace in stats, "Missing stats for %s cache" % namespace )
+       self.assertTrue( stats["page"]["inserts"] + stats["page"]["hits"] > 0 )
+
+class StreamedPageTests(unittest.TestCase):
+
+    def test_streamed_pages_match_cached_copies(self):
+       for path, cachekey in [("docs/full.html", "FullTreePage"), ("docs/tree.jsonld", "JSONLDThingTree")]:
+           if cachekey in DataCache:
+               del DataCache[cachekey]
+           streamed = webapp2.Request.blank("/" + path).get_response(app).body
+           self.assertTrue( cachekey in DataCache, "A finished stream should be cached." )
+           cached = webapp2.Request.blank("/" + path).get_response(app).body
+           self.assertEqual( streamed, cached, "Cached %s should match the streamed one." % path )
+
+    def test_rechunk(self):
+       chunks = list(Rechunk(["ab", "cd", "e"], size=3))
+       self.assertEqual( chunks, ["abcd", "e"] )
+
+class SchemaIndexTests(unittest.TestCase):
+
+    def test_matches_graph_api(self):
+       index = GetSchemaIndex()
+       di = Unit.GetUnit("domainIncludes")
+       ri = Unit.GetUnit("rangeIncludes")
+       for id in ["Book", "Person", "Offer", "Thing", "Text"]:
+           cl = Unit.GetUnit(id)
+           expected = sorted([p for p in GetSources(di, cl) if not p.superseded()], key=lambda u: u.id)
+           self.assertEqual( index.propertiesOf(cl), expected, "Properties of %s" % id )
+           expected = sorted([p for p in GetSources(ri, cl) if not p.superseded()], key=lambda u: u.id)
+           self.assertEqual( index.propertiesInto(cl), expected, "Properties into %s" % id )
+           self.assertEqual( index.comment(cl), GetComment(cl) )
+       self.assertEqual( index.subtypesOf(Unit.GetUnit("CreativeWork")), GetImmediateSubtypes(Unit.GetUnit("CreativeWork")) )
+       author = Unit.GetUnit("author")
+       self.assertEqual( index.rangesOf(author), sorted(GetTargets(ri, author), key=lambda u: u.id) )
+       self.assertEqual( index.domainsOf(author), sorted(GetTargets(di, author), key=lambda u: u.id) )
+
+    def test_rebuilt_after_change(self):
+       index = GetSchemaIndex()
+       InvalidateTerms(["bookEdition"])
+       self.assertTrue( GetSchemaIndex() is not index, "Any change to the graph should drop the index." )
+
+    def test_term_list_markup(self):
+       html = TermListHTML("props4type", [Unit.GetUnit("name"), Unit.GetUnit("url")], "#term_")
+       self.assertEqual( html, "<ul class='props4type'><li><a href='#term_name'>name</a></li><li><a href='#term_url'>url</a></li></ul>\n\n" )
+
+    def test_full_release_json(self):
+       response = webapp2.Request.blank("/version/latest/schema-all.json").get_response(app)
+       self.assertEqual( response.headers["Content-Type"], "application/json" )
+       release = json.loads(response.body)
+       book = [t for t in release["types"] if t["id"] == "Book"][0]
+       self.assertTrue( "bookEdition" in book["properties"] )
+       author = [p for p in release["properties"] if p["id"] == "author"][0]
+       self.assertEqual( author["rangeIncludes"], ["Organization", "Person"] )
+
+class SubtypeTreeTests(unittest.TestCase):
+
+    def fetch(self, path, headers=None):
+       return webapp2.Request.blank(path, headers=headers or {}).get_response(app)
+
+    def names(self, entry):
+       found = [entry["name"]]
+       for child in entry.get("children", []):
+           found.extend(self.names(child))
+       return found
+
+    def test_depth_limited_subtree(self):
+       tree = json.loads(self.fetch("/docs/tree.jsonld?root=CreativeWork&depth=1").body)
+       self.assertEqual( tree["@id"], "schema:CreativeWork" )
+       self.assertTrue( "@context" in tree, "Only the root carries the context." )
+       article = [c for c in tree["children"] if c["name"] == "Article"][0]
+       self.assertEqual( article["rdfs:subClassOf"], "schema:CreativeWork" )
+       self.assertTrue( "children" not in article and article["childCount"] > 0, "Types below the depth limit should only be counted." )
+
+    def test_whole_tree_matches_legacy(self):
+       legacy = set(re.findall(r'"@id": "schema:([^"]+)"', self.fetch("/docs/tree.jsonld").body))
+       names = self.names(json.loads(self.fetch("/docs/tree.jsonld?root=Thing").body))
+       self.assertEqual( len(names), len(set(names)), "Each type should be listed once." )
+       self.assertEqual( set(names), legacy )
+
+    def parents(self, entry, found=None):
+       found = {} if found is None else found
+       for child in entry.get("children", []):
+           found[child["name"]] = entry["name"]
+           self.parents(child, found)
+       return found
+
+    def test_nesting_matches_legacy(self):
+       legacy = dict((name, parent) for (parent, name) in
+                     re.findall(r'"rdfs:subClassOf": "schema:([^"]+)",.*\n\s*"name": "([^"]+)"', self.fetch("/docs/tree.jsonld").body))
+       parents = self.parents(json.loads(self.fetch("/docs/tree.jsonld?root=Thing").body))
+       self.assertEqual( parents, legacy )
+       self.assertEqual( parents["Restaurant"], legacy["Restaurant"], "A type with two supertypes goes under the one the depth-first tree reaches first." )
+       self.assertEqual( sorted(t for t in parents if parents[t] == "LocalBusiness"), sorted(t for t in legacy if legacy[t] == "LocalBusiness") )
+
+    def test_etag(self):
+       first = self.fetch("/docs/tree.jsonld?root=Place&depth=2")
+       again = self.fetch("/docs/tree.jsonld?root=Place&depth=2", { "If-None-Match": first.headers["ETag"] })
+       self.assertEqual( again.status_int, 304 )
+       other = self.fetch("/docs/tree.jsonld?root=Place&depth=1")
+       self.assertNotEqual( other.headers["ETag"], first.headers["ETag"], "Each (root, depth) has its own ETag." )
+
+    def test_bad_requests(self):
+       self.assertEqual( self.fetch("/docs/tree.jsonld?root=NoSuchType").status_int, 404 )
+       self.assertEqual( self.fetch("/docs/tree.jsonld?root=name").status_int, 404, "Properties have no subtree." )
+       self.assertEqual( self.fetch("/docs/tree.jsonld?depth=-1").status_int, 400 )
+
+class TermPageTemplateTests(unittest.TestCase):
+
+    def test_inverse_property_link(self):
+       if "isPartOf" in PageCache:
+           del PageCache["isPartOf"]
+       body = webapp2.Request.blank("/isPartOf").get_response(app).body
+       self.assertTrue( '<a href="/hasPart" title="This means the same thing, but with the relationship direction reversed.">hasPart</a>' in body )
+
+    def test_bytecode_key_ignores_install_path(self):
+       cache = TemplateBytecodeCache(tempfile.gettempdir())
+       self.assertEqual( cache.get_cache_key("termPage.tpl", "/srv/a/templates/termPage.tpl"),
+                         cache.get_cache_key("termPage.tpl", "/srv/b/templates/termPage.tpl"),
+                         "Bytecode built before deployment should match wherever the app runs." )
+
+    def test_unwritable_bytecode_dir_ignored(self):
+       env = jinja2.Environment(loader=jinja2.DictLoader({ "t.tpl": u"{{ x }}" }),
+                                bytecode_cache=TemplateBytecodeCache("/no/such/directory"))
+       self.assertEqual( env.get_template("t.tpl").render(x=1), u"1" )
+
+class TermDataTests(unittest.TestCase):
+
+    def fetch(self, path, headers={}):
+       return webapp2.Request.blank(path, headers=headers).get_response(app)
+
+    def test_extensions(self):
+       for ext, mimetype in serializers.FORMATS.items():
+           response = self.fetch("/Person." + ext)
+           self.assertEqual( response.status_int, 200 )
+           self.assertEqual( response.headers["Content-Type"], mimetype + "; charset=utf-8" )
+
+    def test_ntriples_lines(self):
+       body = self.fetch("/author.nt").body.decode("utf-8")
+       lines = body.splitlines()
+       self.assertTrue( len(lines) > 3 )
+       for line in lines:
+           self.assertTrue( re.match(r'^<http://schema.org/author> <[^>]+> (<[^>]+>|".*") \.$', line), "Bad N-Triples line: %s" % line )
+       self.assertTrue( "<http://schema.org/author> <http://schema.org/rangeIncludes> <http://schema.org/Person> ." in lines )
+
+    def test_turtle_and_jsonld(self):
+       turtle = self.fetch("/Person.ttl").body
+       self.assertTrue( turtle.startswith("@prefix ") )
+       self.assertTrue( "\nschema:Person a rdfs:Class ;\n" in turtle )
+       doc = json.loads(self.fetch("/Person.jsonld").body)
+       self.assertEqual( doc["@id"], "schema:Person" )
+       self.assertEqual( doc["@type"], "rdfs:Class" )
+       self.assertEqual( doc["rdfs:subClassOf"], { "@id": "schema:Thing" } )
+
+    def test_accept_header(self):
+       response = self.fetch("/Person", { "Accept": "text/turtle" })
+       self.assertTrue( response.headers["Content-Type"].startswith("text/turtle") )
+       self.assertTrue( "Accept" in [v.strip() for v in response.headers.get("Vary", "").split(",")] )
+       browser = "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"
+       for accept in [browser, "*/*", "application/ld+json;q=0.5, text/html"]:
+           response = self.fetch("/Person", { "Accept": accept })
+           self.assertTrue( response.headers["Content-Type"].startswith("text/html"), "HTML expected for Accept: %s" % accept )
+           self.assertTrue( "Accept" in [v.strip() for v in response.headers.get("Vary", "").split(",")], "The HTML varies by Accept too." )
+
+    def test_names(self):
+       self.assertEqual( serializers.PrefixedName("Person"), "schema:Person" )
+       self.assertEqual( serializers.PrefixedName("http://www.w3.org/2002/07/owl#equivalentClass"), "owl:equivalentClass" )
+       self.assertEqual( serializers.PrefixedName("http://example.org/x"), None )
+       self.assertEqual( serializers.FullURI("rdfs:Class"), "http://www.w3.org/2000/01/rdf-schema#Class" )
+       self.assertEqual( serializers.quoteLiteral(u'a "b"\nc\\'), u'"a \\"b\\"\\nc\\\\"' )
+
+    def test_layers(self):
+       self.assertEqual( self.fetch("/NoSuchTerm.ttl").status_int, 404 )
+       self.assertEqual( self.fetch("/modelDate.ttl").status_int, 404, "Extension terms are only served on their host." )
+       self.assertEqual( self.fetch("/modelDate.ttl?ext=auto").status_int, 200 )
+
+
+class GraphDownloadTests(unittest.TestCase):
+
+    def fetch(self, path):
+       return webapp2.Request.blank(path).get_response(app)
+
+    def test_formats_agree(self):
+       lines = self.fetch("/version/latest/schema.nt").body.splitlines()
+       quads = self.fetch("/version/latest/schema.nq").body.splitlines()
+       self.assertEqual( len(lines), len(set(lines)), "Each triple should be written once." )
+       self.assertEqual( len(quads), len(lines) )
+       self.assertTrue( all(q.endswith(" <http://schema.org/> .") for q in quads), "Core triples belong to the core graph." )
+       self.assertTrue( "<http://schema.org/Person> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <http://schema.org/Thing> ." in lines )
+       doc = json.loads(self.fetch("/version/latest/schema.jsonld").body)
+       count = sum(len(v) if isinstance(v, list) else 1 for node in doc["@graph"] for k, v in node.items() if k != "@id")
+       self.assertEqual( count, len(lines) )
+       turtle = self.fetch("/version/latest/schema.ttl")
+       self.assertEqual( turtle.headers["Content-Type"], "text/turtle; charset=utf-8" )
+       self.assertTrue( "\nschema:Person a rdfs:Class ;\n" in turtle.body )
+
+    def test_layers(self):
+       core = self.fetch("/version/latest/schema.nq").body
+       auto = self.fetch("/version/latest/schema.nq?ext=auto").body
+       self.assertTrue( "<http://auto.schema.org/> ." in auto )
+       self.assertTrue( "modelDate" not in core )
+
+    def test_release_file(self):
+       response = self.fetch("/version/2.0/schema.nt")
+       self.assertEqual( response.headers["Content-Length"], str(os.path.getsize("data/releases/2.0/schema.nt")) )
+       partial = webapp2.Request.blank("/version/2.0/schema.nt", headers={ "Range": "bytes=0-99" }).get_response(app)
+       self.assertEqual( partial.status_int, 206 )
+       self.assertEqual( partial.body, response.body[:100] )
+
+    def test_cached_copy_matches_stream(self):
+       if "FullReleaseGraph:core:ttl" in DataCache:
+           del DataCache["FullReleaseGraph:core:ttl"]
+       streamed = self.fetch("/version/latest/schema.ttl").body
+       self.assertEqual( DataCache.get("FullReleaseGraph:core:ttl").encode("utf-8"), streamed )
+       self.assertEqual( self.fetch("/version/latest/schema.ttl").body, streamed )
+
+
+class ReleaseGraphTests(unittest.TestCase):
+
+    def fetch(self, path):
+       return webapp2.Request.blank(path).get_response(app)
+
+    def test_release_graph(self):
+       release = GetRelease("2.0")
+       self.assertTrue( release is GetRelease("2.0"), "Releases are loaded once." )
+       self.assertEqual( GetRelease("1.0"), None )
+       self.assertEqual( GetRelease("../2.0"), None )
+       self.assertTrue( "Person" in release and "modelDate" not in release )
+       self.assertFalse( release.nodes["Person"] is Unit.GetUnit("Person"), "Each graph has its own Units." )
+       with UsingGraph(release):
+           person = Unit.GetUnit("Person")
+           self.assertTrue( person is release.nodes["Person"] )
+           self.assertEqual( GetComment(person), "A person (alive, dead, undead, or fictional)." )
+           self.assertEqual( [t.id for t in GetTargets(Unit.GetUnit("rdfs:subClassOf"), person)], ["Thing"] )
+       self.assertTrue( Unit.GetUnit("Person") is NodeIDMap["Person"] )
+
+    def test_strings_shared(self):
+       release = GetRelease("2.0")
+       comment = lambda node: [t.text for t in node.arcsOut if t.arc.id == "rdfs:comment"][0]
+       self.assertTrue( comment(release.nodes["Thing"]) is comment(Unit.GetUnit("Thing")), "Identical comments should be one string." )
+
+    def test_release_term_pages(self):
+       page = self.fetch("/version/2.0/Person")
+       self.assertEqual( page.status_int, 200 )
+       self.assertTrue( 'href="/version/2.0/Thing"' in page.body, "Links should stay within the release." )
+       self.assertTrue( "Check for open issues." in page.body )
+       self.assertNotEqual( page.body, self.fetch("/Person").body, "Release and live pages are cached apart." )
+       self.assertEqual( self.fetch("/version/2.0/modelDate").status_int, 404 )
+       self.assertTrue( "rdfs:subClassOf schema:Thing" in self.fetch("/version/2.0/Person.ttl").body )
+       self.assertTrue( 'href="/version/2.0/URL"' in page.body and 'href="http://schema.org/URL"' not in page.body,
+                        "Absolute links to terms, e.g. in comments, should stay within the release too." )
+
+    def test_release_links_rewritten(self):
+       for path in ["/version/2.0/docs/full.html", "/version/2.0/docs/full.html"]: # streamed, then from DataCache
+           page = self.fetch(path).body
+           self.assertTrue( 'href="/version/2.0/Person"' in page )
+           self.assertEqual( re.findall(r"""href=["']/(?:Person|Thing|name)["']""", page), [], "Links to terms should stay within the release." )
+       relinked = sdoapp.RelinkStream(["<a href='/Pers", "on'>Person</a> <a href=\"http://schema.org/Thing\">"],
+                                      lambda text: sdoapp.term_href_re.sub(r"href=\1/v/\2\1", text))
+       self.assertEqual( "".join(relinked), "<a href='/v/Person'>Person</a> <a href=\"/v/Thing\">" )
+
+    def test_release_summary_page(self):
+       for fetch in range(2): # streamed, then from DataCache
+           release = self.fetch("/version/2.0/")
+           self.assertEqual( release.status_int, 200 )
+           self.assertTrue( '<base href="/version/2.0/" >' in release.body and "2015-05-13" in release.body )
+           self.assertFalse( 'id="term_lyrics"' in release.body, "lyrics was added after 2.0." )
+       latest = self.fetch("/version/latest/").body
+       self.assertTrue( '<base href="/version/latest/" >' in latest and 'id="term_lyrics"' in latest )
+       self.assertNotEqual( release.body, latest )
+
+    def test_release_docs(self):
+       tree = json.loads(self.fetch("/version/2.0/docs/tree.jsonld?root=Place&depth=1").body)
+       self.assertEqual( tree["@id"], "schema:Place" )
+       self.assertEqual( self.fetch("/version/2.0/docs/full.html").status_int, 200 )
+       self.assertTrue( "@context" in json.loads(self.fetch("/version/2.0/docs/jsonldcontext.json").body) )
+
+
+class ReleaseChangesTests(unittest.TestCase):
+
+    def test_changes(self):
+       changes = ReleaseChanges("2.0", "latest")
+       self.assertTrue( "lyrics" in changes["added"], "lyrics was added after 2.0." )
+       self.assertTrue( "description" not in changes["changed"], "Differently written ids for the same term are equal." )
+       self.assertEqual( changes["changed"]["urlTemplate"]["added"], [u'urlTemplate rdfs:comment "A url template (RFC6570) that will be used to construct the target of the execution of the action."'] )
+       back = ReleaseChanges("latest", "2.0")
+       self.assertEqual( back["removed"], changes["added"] )
+       self.assertEqual( back["triples"], { "added": changes["triples"]["removed"], "removed": changes["triples"]["added"] } )
+       same = ReleaseChanges("2.0", "2.0")
+       self.assertEqual( (same["added"], same["removed"], same["changed"]), ([], [], {}) )
+       self.assertEqual( ReleaseChanges("2.0", "9.9"), None )
+
+    def test_superseded(self):
+       class SmallGraph:
+           def __init__(self, version):
+               self.version = version
+               self.nodes = {}
+       graphs = {}
+       for version, triples in [("test-a", [("oldName", "rdfs:label", "oldName")]),
+                                ("test-b", [("oldName", "rdfs:label", "oldName"), ("oldName", "supersededBy", Unit),
+                                            ("newName", "rdfs:label", "newName")])]:
+           graphs[version] = SmallGraph(version)
+           with UsingGraph(graphs[version]):
+               for subject, arc, value in triples:
+                   if value is Unit:
+                       Triple(Unit.GetUnit(subject, True), Unit.GetUnit(arc, True), Unit.GetUnit("newName", True), None)
+                   else:
+                       Triple(Unit.GetUnit(subject, True), Unit.GetUnit(arc, True), None, value)
+           DataCache["ReleaseDigest:" + version] = ReleaseDigest(graphs[version])
+       digest = GetReleaseDigest("test-b")
+       self.assertEqual( list(digest.sortedHashes()), sorted(digest.lines) )
+       changes = ReleaseChanges("test-a", "test-b")
+       self.assertEqual( changes["superseded"], { "oldName": "newName" } )
+       self.assertEqual( changes["added"], ["newName"] )
+       self.assertEqual( changes["changed"]["oldName"], { "added": ["oldName supersededBy newName"], "removed": [] } )
+
+    def test_endpoint(self):
+       response = webapp2.Request.blank("/version/2.0..latest/changes").get_response(app)
+       self.assertEqual( response.headers["Content-Type"], "application/json" )
+       self.assertEqual( json.loads(response.body)["from"], "2.0" )
+       self.assertEqual( webapp2.Request.blank("/version/1.0..latest/changes").get_response(app).status_int, 404 )
+
+
+class SitemapTests(unittest.TestCase):
+
+    def fetch(self, path, headers={}):
+       return webapp2.Request.blank(path, headers=headers).get_response(app)
+
+    def setUp(self):
+       self.page_size = sdoapp.SITEMAP_PAGE_SIZE
+
+    def tearDown(self):
+       sdoapp.SITEMAP_PAGE_SIZE = self.page_size
+
+    def test_sitemap(self):
+       body = self.fetch("/sitemap.xml").body
+       urls = re.findall(r"<url><loc>([^<]+)</loc>(?:<lastmod>[^<]+</lastmod>)?<priority>([^<]+)</priority></url>", body)
+       self.assertEqual( len(urls), body.count("<url>") )
+       locs = dict(urls)
+       self.assertTrue( "http://localhost/Person" in locs and "http://localhost/modelDate" not in locs )
+       self.assertTrue( float(locs["http://localhost/Person"]) > float(locs["http://localhost/Abdomen"]), "More used terms get a higher priority." )
+       self.assertTrue( "<loc>http://localhost/Person</loc><lastmod>2015-05-13</lastmod>" in body, "Unchanged since 2.0." )
+       loaded = sdoapp.GraphLoadedDate()
+       self.assertTrue( "<loc>http://localhost/lyrics</loc><lastmod>%s</lastmod>" % loaded in body, "Added since 2.0." )
+       self.assertTrue( "http://localhost/modelDate\n" in self.fetch("/sitemap.txt?ext=auto").body )
+
+    def test_linked_changes(self):
+       lastmods = sdoapp.SitemapLastModified(["core"])
+       self.assertEqual( lastmods.get("Person"), "2015-05-13" )
+       # +lyrics rangeIncludes CreativeWork, +lyrics domainIncludes MusicComposition,
+       # +BroadcastService subClassOf Service, -BroadcastService subClassOf Thing
+       for id in ["CreativeWork", "MusicComposition", "Service", "Thing"]:
+           self.assertFalse( id in lastmods, id )
+       body = self.fetch("/sitemap.xml").body
+       self.assertTrue( "<loc>http://localhost/CreativeWork</loc><lastmod>%s</lastmod>" % sdoapp.GraphLoadedDate() in body )
+
+    def test_unknown_usage(self):
+       node = Unit.GetUnit("Abdomen")
+       usage = node.usage
+       try:
+           for value in [None, "", "n/a"]:
+               node.usage = value
+               self.assertEqual( usageRank(node), 0 )
+               self.assertTrue( "<loc>http://localhost/Abdomen</loc><priority>0.50</priority>" in u"".join(SitemapXML("http://localhost/", [node], {})) )
+       finally:
+           node.usage = usage
+
+    def test_etag(self):
+       for key in ["Sitemap:http://localhost/:core:sitemap.txt", "Sitemap:http://localhost/:core:sitemap.txt:etag"]:
+           if key in DataCache:
+               del DataCache[key]
+       first = self.fetch("/sitemap.txt")
+       self.assertTrue( first.headers.get("ETag"), "The first response has an ETag too." )
+       cached = self.fetch("/sitemap.txt")
+       self.assertEqual( (cached.body, cached.headers["ETag"]), (first.body, first.headers["ETag"]) )
+       self.assertEqual( self.fetch("/sitemap.txt", { "If-None-Match": cached.headers["ETag"] }).status_int, 304 )
+
+    def test_pagination(self):
+       sdoapp.SITEMAP_PAGE_SIZE = 1000
+       index = self.fetch("/sitemap.xml?ext=bib").body
+       pages = re.findall(r"<sitemap><loc>http://localhost/(sitemap-\d+\.xml)</loc></sitemap>", index)
+       self.assertEqual( pages, ["sitemap-1.xml", "sitemap-2.xml"] )
+       counts = [self.fetch("/%s?ext=bib" % p).body.count("<url>") for p in pages]
+       self.assertEqual( counts[0], 1000 )
+       self.assertEqual( sum(counts), self.fetch("/sitemap.txt?ext=bib").body.count("\n") )
+       self.assertEqual( self.fetch("/sitemap-3.xml?ext=bib").status_int, 404 )
+
+
+class AutocompleteTests(unittest.TestCase):
+
+    def ids(self, query, layers=["core"], limit=10):
+       return [id for (id, types) in GetTermLookup(layers).lookup(query, limit)]
+
+    def test_prefix(self):
+       ids = self.ids("pers", limit=50)
+       self.assertTrue( "Person" in ids )
+       self.assertEqual( ids, self.ids("PERS", limit=50), "Case doesn't matter." )
+       self.assertTrue( all(id.lower().startswith("pers") for id in ids) )
+       self.assertEqual( self.ids("url")[0], "url", "An exact match comes first." )
+       self.assertEqual( self.ids(""), [] )
+       self.assertEqual( self.ids("zzzz"), [] )
+
+    def test_humps(self):
+       self.assertEqual( self.ids("LoBu")[0], "LocalBusiness" )
+       self.assertTrue( "LodgingBusiness" in self.ids("LoBu") )
+       self.assertTrue( "CreativeWork" in self.ids("CrWo") )
+       self.assertTrue( "dateModified" in self.ids("daMo") )
+
+    def test_usage_ranking(self):
+       ids = self.ids("p", limit=50)
+       usage = [int(Unit.GetUnit(id).usage or 0) for id in ids]
+       self.assertEqual( len(ids), 50 )
+       self.assertTrue( usage.index(max(usage)) < usage.index(min(usage)), "More used terms come first." )
+
+    def test_layers(self):
+       self.assertFalse( "modelDate" in self.ids("modelD") )
+       self.assertTrue( "modelDate" in self.ids("modelD", ["core", "auto"]) )
+
+    def test_endpoint(self):
+       body = json.loads(webapp2.Request.blank("/docs/autocomplete.json?q=LoBu&limit=1").get_response(app).body)
+       self.assertEqual( body["terms"], [{ "id": "LocalBusiness", "types": ["rdfs:Class"] }] )
+       response = webapp2.Request.blank("/docs/autocomplete.json?q=mod&ext=auto&limit=500").get_response(app)
+       self.assertEqual( response.headers["Content-Type"], "application/json" )
+       self.assertTrue( "modelDate" in [t["id"] for t in json.loads(response.body)["terms"]] )
+
+
+class SearchTests(unittest.TestCase):
+
+    def ids(self, query, layers=["core"]):
+       return [id for (score, id) in SearchTerms(query, layers)]
+
+    def test_search(self):
+       self.assertEqual( self.ids("opening hours")[0], "openingHoursSpecification" )
+       self.assertTrue( "OpeningHoursSpecification" in self.ids('"opening hours"') )
+       self.assertTrue( "LocalBusiness" in self.ids("local business"), "Ids are searched by their words." )
+       self.assertEqual( self.ids("xyzzy"), [] )
+       self.assertFalse( "ComicIssue" in self.ids("comic issues") )
+       self.assertTrue( "ComicIssue" in self.ids("comic issues", ["core", "bib"]) )
+
+    def test_patch_updates_index(self):
+       index = GetSearchIndex(["core"])
+       edit = [("bookEdition", "rdfs:comment", "Patched with a zorbling comment.")]
+       PatchTriples(additions=edit)
+       try:
+           self.assertTrue( GetSearchIndex(["core"]) is index, "The index is updated, not rebuilt." )
+           self.assertEqual( self.ids("zorbling"), ["bookEdition"] )
+       finally:
+           PatchTriples(removals=edit)
+       self.assertEqual( self.ids("zorbling"), [] )
+       self.assertTrue( "bookEdition" in self.ids("edition") )
+
+    def test_release_indexes_bounded(self):
+       class SmallGraph:
+           def __init__(self, version):
+               self.version = version
+               self.nodes = {}
+       versions = ["test-%s" % n for n in range(api.SEARCH_RELEASES_INDEXED + 2)]
+       live = GetSearchIndex(["core"])
+       try:
+           for version in versions:
+               with UsingGraph(SmallGraph(version)):
+                   GetSearchIndex(["core"])
+           kept = [key.split(":")[0] for key in api.search_indexes if not key.startswith("latest:")]
+           self.assertEqual( kept, versions[-api.SEARCH_RELEASES_INDEXED:] )
+           self.assertTrue( GetSearchIndex(["core"]) is live, "The live graph's index is kept." )
+       finally:
+           for key in api.search_indexes.keys():
+               if key.startswith("test-"):
+                   del api.search_indexes[key]
+
+    def test_endpoint(self):
+       body = json.loads(webapp2.Request.blank("/docs/search.json?q=opening+hours&limit=1").get_response(app).body)
+       self.assertEqual( body["query"], "opening hours" )
+       self.assertEqual( [r["id"] for r in body["results"]], ["openingHoursSpecification"] )
+       self.assertEqual( body["results"][0]["comment"], "The opening hours of a certain place." )
+
+
+class SpellingSuggestionTests(unittest.TestCase):
+
+    def test_edit_distance(self):
+       self.assertEqual( EditDistance("person", "persn"), 1 )
+       self.assertEqual( EditDistance("person", "preson"), 1, "A swap is one edit." )
+       self.assertEqual( EditDistance("kitten", "sitting"), 3 )
+       self.assertEqual( EditDistance("", "abc"), 3 )
+       self.assertTrue( EditDistance("kitten", "sitting", 1) > 1 )
+
+    def test_suggestions(self):
+       index = GetSpellingIndex(["core"])
+       self.assertEqual( index.suggest("Persn"), ["Person"] )
+       self.assertEqual( index.suggest("locaBusiness"), ["LocalBusiness"] )
+       self.assertEqual( index.suggest("CreativWrok"), ["CreativeWork"] )
+       self.assertEqual( index.suggest("zzzzqqq"), [] )
+       self.assertEqual( index.suggest("x" * 500), [] )
+       self.assertEqual( index.suggest("Preson")[0], "Person", "The most used of the closest terms comes first." )
+       self.assertEqual( index.suggest("modelDat"), [] )
+       self.assertEqual( GetSpellingIndex(["core", "auto"]).suggest("modelDat"), ["modelDate"] )
+       self.assertTrue( "persn" in index.remembered )
+
+    def test_suggestions_from_many_threads(self):
+       index = api.SpellingIndex(["core"])
+       errors = []
+       def suggest(n):
+           try:
+               for i in range(300):
+                   index.suggest("Persn%s%s" % (n, i % 20))
+           except Exception as e:
+               errors.append(e)
+       remembered, api.SPELLING_REMEMBERED = api.SPELLING_REMEMBERED, 10
+       interval = sys.getcheckinterval()
+       sys.setcheckinterval(1) # switch threads as often as possible
+       try:
+           threads = [threading.Thread(target=suggest, args=(n,)) for n in range(4)]
+           for t in threads:
+               t.start()
+           for t in threads:
+               t.join()
+       finally:
+           sys.setcheckinterval(interval)
+           api.SPELLING_REMEMBERED = remembered
+       self.assertEqual( errors, [] )
+       self.assertTrue( len(index.remembered) <= 10 )
+
+    def test_404_page(self):
+       response = webapp2.Request.blank("/Persn").get_response(app)
+       self.assertEqual( response.status_int, 404 )
+       self.assertTrue( 'Did you mean: <a href="/Person">Person</a>?' in response.body )
+       self.assertTrue( 'Did you mean: <a href="/modelDate">modelDate</a>?' in webapp2.Request.blank("/modelDat").get_response(app).body )
+
+
+class RedirectTests(unittest.TestCase):
+
+    def fetch(self, path):
+       status, headers, body = webapp2.Request.blank(path).call_application(app) # get_response would reset Cache-Control
+       return int(status.split()[0]), dict(headers)
+
+    def test_table(self):
+       table = GetRedirectTable()
+       self.assertEqual( table.target("person"), "Person" )
+       self.assertEqual( table.target("LOCALBUSINESS"), "LocalBusiness" )
+       self.assertEqual( table.target("actors"), "actor" )
+       self.assertEqual( table.target("ACTORS"), "actor", "Other spellings of a superseded term go to its successor." )
+       self.assertEqual( table.target("Person"), None )
+       self.assertEqual( table.target("Url"), None, "url and URL are both terms." )
+       self.assertEqual( table.target("NoSuchTerm"), None )
+
+    def test_redirects(self):
+       status, headers = self.fetch("/localbusiness?ext=bib")
+       self.assertEqual( status, 301 )
+       self.assertEqual( headers["Location"], "http://localhost/LocalBusiness?ext=bib" )
+       self.assertEqual( headers["Cache-Control"], "public, max-age=43200" )
+       self.assertEqual( self.fetch("/actors")[1]["Location"], "http://localhost/actor" )
+       self.assertEqual( self.fetch("/LocalBusiness")[0], 200 )
+       self.assertEqual( self.fetch("/version/2.0/actors")[0], 200, "Releases keep their own terms." )
+
+    def test_data_redirects(self):
+       status, headers = self.fetch("/person.ttl?ext=bib")
+       self.assertEqual( status, 301 )
+       self.assertEqual( headers["Location"], "http://localhost/Person.ttl?ext=bib" )
+       self.assertEqual( self.fetch("/actors.jsonld")[1]["Location"], "http://localhost/actor.jsonld" )
+       self.assertEqual( self.fetch("/Person.ttl")[0], 200 )
+       self.assertEqual( self.fetch("/person.html")[0], 404, "Only the data formats' extensions are kept." )
+
+
+class PropertyPathTests(unittest.TestCase):
+
+    def paths(self, start, goal, hops=3, layers=["core"]):
+       return [" > ".join("%s:%s" % step for step in path) for path in GetPropertyGraph(layers).paths(start, goal, hops, limit=100)]
+
+    def test_direct(self):
+       self.assertEqual( self.paths("Event", "Place"), ["location:Place"] )
+       self.assertEqual( self.paths("Flight", "Airport"), ["arrivalAirport:Airport", "departureAirport:Airport"] )
+       self.assertTrue( "subEvent:Event" in self.paths("Event", "Event") )
+
+    def test_inheritance(self):
+       self.assertTrue( "location:Place" in self.paths("MusicEvent", "Place"), "Properties of supertypes apply." )
+       self.assertTrue( "location:Place" in self.paths("Event", "LocalBusiness"), "A LocalBusiness can be a location." )
+       self.assertTrue( "author:Person > nationality:Country" in self.paths("Book", "Country") )
+       self.assertFalse( "about:Thing" in self.paths("Book", "Country"), "Ranges of supertypes only when nothing else fits." )
+
+    def test_longer_paths(self):
+       paths = self.paths("Offer", "GeoCoordinates")
+       self.assertTrue( "availableAtOrFrom:Place > geo:GeoCoordinates" in paths )
+       self.assertTrue( all(p.count(">") == 1 for p in paths), "Only the shortest paths." )
+       self.assertEqual( self.paths("Offer", "GeoCoordinates", hops=1), ["category:Thing"] )
+       self.assertEqual( self.paths("Boolean", "Place"), [] )
+
+    def test_paths_from_many_threads(self):
+       graph = api.PropertyGraph(["core"])
+       goals = ["Place", "Person", "Organization", "Country", "Offer", "Event", "CreativeWork", "Thing"]
+       errors = []
+       def paths(start):
+           try:
+               for i in range(100):
+                   graph.paths(start, goals[i % len(goals)], hops=1)
+           except Exception as e:
+               errors.append(e)
+       remembered, api.PATH_REMEMBERED = api.PATH_REMEMBERED, 5
+       interval = sys.getcheckinterval()
+       sys.setcheckinterval(1) # switch threads as often as possible
+       try:
+           threads = [threading.Thread(target=paths, args=(start,)) for start in ["Event", "Book", "Person", "Offer"]]
+           for t in threads:
+               t.start()
+           for t in threads:
+               t.join()
+       finally:
+           sys.setcheckinterval(interval)
+           api.PATH_REMEMBERED = remembered
+       self.assertEqual( errors, [] )
+       self.assertTrue( len(graph.remembered) <= 5 )
+
+    def test_endpoint(self):
+       body = json.loads(webapp2.Request.blank("/docs/paths.json?from=Event&to=Place").get_response(app).body)
+       self.assertEqual( body["paths"], [[{ "property": "location", "type": "Place" }]] )
+       self.assertEqual( webapp2.Request.blank("/docs/paths.json?from=Event&to=NoSuchType").get_response(app).status_int, 404 )
+       body = json.loads(webapp2.Request.blank("/docs/paths.json?from=ComicIssue&to=Person&ext=bib").get_response(app).body)
+       self.assertTrue( { "property": "artist", "type": "Person" } in [step for path in body["paths"] for step in path] )
+
+
+class InheritedApplicabilityTests(unittest.TestCase):
+
+    def ids(self, terms):
+       return [t.id for t in terms]
+
+    def test_applicable_properties(self):
+       restaurant = Unit.GetUnit("Restaurant")
+       ids = self.ids(GetApplicableProperties(restaurant))
+       self.assertEqual( ids, sorted(ids) )
+       for p in ["acceptsReservations", "openingHours", "address", "founder", "name"]: # Restaurant, LocalBusiness, Place, Organization, Thing
+           self.assertTrue( p in ids, p )
+       inherited = set()
+       for path in GetParentList(restaurant):
+           for cl in path:
+               inherited.update(p.id for p in GetSources(Unit.GetUnit("domainIncludes"), cl) if not p.superseded())
+       self.assertEqual( set(ids), inherited )
+
+    def test_superseded(self):
+       movie = Unit.GetUnit("Movie")
+       self.assertFalse( "actors" in self.ids(GetApplicableProperties(movie)) )
+       self.assertTrue( "actors" in self.ids(GetApplicableProperties(movie, superseded=True)) )
+
+    def test_incoming_properties(self):
+       ids = self.ids(GetIncomingProperties(Unit.GetUnit("LocalBusiness")))
+       self.assertTrue( "location" in ids and "worksFor" in ids, "Properties expecting a Place or an Organization." )
+       self.assertFalse( "address" in ids )
+
+    def test_inherited_domain_and_range(self):
+       domain = self.ids(GetInheritedDomain(Unit.GetUnit("address")))
+       self.assertTrue( "Person" in domain and "Restaurant" in domain )
+       self.assertFalse( "Event" in domain )
+       self.assertEqual( self.ids(GetInheritedRange(Unit.GetUnit("location"))),
+                         sorted(set(self.ids(GetInheritedRange(Unit.GetUnit("location")))) ) )
+       self.assertTrue( "Restaurant" in self.ids(GetInheritedRange(Unit.GetUnit("location"))) )
+       self.assertFalse( "modelDate" in self.ids(GetApplicableProperties(Unit.GetUnit("Car"))) )
+       self.assertTrue( "modelDate" in self.ids(GetApplicableProperties(Unit.GetUnit("Car"), ["core", "auto"])) )
+
+    def test_endpoint(self):
+       body = json.loads(webapp2.Request.blank("/docs/inherited.json?term=Restaurant").get_response(app).body)
+       self.assertTrue( "address" in body["properties"] and "location" in body["incoming"] )
+       body = json.loads(webapp2.Request.blank("/docs/inherited.json?term=address").get_response(app).body)
+       self.assertEqual( body["range"], ["PostalAddress"] )
+       self.assertEqual( webapp2.Request.blank("/docs/inherited.json?term=modelDate").get_response(app).status_int, 404 )
+
 
 # TODO: Unwritten tests
 #
@@ -423,5 +1261,90 @@ class AdvancedJSONLDTests(unittest.TestCase):
 # * make sure terms match their labels (e.g. priceRange), with or without whitespace?
 # * check we don't assign more than one example to the same ID
 
+class ValidatorTests(unittest.TestCase):
+
+    def codes(self, item):
+       return sorted((d["code"], d["term"], d["path"]) for d in ValidateItem(item))
+
+    def test_valid_item(self):
+       item = { "@context": "http://schema.org", "@type": "Restaurant", "name": "Chez Nous", "acceptsReservations": True,
+                "address": { "@type": "PostalAddress", "streetAddress": "1 Rue" }, "founder": { "@type": "Person", "birthDate": "1970-01-01" } }
+       self.assertEqual( self.codes(item), [] )
+
+    def test_types_and_properties(self):
+       self.assertEqual( self.codes({ "@type": "Restaurnt", "nme": "X" }), [("unknown-property", "nme", "nme"), ("unknown-type", "Restaurnt", "")] )
+       self.assertEqual( self.codes({ "@type": "Movie", "startDate": "2015-01-01" }), [("not-applicable", "startDate", "startDate")] )
+       self.assertEqual( self.codes({ "@type": "http://example.org/Widget", "ex:size": 1 }), [], "Other vocabularies are not checked." )
+
+    def test_ranges(self):
+       self.assertEqual( self.codes({ "@type": "Offer", "seller": { "@type": "PostalAddress" } }), [("range-mismatch", "seller", "seller")] )
+       self.assertEqual( self.codes({ "@type": "Offer", "seller": { "@type": "Corporation" } }), [], "A subtype of the range will do." )
+       self.assertEqual( self.codes({ "@type": "Person", "birthDate": "1970-13" }), [("invalid-literal", "birthDate", "birthDate")] )
+       self.assertEqual( self.codes({ "@type": "Movie", "director": "Someone" }), [("literal-for-item", "director", "director")] )
+
+    def test_reduced_precision_dates_and_durations(self):
+       for date in ["1970", "1970-01", "1970-01-01", "1970-01-01T12:00:00Z"]:
+           self.assertEqual( self.codes({ "@type": "Person", "birthDate": date }), [], date )
+       self.assertEqual( self.codes({ "@type": "Recipe", "cookTime": "PT2H", "prepTime": "P1DT30M" }), [] )
+       self.assertEqual( self.codes({ "@type": "Recipe", "cookTime": "2 hours" }), [("invalid-literal", "cookTime", "cookTime")] )
+       self.assertEqual( self.codes({ "@type": "Recipe", "cookTime": { "@type": "Duration" } }), [], "A Duration item still does." )
+
+    def test_deep_nesting(self):
+       nested = { "@type": "Person", "knows": [[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[[{ "@type": "Person" }]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]]] }
+       self.assertEqual( self.codes(nested), [("too-deep", "knows", "knows")] )
+       nested = [{ "@type": "Person" }]
+       for i in range(5000):
+           nested = [nested]
+       self.assertEqual( self.codes(nested)[0][0], "too-deep" )
+
+    def test_enumerations(self):
+       self.assertEqual( self.codes({ "@type": "Offer", "availability": "http://schema.org/InStock" }), [] )
+       self.assertEqual( self.codes({ "@type": "Offer", "availability": { "@id": "InStok" } }), [("invalid-enumeration-value", "availability", "availability")] )
+       self.assertEqual( self.codes({ "@type": "Offer", "availability": "NewCondition" }), [("invalid-enumeration-value", "availability", "availability")],
+                         "A member of another enumeration." )
+
+    def test_superseded_and_nesting(self):
+       self.assertEqual( self.codes({ "@graph": [ { "@type": "Movie", "actors": [ { "@type": "Person" }, { "name": "A" } ] } ] }),
+                         [("missing-type", "actors", "@graph[0].actors[1]"), ("superseded", "actors", "@graph[0].actors")] )
+       microdata = { "items": [ { "type": [ "http://schema.org/Person" ], "properties": { "worksFor": [ { "type": [ "http://schema.org/Place" ], "properties": {} } ] } } ] }
+       self.assertEqual( self.codes(microdata), [("range-mismatch", "worksFor", "items[0].worksFor")] )
+
+    def test_summary(self):
+       validator = Validator(GetValidationTables())
+       for item in [ { "@type": "Restaurnt" }, { "@type": "Restaurnt" }, { "@type": "Person", "nme": "X" }, { "@type": "Person" } ]:
+           validator.validate(item)
+       other = ValidationSummary()
+       other.add([ { "severity": "error", "code": "unknown-type", "term": "Restaurnt" } ])
+       validator.summary.merge(other)
+       report = validator.summary.report()
+       self.assertEqual( (report["items"], report["invalid"], report["errors"]), (5, 4, 4) )
+       self.assertEqual( report["counts"], { "unknown-type": { "Restaurnt": 3 }, "unknown-property": { "nme": 1 } } )
+       self.assertTrue( report["itemsPerSecond"] > 0 )
+
+    def test_summary_terms_are_capped(self):
+       summary = ValidationSummary()
+       for i in range(validator.SUMMARY_MAX_TERMS + 5):
+           summary.add([ { "severity": "error", "code": "unknown-type", "term": "T%d" % i } ])
+       summary.add([ { "severity": "error", "code": "unknown-type", "term": "T0" } ])
+       terms = summary.counts["unknown-type"]
+       self.assertEqual( (len(terms), terms["T0"], terms[validator.OTHER_TERMS]), (validator.SUMMARY_MAX_TERMS + 1, 2, 5) )
+
+    def test_lines(self):
+       validator = Validator(GetValidationTables())
+       lines = [ '{"item": {"@type": "Person"}}\n', '\n', '{"item": {"@type": "Persn"}}\n', '{"item": \n', '{"other": {}}\n' ]
+       reports = ValidateLines(validator, lines, 10, field="item")
+       self.assertEqual( [(n, [d["code"] for d in diagnostics]) for (n, diagnostics) in reports],
+                         [(12, ["unknown-type"]), (13, ["invalid-json"]), (14, ["invalid-json"])] )
+       self.assertEqual( (validator.summary.items, validator.summary.invalid), (4, 3) )
+
+    def test_lines_that_are_not_items(self):
+       validator = Validator(GetValidationTables())
+       lines = [ '5\n', 'null\n', '"x"\n', "[" * 5000 + "]" * 5000 + "\n", '{"@type": "Person"}\n' ]
+       reports = ValidateLines(validator, lines)
+       self.assertEqual( [(n, [d["code"] for d in diagnostics]) for (n, diagnostics) in reports],
+                         [(1, ["invalid-json"]), (2, ["invalid-json"]), (3, ["invalid-json"]), (4, ["invalid-json"])] )
+       self.assertEqual( validator.summary.items, 5 )
+
+
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,265 @@
+# -*- coding: UTF-8 -*-
+import unittest
+import os
+import shutil
+import tempfile
+import logging # https://docs.python.org/2/library/logging.html#logging-levels
+import sys
+sys.path.append( os.getcwd() )
+
+from caches import *
+import caches
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Tests for the cache backends. These don't need the schema graph, or App Engine.
+
+class BackendContractMixin:
+    """Checks every backend must pass; subclasses provide self.backend."""
+
+    def test_roundtrip(self):
+      self.backend.set("k1", u"café <b>bar</b>")
+      self.assertEqual( self.backend.get("k1"), u"café <b>bar</b>", "Backend should return the text it stored." )
+
+    def test_miss(self):
+      self.assertEqual( self.backend.get("no-such-key"), None, "Unknown keys should miss." )
+
+    def test_delete(self):
+      self.backend.set("k2", u"x")
+      self.backend.delete("k2")
+      self.assertEqual( self.backend.get("k2"), None, "Deleted keys should miss." )
+
+
+
+class DictBackendTests(BackendContractMixin, unittest.TestCase):
+
+    def setUp(self):
+      self.backend = DictBackend()
+
+    def test_clear(self):
+      self.backend.set("k3", u"x")
+      self.backend.clear()
+      self.assertEqual( self.backend.get("k3"), None, "clear() should drop everything." )
+
+
+class DirectoryBackendTests(BackendContractMixin, unittest.TestCase):
+
+    def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.backend = DirectoryBackend(self.directory)
+
+    def tearDown(self):
+      shutil.rmtree(self.directory)
+
+    def test_shared_between_instances(self):
+      DirectoryBackend(self.directory).set("shared", u"hello")
+      self.assertEqual( self.backend.get("shared"), u"hello", "Another process's entries should be visible." )
+
+    def test_clear_by_generation(self):
+      c = Cache("test-clear-dir", self.backend)
+      c["Person"] = u"<html>Person</html>"
+      self.backend.set("other:key", u"x")
+      c.clear()
+      self.assertEqual( c.get("Person"), None )
+      self.assertEqual( self.backend.get("other:key"), u"x", "A namespace's clear leaves the rest of the directory alone." )
+
+
+class MemcacheBackendTests(BackendContractMixin, unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+      self.server = LocalMemcacheServer().start()
+
+    @classmethod
+    def tearDownClass(self):
+      self.server.shutdown()
+      self.server.server_close()
+
+    def setUp(self):
+      self.backend = MemcacheBackend([self.server.address()])
+
+    def tearDown(self):
+      self.backend.close()
+
+    def test_oversized_value_refused(self):
+      self.assertFalse( self.backend.set("big", u"x" * (MEMCACHE_MAX_ITEM + 1)), "Items over the size limit should be refused." )
+
+    def test_clear_keeps_other_namespaces(self):
+      pages = Cache("test-clear-page", self.backend)
+      other = Cache("test-clear-data", self.backend)
+      elsewhere = Cache("test-clear-page", MemcacheBackend([self.server.address()])) # another instance
+      pages["Person"] = u"<html>Person</html>"
+      other["Person"] = u"<html>data</html>"
+      self.assertEqual( elsewhere.get("Person"), u"<html>Person</html>" )
+      pages.clear()
+      self.assertEqual( pages.get("Person"), None )
+      self.assertEqual( other.get("Person"), u"<html>data</html>", "Other namespaces on the server should survive a clear." )
+      self.assertEqual( elsewhere.get("Person"), u"<html>Person</html>", "Other instances follow a clear only after GENERATION_CHECK_INTERVAL." )
+      elsewhere.generation_checked = 0
+      self.assertEqual( elsewhere.get("Person"), None )
+      pages["Person"] = u"<html>new</html>"
+      self.assertEqual( elsewhere.get("Person"), u"<html>new</html>", "Instances share entries again after a clear." )
+      elsewhere.backend.close()
+
+    def test_unreachable_server_is_a_miss(self):
+      backend = MemcacheBackend(["127.0.0.1:1"], timeout=0.5)
+      self.assertEqual( backend.get("anything"), None, "An unreachable server should behave as a miss." )
+      self.assertFalse( backend.set("anything", u"x"), "An unreachable server should refuse writes." )
+
+
+class CacheNamespaceTests(unittest.TestCase):
+
+    def setUp(self):
+      self.saved_version = caches.graph_version
+
+    def tearDown(self):
+      SetGraphVersion(self.saved_version)
+
+    def test_dict_like(self):
+      c = Cache("test-dict", DictBackend())
+      c["a"] = u"text"
+      self.assertTrue( "a" in c )
+      self.assertEqual( c["a"], u"text" )
+      del c["a"]
+      self.assertEqual( c.get("a"), None )
+
+    def test_non_text_stays_local(self):
+      backend = DictBackend()
+      c = Cache("test-local", backend)
+      c["units"] = [1, 2, 3]
+      self.assertEqual( c.get("units"), [1, 2, 3] )
+      self.assertEqual( len(backend.store), 0, "Non-text values should not reach the backend." )
+
+    def test_versioned_keys(self):
+      backend = DictBackend()
+      first = Cache("test-version", backend)
+      second = Cache("test-version", backend)
+      SetGraphVersion("snapshot-a")
+      first["Person"] = u"<html>a</html>"
+      self.assertEqual( second.get("Person"), u"<html>a</html>", "Same graph version should share entries." )
+      backend.shared = True # keep entries across the version change, as a shared backend would
+      SetGraphVersion("snapshot-b")
+      self.assertEqual( second.get("Person"), None, "Entries from another graph version must not be served." )
+
+    def test_scopes_keep_entries_apart(self):
+      c = Cache("test-scope", DictBackend())
+      c["Person"] = u"<html>live</html>"
+      with CacheScope("v2.0"):
+        self.assertEqual( c.get("Person"), None, "A scope should not see entries from outside it." )
+        c["Person"] = u"<html>2.0</html>"
+        c["units"] = [1]
+        self.assertEqual( c["Person"], u"<html>2.0</html>" )
+      self.assertEqual( c["Person"], u"<html>live</html>" )
+      self.assertEqual( c.get("units"), None )
+      with CacheScope("v2.0"):
+        del c["Person"]
+      self.assertEqual( c["Person"], u"<html>live</html>" )
+      self.assertEqual( c.invalidate(["*"]), 2, "Invalidation reaches entries in every scope." )
+
+    def test_unsafe_keys_hashed(self):
+      c = Cache("test-keys", DictBackend())
+      self.assertTrue( " " not in c.backendKey("['core', 'bib']:Person"), "Backend keys must not contain whitespace." )
+
+
+class CacheDependencyTests(unittest.TestCase):
+
+    def test_recorded_entries_evicted_by_term(self):
+      c = Cache("test-deps", DictBackend())
+      with DependencyRecording():
+        NoteDependency("Book")
+        c["Book"] = u"<html>Book</html>"
+      with DependencyRecording():
+        NoteDependency("Person")
+        c["Person"] = u"<html>Person</html>"
+      self.assertEqual( c.invalidate(["Book"]), 1 )
+      self.assertEqual( c.get("Book"), None )
+      self.assertEqual( c.get("Person"), u"<html>Person</html>", "Entries not built from the term should survive." )
+
+    def test_untracked_entries_always_evicted(self):
+      c = Cache("test-untracked", DictBackend())
+      c["x"] = u"built outside any recording"
+      c.invalidate(["anything"])
+      self.assertEqual( c.get("x"), None )
+
+    def test_hits_and_nested_recordings_propagate(self):
+      c = Cache("test-nested", DictBackend())
+      with DependencyRecording():
+        NoteDependency("bookEdition")
+        c["row"] = u"<tr/>"
+      with DependencyRecording() as page:
+        NoteDependency("Book")
+        c.get("row")
+        with DependencyRecording():
+          NoteDependency("Thing")
+      self.assertEqual( page.dependencies, set(["Book", "bookEdition", "Thing"]) )
+
+    def test_recordings_kept_apart(self):
+      with DependencyRecording() as page:
+        NoteDependency("Book")
+        with DependencyRecording(propagate=False) as lookup:
+          NoteDependency("*")
+      self.assertEqual( lookup.dependencies, set(["*"]) )
+      self.assertEqual( page.dependencies, set(["Book"]) )
+
+class CacheStatsTests(unittest.TestCase):
+
+    def test_counters(self):
+      c = Cache("test-stats", DictBackend())
+      self.assertEqual( c.get("Person"), None )
+      c["Person"] = u"<html>Person</html>"
+      c.get("Person")
+      c.get("Person")
+      del c["Person"]
+      stats = c.stats()
+      self.assertEqual( (stats["hits"], stats["misses"], stats["inserts"], stats["evictions"]), (2, 1, 1, 1) )
+      self.assertEqual( stats["renders"], 1, "A miss followed by an insert should count as one render." )
+      self.assertEqual( stats["hottest"], [["Person", 2]] )
+
+    def test_bytes_held(self):
+      c = Cache("test-bytes", DictBackend())
+      c["a"] = u"12345"
+      c["b"] = u"123"
+      c["a"] = u"1"
+      self.assertEqual( c.stats()["bytes"], 4, "Overwritten entries should not count twice." )
+      self.assertEqual( c.stats()["entries"], 2 )
+
+    def test_hot_keys_bounded(self):
+      c = Cache("test-hot", DictBackend())
+      c["hot"] = u"x"
+      for i in range(5):
+          c.get("hot")
+      for i in range(caches.MAX_COUNTED_KEYS + 10):
+          c["k%d" % i] = u"x"
+          c.get("k%d" % i)
+      self.assertTrue( len(c.key_hits) <= caches.MAX_COUNTED_KEYS )
+      self.assertEqual( c.stats(1)["hottest"], [["hot", 5]], "The most hit keys should be kept." )
+
+    def test_stats_by_namespace(self):
+      Cache("test-stats-ns", DictBackend())
+      self.assertTrue( "test-stats-ns" in CacheStats() )
+
+
+class CaptureStreamTests(unittest.TestCase):
+
+    def test_stored_when_complete(self):
+      c = Cache("test-stream", DictBackend())
+      chunks = CaptureStream(c, "page", [u"<html>", u"</html>"])
+      self.assertEqual( next(chunks), u"<html>" )
+      self.assertEqual( c.get("page"), None, "Nothing should be cached before the stream ends." )
+      self.assertEqual( list(chunks), [u"</html>"] )
+      self.assertEqual( c.get("page"), u"<html></html>" )
+
+    def test_dependencies_of_chunks_kept(self):
+      c = Cache("test-stream-deps", DictBackend())
+      def pieces():
+        NoteDependency("Thing")
+        yield u"a"
+        NoteDependency("Person")
+        yield u"b"
+      list(CaptureStream(c, "page", pieces()))
+      self.assertEqual( c.deps["page"], frozenset(["Thing", "Person"]) )
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+import gzip
+import shutil
+import tempfile
+import logging # https://docs.python.org/2/library/logging.html#logging-levels
+import sys
+sys.path.append( os.getcwd() )
+
+import webob
+from fileserver import *
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Tests for serving files from disk. These don't need the schema graph, or App Engine.
+
+class ServeFileTests(unittest.TestCase):
+
+    def setUp(self):
+      self.dir = tempfile.mkdtemp()
+      self.path = os.path.join(self.dir, "schema.nt")
+      self.data = "".join("<http://schema.org/T%d> <http://schema.org/p> \"%d\" .\n" % (i, i) for i in range(5000))
+      with open(self.path, "wb") as f:
+          f.write(self.data)
+
+    def tearDown(self):
+      shutil.rmtree(self.dir)
+
+    def fetch(self, headers=None, path=None, vary=None):
+      request = webob.Request.blank("/schema.nt", headers=headers or {})
+      response = webob.Response()
+      if vary:
+          response.headers["Vary"] = vary
+      served = ServeFile(request, response, path or self.path, "application/n-triples", filename="schemaorg.nt")
+      return served, response
+
+    def test_whole_file(self):
+      served, response = self.fetch()
+      self.assertTrue( served )
+      self.assertEqual( response.status_int, 200 )
+      self.assertEqual( response.body, self.data )
+      self.assertEqual( response.headers["Content-Length"], str(len(self.data)) )
+      self.assertEqual( response.headers["Content-Disposition"], "attachment; filename=schemaorg.nt" )
+
+    def test_missing_file(self):
+      served, response = self.fetch(path=os.path.join(self.dir, "nothere.nt"))
+      self.assertFalse( served )
+
+    def test_conditional_get(self):
+      served, response = self.fetch()
+      self.assertEqual( self.fetch({ "If-None-Match": response.headers["ETag"] })[1].status_int, 304 )
+      self.assertEqual( self.fetch({ "If-Modified-Since": response.headers["Last-Modified"] })[1].status_int, 304 )
+      os.utime(self.path, (0, 0))
+      self.assertEqual( self.fetch({ "If-None-Match": response.headers["ETag"] })[1].status_int, 200, "A changed file gets a new ETag." )
+
+    def test_ranges(self):
+      served, response = self.fetch({ "Range": "bytes=70000-70099" })
+      self.assertEqual( response.status_int, 206 )
+      self.assertEqual( response.body, self.data[70000:70100] )
+      self.assertEqual( response.headers["Content-Range"], "bytes 70000-70099/%d" % len(self.data) )
+      self.assertEqual( self.fetch({ "Range": "bytes=-10" })[1].body, self.data[-10:] )
+      self.assertEqual( self.fetch({ "Range": "bytes=%d-" % len(self.data) })[1].status_int, 416 )
+      self.assertEqual( self.fetch({ "Range": "bytes=0-1,4-5" })[1].status_int, 200, "Multiple ranges get the whole file." )
+      self.assertEqual( self.fetch({ "Range": "bytes=0-9", "If-Range": '"old"' })[1].status_int, 200 )
+
+    def test_precompressed_copy(self):
+      self.assertEqual( self.fetch({ "Accept-Encoding": "gzip" })[1].body, self.data, "No .gz sibling yet." )
+      with open(self.path + ".gz", "wb") as f:
+          out = gzip.GzipFile("schema.nt", "wb", 9, f)
+          out.write(self.data)
+          out.close()
+      served, response = self.fetch({ "Accept-Encoding": "gzip" })
+      self.assertEqual( response.headers["Content-Encoding"], "gzip" )
+      self.assertTrue( len(response.body) < len(self.data) )
+      self.assertNotEqual( response.headers["ETag"], self.fetch()[1].headers["ETag"], "Each encoding has its own ETag." )
+      self.assertFalse( "Content-Encoding" in self.fetch({ "Accept-Encoding": "gzip", "Range": "bytes=0-9" })[1].headers )
+      os.utime(self.path + ".gz", (0, 0))
+      self.assertFalse( "Content-Encoding" in self.fetch({ "Accept-Encoding": "gzip" })[1].headers, "A stale .gz is not used." )
+
+    def test_accept_encoding_q_values(self):
+      for header, accepted in [("gzip", True), ("deflate, gzip;q=0.5", True), ("gzip;q=0", False), ("gzip; q=0.0, *", False),
+                               ("*", True), ("*;q=0", False), ("x-gzip", True), ("identity", False), ("", False), ("gzips", False)]:
+          self.assertEqual( AcceptsEncoding(header, "gzip"), accepted, header )
+      with open(self.path + ".gz", "wb") as f:
+          out = gzip.GzipFile("schema.nt", "wb", 9, f)
+          out.write(self.data)
+          out.close()
+      self.assertFalse( "Content-Encoding" in self.fetch({ "Accept-Encoding": "gzip;q=0" })[1].headers )
+
+    def test_vary_extended(self):
+      self.assertEqual( self.fetch()[1].headers["Vary"], "Accept-Encoding" )
+      self.assertEqual( self.fetch(vary="Accept")[1].headers["Vary"], "Accept, Accept-Encoding" )
+      self.assertEqual( self.fetch(vary="Accept, accept-encoding")[1].headers["Vary"], "Accept, accept-encoding" )
+
+    def test_file_wrapper(self):
+      request = webob.Request.blank("/schema.nt")
+      request.environ["wsgi.file_wrapper"] = lambda f, size: iter(lambda: f.read(size), "")
+      response = webob.Response()
+      ServeFile(request, response, self.path, "application/n-triples")
+      self.assertEqual( response.body, self.data )
+
+
+if __name__ == "__main__":
+  unittest.main()
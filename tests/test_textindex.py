@@ -0,0 +1,67 @@
+import unittest
+import os
+import logging # https://docs.python.org/2/library/logging.html#logging-levels
+import sys
+sys.path.append( os.getcwd() )
+
+from textindex import *
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Tests for the full-text index. These don't need the schema graph, or App Engine.
+
+class StemTests(unittest.TestCase):
+
+    def test_stems(self):
+      for words in [["organization", "organizations", "organize", "organized"], ["rating", "ratings", "rated", "rate"],
+                    ["open", "opening", "opens"], ["ship", "shipped", "shipping"], ["address", "addresses"]]:
+          self.assertEqual( len(set(Stem(w) for w in words)), 1, words )
+      self.assertNotEqual( Stem("price"), Stem("prize") )
+      self.assertEqual( Stem("gps"), "gps" )
+
+    def test_tokens(self):
+      self.assertEqual( Tokens(u"The name of the Items"), [(1, "name"), (4, "item")] )
+      self.assertEqual( PlainText(u'See <a href="/Thing">Thing</a> &amp; more.'), u"See  Thing  & more." )
+      self.assertEqual( PlainText(u"&#x41;&#66; &#xZZ; &#1114112; &bogus;"), u"AB &#xZZ; &#1114112; &bogus;" )
+
+class InvertedIndexTests(unittest.TestCase):
+
+    def setUp(self):
+      self.index = InvertedIndex()
+      self.index.add("openingHours", u"The opening hours of a business.")
+      self.index.add("opens", u"The time a business opens, during its opening hours.")
+      self.index.add("hoursAvailable", u"The hours during which this service is available, when opening.")
+      self.index.add("name", u"The name of the item.")
+
+    def ids(self, query):
+      return [id for (score, id) in self.index.search(query)]
+
+    def test_ranking(self):
+      self.assertEqual( self.ids("opening hours")[0], "openingHours", "The shortest document with both words wins." )
+      self.assertEqual( set(self.ids("hours")), set(["openingHours", "opens", "hoursAvailable"]) )
+      self.assertEqual( self.ids("named items"), ["name"] )
+      self.assertEqual( self.ids("the"), [], "Stop words alone find nothing." )
+      scores = [score for (score, id) in self.index.search("opening hours")]
+      self.assertEqual( scores, sorted(scores, reverse=True) )
+
+    def test_phrases(self):
+      self.assertEqual( set(self.ids('"opening hours"')), set(["openingHours", "opens"]) )
+      self.assertEqual( self.ids('"hours opening"'), [] )
+      self.assertEqual( self.ids('"name of the item"'), ["name"], "Stop words keep their places in a phrase." )
+
+    def test_updates(self):
+      self.index.add("name", u"The opening hours, renamed.")
+      self.assertTrue( "name" in self.ids("opening") )
+      self.assertEqual( self.ids("item"), [] )
+      self.index.remove("openingHours")
+      self.index.remove("nothere")
+      self.assertFalse( "openingHours" in self.ids("hours") )
+      self.assertEqual( len(self.index), 3 )
+      self.assertEqual( self.index.total_length, sum(self.index.lengths.values()) )
+      self.index.add("name", u"")
+      self.assertFalse( "name" in self.index )
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import re
+import math
+import heapq
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO) # dev_appserver.py --log_level debug .
+log = logging.getLogger(__name__)
+
+# A small full-text index: documents are (id, text) pairs, e.g. a term and its
+# rdfs:comment (see api.GetSearchIndex). Text is split into lowercased words,
+# stop words are dropped and the rest stemmed; each stem's postings give the
+# positions it occurs at in each document, so quoted phrases can be matched.
+# Queries are ranked with Okapi BM25.
+#
+# Documents can be replaced or removed one at a time, which is how the graph's
+# indexes follow a reload without being rebuilt.
+
+BM25_K1 = 1.2 # how quickly repeats of a word stop adding to the score
+BM25_B = 0.75 # how much longer documents are penalised
+
+word_re = re.compile(r"[^\W_]+", re.UNICODE)
+phrase_re = re.compile(r'"([^"]*)"')
+tag_re = re.compile(r'<[^>]*>')
+entity_re = re.compile(r'&(#?\w+);')
+entities = { "amp": u"&", "lt": u"<", "gt": u">", "quot": u'"', "apos": u"'", "nbsp": u" " }
+
+STOP_WORDS = frozenset("""a an and are as at be by for from has have in is it its of on or
+    that the this to was were which with""".split())
+
+# (suffix, replacement), longest first within each step; see Stem.
+STEP1_SUFFIXES = [("sses", "ss"), ("ies", "y"), ("ss", "ss"), ("s", "")]
+STEP2_SUFFIXES = [("ingly", ""), ("edly", ""), ("ing", ""), ("ed", "")]
+STEP3_SUFFIXES = [("ational", "ate"), ("ization", "ize"), ("fulness", "ful"), ("iveness", "ive"),
+    ("ousness", "ous"), ("ation", "ate"), ("ness", ""), ("ment", ""), ("ably", "able"),
+    ("ally", "al"), ("ity", ""), ("ly", "")]
+vowel_re = re.compile(r'[aeiouy]')
+
+MAX_STEMS_KEPT = 100000 # words whose stems are remembered, since stemming is most of the indexing time
+stems_kept = {}
+
+
+def PlainText(html):
+    """html without its tags, and with the common character references decoded."""
+    def entity(match):
+        name = match.group(1)
+        try:
+            if name.startswith("#x"):
+                return unichr(int(name[2:], 16))
+            if name.startswith("#"):
+                return unichr(int(name[1:]))
+        except ValueError: # not a number, or not a character; left as it is
+            return match.group(0)
+        return entities.get(name, match.group(0))
+    return entity_re.sub(entity, tag_re.sub(u" ", html))
+
+def stripSuffix(word, suffixes, minimum=3):
+    for suffix, replacement in suffixes:
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)] + replacement
+            if len(stem) >= minimum and vowel_re.search(stem):
+                return stem
+            return word
+    return word
+
+def Stem(word):
+    """A light suffix-stripping stemmer for English: "organizations" -> "organize", "opening" -> "open".
+
+    Not Porter's algorithm, but its first steps: enough to bring plurals,
+    verb forms and the common derived nouns of a word together.
+    """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    word = stripSuffix(word, STEP1_SUFFIXES)
+    stem = stripSuffix(word, STEP2_SUFFIXES)
+    if stem != word:
+        if stem[-2:] in ["at", "bl", "iz"]: # "rating" -> "rat" -> "rate"
+            stem += "e"
+        elif len(stem) > 3 and stem[-1] == stem[-2] and stem[-1] not in "lsz": # "shipped" -> "shipp" -> "ship"
+            stem = stem[:-1]
+    return stripSuffix(stem, STEP3_SUFFIXES, 4)
+
+def Tokens(text):
+    """(position, stem) for each word of text that isn't a stop word. Positions count every word."""
+    tokens = []
+    for position, match in enumerate(word_re.finditer(text)):
+        word = match.group(0).lower()
+        if word in STOP_WORDS:
+            continue
+        stem = stems_kept.get(word)
+        if stem is None:
+            stem = Stem(word)
+            if len(stems_kept) < MAX_STEMS_KEPT:
+                stems_kept[word] = stem
+        tokens.append((position, stem))
+    return tokens
+
+
+class InvertedIndex:
+    """Positional postings for a set of documents, searched with BM25. Safe to update while it is being searched."""
+
+    def __init__(self):
+        self.postings = {} # stem -> { document id -> [positions] }
+        self.lengths = {} # document id -> number of indexed words
+        self.stems = {} # document id -> its distinct stems, to remove it again
+        self.total_length = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __contains__(self, id):
+        return id in self.lengths
+
+    def add(self, id, text):
+        """Index text as document id, replacing any earlier text for it."""
+        tokens = Tokens(text)
+        positions = {}
+        for position, stem in tokens:
+            positions.setdefault(stem, []).append(position)
+        with self.lock:
+            self.removeLocked(id)
+            if not tokens:
+                return
+            for stem, found in positions.items():
+                self.postings.setdefault(stem, {})[id] = found
+            self.lengths[id] = len(tokens)
+            self.stems[id] = positions.keys()
+            self.total_length += len(tokens)
+
+    def remove(self, id):
+        """Forget document id, if it is indexed."""
+        with self.lock:
+            self.removeLocked(id)
+
+    def removeLocked(self, id):
+        for stem in self.stems.pop(id, []):
+            documents = self.postings[stem]
+            del documents[id]
+            if not documents:
+                del self.postings[stem]
+        self.total_length -= self.lengths.pop(id, 0)
+
+    def containsPhrase(self, id, phrase):
+        """True if the (position, stem) tokens of phrase occur in document id with the same spacing."""
+        (start, first) = phrase[0]
+        for position in self.postings.get(first, {}).get(id, []):
+            if all(position + (p - start) in self.postings.get(stem, {}).get(id, []) for (p, stem) in phrase[1:]):
+                return True
+        return False
+
+    def search(self, query, limit=10):
+        """The best (score, id) for query, highest first, at most limit of them.
+
+        Every word counts towards a document's BM25 score; a "quoted phrase"
+        must also occur as written.
+        """
+        phrases = [Tokens(p) for p in phrase_re.findall(query)]
+        phrases = [p for p in phrases if p]
+        stems = set(stem for (position, stem) in Tokens(query.replace('"', ' ')))
+        with self.lock:
+            if not stems or not self.lengths:
+                return []
+            count = len(self.lengths)
+            average = float(self.total_length) / count
+            scores = {}
+            for stem in stems:
+                documents = self.postings.get(stem)
+                if not documents:
+                    continue
+                idf = math.log(1 + (count - len(documents) + 0.5) / (len(documents) + 0.5))
+                for id, positions in documents.items():
+                    tf = len(positions)
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[id] / average)
+                    scores[id] = scores.get(id, 0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            if phrases:
+                scores = dict((id, score) for (id, score) in scores.items() if all(self.containsPhrase(id, p) for p in phrases))
+        best = heapq.nsmallest(limit, [(-score, id) for (id, score) in scores.items()])
+        return [(-score, id) for (score, id) in best]
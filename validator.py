@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import re
+import json
+import time
+import logging
+
+import api
+from api import CachedIndex
+
+logging.basicConfig(level=logging.INFO) # dev_appserver.py --log_level debug .
+log = logging.getLogger(__name__)
+
+# Checks structured data as found on the web against the loaded schemas: JSON-LD
+# nodes (e.g. {"@type": "Restaurant", "address": {...}}, or an "@graph" of them)
+# and microdata items in their JSON form ({"type": [...], "properties": {...}}).
+# Each item is checked for
+# - types that exist, and properties that exist and apply to one of its types
+#   (its own, or one inherited from a supertype)
+# - values in range: nested items of an expected type, or a subtype of one;
+#   literals of the form an expected datatype takes (see LITERAL_FORMS); and
+#   enumeration values that are members of an expected enumeration
+# - superseded types, properties and enumeration values
+# Terms of other vocabularies (prefixed or absolute URIs) are left alone.
+#
+# Everything is looked up in ValidationTables, worked out once per layer set
+# from the ClosureIndex; they hold only ids, so they can be pickled and shared.
+# A Validator keeps a ValidationSummary of what it found and how many items a
+# second it checked.
+
+SCHEMA_PREFIXES = ["http://schema.org/", "https://schema.org/", "schema:"]
+
+VALIDATOR_MAX_DEPTH = 32 # nested items below this are not checked
+SUMMARY_MAX_TERMS = 1000 # distinct terms counted for each code; others are counted as OTHER_TERMS
+OTHER_TERMS = "(other)"
+
+number_re = re.compile(r'^\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*$')
+datetime_re = re.compile(r'^\s*-?\d{4,}(-(0[1-9]|1[0-2])(-(0[1-9]|[12]\d|3[01])([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?)?)?)?\s*$') # ISO 8601: YYYY, YYYY-MM, a date or a date and time
+duration_re = re.compile(r'^\s*-?P(?=\d|T\d)(\d+Y)?(\d+M)?(\d+W)?(\d+D)?(T(?=\d)(\d+H)?(\d+M)?(\d+([.,]\d+)?S)?)?\s*$') # ISO 8601, e.g. P1DT2H or PT30M
+
+# Forms of the literals each datatype takes; Text, and datatypes not listed, take any.
+LITERAL_FORMS = {
+    "Text": None,
+    "URL": re.compile(r'^\S+$', re.UNICODE),
+    "Number": number_re,
+    "Float": number_re,
+    "Integer": re.compile(r'^\s*[+-]?\d+\s*$'),
+    "Boolean": re.compile(r'^\s*((https?://schema\.org/|schema:)?(True|False)|true|false)\s*$'),
+    "Date": datetime_re, # a DateTime will do
+    "DateTime": datetime_re,
+    "Time": re.compile(r'^\s*\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?\s*$'),
+    "Duration": duration_re, # not a DataType, but given as text
+}
+
+# code -> (severity, message); the message is filled in with the term and a detail.
+DIAGNOSTICS = {
+    "unknown-type": ("error", "%(term)s is not a type"),
+    "unknown-property": ("error", "%(term)s is not a property"),
+    "not-applicable": ("error", "%(term)s is not a property of %(detail)s"),
+    "range-mismatch": ("error", "%(term)s expects %(detail)s"),
+    "invalid-literal": ("error", "%(term)s expects %(detail)s"),
+    "invalid-enumeration-value": ("error", "%(term)s expects %(detail)s"),
+    "literal-for-item": ("warning", "%(term)s expects %(detail)s, not text"),
+    "missing-type": ("warning", "item has no type"),
+    "superseded": ("warning", "%(term)s is superseded by %(detail)s"),
+    "too-deep": ("warning", "items nested more than %(detail)s deep were not checked"),
+    "invalid-json": ("error", "not a JSON item: %(detail)s"),
+}
+
+
+def termId(name):
+    """The schema.org id an item uses name for ("Person" for "http://schema.org/Person"), or None for another vocabulary's."""
+    for prefix in SCHEMA_PREFIXES:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    if ":" in name or "/" in name:
+        return None
+    return name
+
+def listOf(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+def itemParts(item):
+    """(type names, [(property name, value or values)]) for a JSON-LD node or a microdata item."""
+    if "@type" not in item and isinstance(item.get("properties"), dict):
+        return listOf(item.get("type")), item["properties"].items()
+    return listOf(item.get("@type")), [(k, v) for (k, v) in item.items() if not k.startswith("@")]
+
+def PathText(path):
+    """A path of property names and list positions as text, e.g. "review[1].author"."""
+    text = []
+    for step in path:
+        if isinstance(step, int):
+            text.append("[%d]" % step)
+        else:
+            text.append("." + step if text else step)
+    return "".join(text)
+
+
+class ValidationTables:
+    """What a Validator needs to know about the schemas in some layers, as sets and maps of ids.
+
+    Use GetValidationTables(), which keeps one per layer set.
+    """
+
+    def __init__(self, layers='core'):
+        closures = api.GetClosureIndex(layers)
+        index = closures.index
+        self.layers = closures.layers
+        classes = [n for (n, types) in index.types.items() if any(t.id == "rdfs:Class" for t in types)]
+        self.types = frozenset(c.id for c in classes)
+        self.properties = frozenset(p.id for p in index.properties)
+        self.ancestors = {} # type -> it and its supertypes
+        self.applicable = {} # type -> properties usable on it, inherited ones included
+        for c in classes:
+            self.ancestors[c.id] = frozenset(t.id for t in closures.ancestors(c))
+            self.applicable[c.id] = frozenset(p.id for p in closures.applicableProperties(c, superseded=True))
+
+        datatypes = set(id for id in LITERAL_FORMS if id in self.types)
+        for (node, types) in index.types.items():
+            if any(t.id == "DataType" for t in types):
+                datatypes.update(t.id for t in closures.descendants(node))
+        self.datatypes = frozenset(datatypes)
+        self.enumerations = frozenset(t.id for c in classes if c.id == "Enumeration" for t in closures.descendants(c))
+        self.members = {} # enumeration member -> the enumerations it is typed with
+        for (node, types) in index.types.items():
+            enumerations = frozenset(t.id for t in types if t.id in self.enumerations)
+            if enumerations:
+                self.members[node.id] = enumerations
+
+        self.ranges = {} # property -> the types in its rangeIncludes
+        self.literals = {} # property -> the datatypes whose literals it takes, subtypes included
+        self.takesItems = set() # properties with a type other than a datatype or enumeration in their range
+        self.takesMembers = set() # properties with an enumeration in their range
+        for p in index.properties:
+            ranges = index.ranges.get(p, ())
+            self.ranges[p.id] = frozenset(r.id for r in ranges)
+            self.literals[p.id] = tuple(sorted(set(t.id for r in ranges for t in closures.descendants(r) if t.id in self.datatypes)))
+            if any(r.id not in self.datatypes and r.id not in self.enumerations for r in ranges):
+                self.takesItems.add(p.id)
+            if any(r.id in self.enumerations for r in ranges):
+                self.takesMembers.add(p.id)
+
+        self.superseded = {} # superseded term -> its successor
+        for node in index.superseded:
+            successor = node.supersededBy(self.layers)
+            self.superseded[node.id] = successor.id if successor is not None else "another term"
+
+def GetValidationTables(layers='core'):
+    """The ValidationTables for these layers (see api.CachedIndex)."""
+    if isinstance(layers, basestring):
+        layers = [layers]
+    cachekey = "ValidationTables:%s" % ",".join(sorted(layers))
+    return CachedIndex(cachekey, lambda: ValidationTables(layers))
+
+
+class ValidationSummary:
+    """What a Validator found: items checked and how long that took, and diagnostics counted by code and term."""
+
+    def __init__(self):
+        self.items = 0
+        self.invalid = 0 # items with at least one error
+        self.errors = 0
+        self.warnings = 0
+        self.counts = {} # code -> { term -> diagnostics }
+        self.seconds = 0.0
+
+    def add(self, diagnostics, seconds=0.0):
+        """Count one item's diagnostics."""
+        self.items += 1
+        self.seconds += seconds
+        errors = 0
+        for d in diagnostics:
+            if d["severity"] == "error":
+                errors += 1
+            self.count(d["code"], d["term"], 1)
+        if errors:
+            self.invalid += 1
+        self.errors += errors
+        self.warnings += len(diagnostics) - errors
+
+    def merge(self, other):
+        """Add in the counts of another summary, e.g. from another process."""
+        self.items += other.items
+        self.invalid += other.invalid
+        self.errors += other.errors
+        self.warnings += other.warnings
+        self.seconds += other.seconds
+        for (code, terms) in other.counts.items():
+            for (term, count) in terms.items():
+                self.count(code, term, count)
+
+    def count(self, code, term, count):
+        """Add count diagnostics of code about term; past SUMMARY_MAX_TERMS terms for a code, they go to OTHER_TERMS."""
+        terms = self.counts.setdefault(code, {})
+        if term not in terms and len(terms) >= SUMMARY_MAX_TERMS:
+            term = OTHER_TERMS
+        terms[term] = terms.get(term, 0) + count
+
+    def itemsPerSecond(self):
+        if not self.seconds:
+            return 0.0
+        return self.items / self.seconds
+
+    def report(self):
+        """The summary as a dict, ready for json.dumps."""
+        return {
+            "items": self.items,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "seconds": round(self.seconds, 3),
+            "itemsPerSecond": round(self.itemsPerSecond(), 1),
+            "counts": self.counts,
+        }
+
+
+class Validator:
+    """Checks items against some ValidationTables, keeping a ValidationSummary of what it found.
+
+    validate(item) gives a list of diagnostics, each a dict with a severity
+    ("error" or "warning"), a code (see DIAGNOSTICS), the term concerned, the
+    path to it within the item (e.g. "address.addressCountry") and a message.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.summary = ValidationSummary()
+
+    def validate(self, item):
+        """The diagnostics for one item: a JSON-LD node or document, or a microdata item or document."""
+        started = time.time()
+        found = []
+        self.document(item, (), found)
+        self.summary.add(found, time.time() - started)
+        return found
+
+    def report(self, found, code, term, path, detail=None, value=None):
+        severity, message = DIAGNOSTICS[code]
+        diagnostic = {
+            "severity": severity,
+            "code": code,
+            "term": term,
+            "path": PathText(path),
+            "message": message % { "term": term, "detail": detail },
+        }
+        if value is not None:
+            diagnostic["value"] = value
+        found.append(diagnostic)
+
+    def document(self, item, path, found, depth=0):
+        if isinstance(item, (list, dict)) and depth >= VALIDATOR_MAX_DEPTH:
+            self.report(found, "too-deep", "", path, VALIDATOR_MAX_DEPTH)
+        elif isinstance(item, list):
+            for (i, x) in enumerate(item):
+                self.document(x, path + (i,), found, depth + 1)
+        elif isinstance(item, dict):
+            if "@graph" in item:
+                self.document(item["@graph"], path + ("@graph",), found, depth + 1)
+            elif isinstance(item.get("items"), list) and "properties" not in item and "@type" not in item:
+                self.document(item["items"], path + ("items",), found, depth + 1)
+            else:
+                self.item(item, path, found, depth)
+
+    def item(self, item, path, found, depth):
+        """Checks a node and its properties; returns the ids of its types that are known."""
+        tables = self.tables
+        types, properties = itemParts(item)
+        known = []
+        for name in types:
+            id = termId(name) if isinstance(name, basestring) else None
+            if id is None:
+                continue
+            if id not in tables.types:
+                self.report(found, "unknown-type", id, path)
+                continue
+            known.append(id)
+            if id in tables.superseded:
+                self.report(found, "superseded", id, path, tables.superseded[id])
+        if not types:
+            self.report(found, "missing-type", ([""] + [p for p in path if isinstance(p, basestring)])[-1], path)
+        applicable = [tables.applicable[t] for t in known]
+
+        for (name, values) in properties:
+            prop = termId(name)
+            if prop is None:
+                continue
+            where = path + (name,)
+            values = listOf(values)
+            if prop not in tables.properties:
+                self.report(found, "unknown-property", prop, where)
+                prop = None
+            else:
+                if prop in tables.superseded:
+                    self.report(found, "superseded", prop, where, tables.superseded[prop])
+                if applicable and not any(prop in a for a in applicable):
+                    self.report(found, "not-applicable", prop, where, " or ".join(known))
+            for (i, value) in enumerate(values):
+                self.value(prop, value, where + (i,) if len(values) > 1 else where, found, depth)
+        return known
+
+    def value(self, prop, value, path, found, depth):
+        """Checks one value of prop (None for an unknown property, whose nested items are still checked)."""
+        if isinstance(value, dict):
+            if "@value" in value:
+                self.literal(prop, value["@value"], path, found)
+            elif "@id" in value and len(value) == 1:
+                self.reference(prop, value["@id"], path, found)
+            elif depth >= VALIDATOR_MAX_DEPTH:
+                self.report(found, "too-deep", prop or "", path, VALIDATOR_MAX_DEPTH)
+            else:
+                known = self.item(value, path, found, depth + 1)
+                if prop is not None and known and not self.inRange(prop, known):
+                    self.report(found, "range-mismatch", prop, path, self.expected(prop))
+        elif isinstance(value, list): # a JSON-LD @list, or a value given as [[...]]
+            if depth >= VALIDATOR_MAX_DEPTH:
+                self.report(found, "too-deep", prop or "", path, VALIDATOR_MAX_DEPTH)
+                return
+            for x in value:
+                self.value(prop, x, path, found, depth + 1)
+        elif prop is not None:
+            self.literal(prop, value, path, found)
+
+    def inRange(self, prop, known):
+        ranges = self.tables.ranges[prop]
+        if not ranges:
+            return True
+        for t in known:
+            ancestors = self.tables.ancestors[t]
+            if "Role" in ancestors or not ranges.isdisjoint(ancestors): # a Role stands in for the value it qualifies
+                return True
+        return False
+
+    def expected(self, prop):
+        return " or ".join(sorted(self.tables.ranges[prop]))
+
+    def member(self, prop, text):
+        """Whether text names an enumeration member that prop takes: True, False if not, or None if it names none."""
+        id = termId(text.strip())
+        enumerations = self.tables.members.get(id) if id else None
+        if not enumerations:
+            return None
+        ranges = self.tables.ranges[prop]
+        return any(not ranges.isdisjoint(self.tables.ancestors[e]) for e in enumerations)
+
+    def literal(self, prop, value, path, found):
+        tables = self.tables
+        if prop is None or not tables.ranges[prop] or value is None:
+            return
+        if isinstance(value, bool):
+            text = u"true" if value else u"false"
+        elif isinstance(value, (int, long, float)):
+            text = unicode(value)
+        elif isinstance(value, basestring):
+            text = value
+        else:
+            return
+        for datatype in tables.literals[prop]:
+            form = LITERAL_FORMS.get(datatype)
+            if form is None or form.match(text):
+                return
+        if prop in tables.takesMembers:
+            member = self.member(prop, text)
+            if member:
+                self.supersededMember(text, path, found)
+                return
+            if member is not None or not tables.literals[prop] and prop not in tables.takesItems:
+                self.report(found, "invalid-enumeration-value", prop, path, self.expected(prop), value)
+                return
+        if tables.literals[prop]:
+            self.report(found, "invalid-literal", prop, path, " or ".join(tables.literals[prop]), value)
+        else:
+            self.report(found, "literal-for-item", prop, path, self.expected(prop), value)
+
+    def reference(self, prop, id, path, found):
+        """Checks a value given as {"@id": ...}: a node elsewhere, or an enumeration member."""
+        tables = self.tables
+        if prop is None or prop not in tables.takesMembers or not isinstance(id, basestring):
+            return
+        member = self.member(prop, id)
+        if member:
+            self.supersededMember(id, path, found)
+        elif member is not None or not tables.literals[prop] and prop not in tables.takesItems:
+            self.report(found, "invalid-enumeration-value", prop, path, self.expected(prop), id)
+
+    def supersededMember(self, text, path, found):
+        id = termId(text.strip())
+        if id in self.tables.superseded:
+            self.report(found, "superseded", id, path, self.tables.superseded[id])
+
+def ValidateItem(item, layers='core'):
+    """The diagnostics for one item (see Validator.validate), against the schemas in these layers."""
+    return Validator(GetValidationTables(layers)).validate(item)
+
+def ValidateLines(validator, lines, number=1, field=None):
+    """[(line number, diagnostics)] for the lines of JSON Lines text with something to report, counting every line.
+
+    lines are numbered from number. Each is an item, or with field, a JSON
+    object holding the item under that key; lines that aren't a JSON object
+    or array (or lack the field) are reported as "invalid-json". Blank lines
+    are skipped.
+    """
+    reports = []
+    for (n, line) in enumerate(lines, number):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            if field is not None:
+                item = item[field]
+            if not isinstance(item, (dict, list)):
+                raise ValueError("%s is not an object or array" % json.dumps(item)[:40])
+        except (ValueError, KeyError, TypeError, RuntimeError) as e: # RuntimeError: nested too deep to parse
+            diagnostics = []
+            validator.report(diagnostics, "invalid-json", "", (), str(e))
+            validator.summary.add(diagnostics)
+        else:
+            diagnostics = validator.validate(item)
+        if diagnostics:
+            reports.append((n, diagnostics))
+    return reports